@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+
+# Tự động sửa đường dẫn import để tránh lỗi "ModuleNotFoundError"
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path: sys.path.append(current_dir)
+
+from utils.preprocessing import crop_face
+
+# Chấm liveness offline cho cả thư mục video (không hiển thị, không chờ theo nhịp camera)
+# Chạy đúng pipeline của realtime_app.py: mặt -> cảm xúc -> chuyển động (-> texture) -> LivenessSession
+# Thời gian trong phiên lấy theo timestamp của video, nên kết quả không phụ thuộc tốc độ xử lý
+
+VIDEO_EXTS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+STAGES = ('decode', 'detect', 'emotion', 'session', 'texture')
+NO_RESULT = "UNDECIDED" # Hết video mà phiên chưa đưa ra kết quả
+
+def list_videos(src):
+    videos = []
+    for dirpath, _, files in os.walk(src):
+        for f in files:
+            if f.lower().endswith(VIDEO_EXTS):
+                videos.append(os.path.relpath(os.path.join(dirpath, f), src))
+    return sorted(videos)
+
+# --- Tiến trình con: mỗi worker giữ bộ phát hiện / mô hình riêng, dùng lại cho mọi video ---
+
+_worker = {}
+
+def _init_worker(cfg):
+    cv2.setNumThreads(1) # Song song hóa bằng số tiến trình, không phải số luồng mỗi tiến trình
+    from detectors.face_detector import FaceDetector
+    from detectors.landmark_tracker import KeyframeTracker
+    from detectors.emotion_detector import EmotionDetector
+    from detectors.texture_detector import TextureDetector
+
+    _worker['cfg'] = cfg
+    _worker['face_det'] = KeyframeTracker(FaceDetector(max_num_faces=cfg['max_faces'], track_roi=True),
+                                          keyframe_interval=cfg['keyframe_interval'])
+    _worker['emotion_det'] = EmotionDetector()
+    _worker['texture_det'] = None
+    if cfg['texture_model']:
+        if cfg['backend'] != 'onnx':
+            import torch
+            torch.set_num_threads(1)
+        det = TextureDetector(cfg['texture_model'], backend=cfg['backend'])
+        _worker['texture_det'] = det if det.loaded else None
+
+# Chấm một video, trả về bản ghi kết quả (một dòng JSONL)
+def score_video(rel, src):
+    from detectors.face_tracker import FaceTracker
+    from detectors.liveness_session import LivenessSession, STATE_RESULT
+
+    cfg = _worker['cfg']
+    face_det, emotion_det, texture_det = _worker['face_det'], _worker['emotion_det'], _worker['texture_det']
+    face_det.reset()
+    random.seed(int(hashlib.sha1(rel.encode('utf-8')).hexdigest()[:8], 16)) # Thử thách chọn lặp lại được cho mỗi video
+    tracker = FaceTracker(face_det.get_bbox,
+                          session_factory=lambda: LivenessSession(cfg['static_threshold'],
+                                                                  challenge_limit=cfg['challenge_limit'],
+                                                                  texture_threshold=cfg['texture_threshold']))
+
+    timings = dict.fromkeys(STAGES, 0.0)
+    cap = cv2.VideoCapture(os.path.join(src, rel))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frames = faces_seen = texture_runs = 0
+    result, decided_at, challenge = NO_RESULT, None, None
+    texture, texture_scores, motion_scores = None, [], []
+    t_start = time.perf_counter()
+
+    while True:
+        t0 = time.perf_counter()
+        ok, frame = cap.read()
+        t1 = time.perf_counter()
+        timings['decode'] += t1 - t0
+        if not ok:
+            break
+        if cfg['flip']:
+            frame = cv2.flip(frame, 1) # Giống camera trực tiếp (ảnh gương)
+        # Thời gian theo video (giây), không theo đồng hồ thật
+        pos = cap.get(cv2.CAP_PROP_POS_MSEC)
+        now = pos / 1000.0 if pos > 0 else frames / fps
+        frames += 1
+
+        tracker.update(face_det.detect_all(frame), now)
+        primary = tracker.primary()
+        t2 = time.perf_counter()
+        timings['detect'] += t2 - t1
+        if primary is None:
+            continue
+        faces_seen += 1
+
+        if texture_det is not None and (faces_seen - 1) % cfg['texture_every'] == 0:
+            crop = crop_face(frame, primary.bbox)
+            if crop is not None:
+                texture = (float(texture_det.predict(crop)), now)
+                texture_scores.append(texture[0])
+                texture_runs += 1
+        t3 = time.perf_counter()
+        timings['texture'] += t3 - t2
+
+        emotion, _ = emotion_det.detect_state(primary.face)
+        t4 = time.perf_counter()
+        timings['emotion'] += t4 - t3
+
+        session = primary.session
+        state = session.update(primary.face, emotion, now, texture)
+        timings['session'] += time.perf_counter() - t4
+        motion_scores.append(session.motion_score)
+        challenge = session.challenge_type or challenge
+        if state == STATE_RESULT and decided_at is None:
+            result, decided_at = session.result, now # Giữ kết quả đầu tiên của video
+            if not cfg['full']:
+                break # Đã có kết quả -> không cần đọc tiếp
+    cap.release()
+
+    wall = time.perf_counter() - t_start
+    return {
+        'video': rel.replace(os.sep, '/'),
+        'verdict': result,
+        'decided_at': None if decided_at is None else round(decided_at, 3),
+        'challenge': challenge,
+        'frames': frames,
+        'face_frames': faces_seen,
+        'max_motion': round(max(motion_scores), 3) if motion_scores else None,
+        'texture_mean': round(sum(texture_scores) / len(texture_scores), 4) if texture_scores else None,
+        'texture_runs': texture_runs,
+        'timings_ms': {k: round(v * 1000, 1) for k, v in timings.items()},
+        'ms_per_frame': {k: round(v * 1000 / max(frames, 1), 3) for k, v in timings.items()},
+        'wall_s': round(wall, 3),
+        'fps': round(frames / max(wall, 1e-6), 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless batch liveness scoring over a directory of videos")
+    parser.add_argument('src', help="directory of video files (searched recursively)")
+    parser.add_argument('--output', default='liveness_scores.jsonl')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--static-threshold', type=float, default=1.5)
+    parser.add_argument('--challenge-limit', type=float, default=5.0)
+    parser.add_argument('--texture-threshold', type=float, default=0.5)
+    parser.add_argument('--texture-model', default=os.path.join(current_dir, 'models', 'trained_model.pth'),
+                        help="TextureCNN weights; pass '' to skip the texture stage")
+    parser.add_argument('--backend', default='torch', help="texture backend: torch / onnx / int8")
+    parser.add_argument('--texture-every', type=int, default=5, help="score texture on every N-th face frame")
+    parser.add_argument('--keyframe-interval', type=int, default=3)
+    parser.add_argument('--max-faces', type=int, default=1)
+    parser.add_argument('--no-flip', action='store_true', help="do not mirror frames (the live apps mirror the camera)")
+    parser.add_argument('--full', action='store_true', help="keep reading after the first verdict")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.src):
+        print(f"[LỖI] Không tìm thấy thư mục: {args.src}")
+        sys.exit(1)
+    videos = list_videos(args.src)
+    # Video lớn chạy trước để các worker kết thúc gần cùng lúc
+    videos.sort(key=lambda v: -os.path.getsize(os.path.join(args.src, v)))
+
+    cfg = {
+        'static_threshold': args.static_threshold, 'challenge_limit': args.challenge_limit,
+        'texture_threshold': args.texture_threshold, 'texture_every': max(1, args.texture_every),
+        'texture_model': args.texture_model if args.texture_model and os.path.exists(args.texture_model) else None,
+        'backend': args.backend, 'keyframe_interval': args.keyframe_interval, 'max_faces': args.max_faces,
+        'flip': not args.no_flip, 'full': args.full,
+    }
+    if not cfg['texture_model']:
+        print("[CẢNH BÁO] Không có model texture, bỏ qua bước texture.")
+    print(f"[INFO] {len(videos)} video | {args.workers} worker -> {args.output}")
+
+    t0 = time.perf_counter()
+    counts, frames_total = {}, 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(cfg,)) as pool, \
+            open(args.output, 'w', encoding='utf-8') as out:
+        futures = {pool.submit(score_video, rel, args.src): rel for rel in videos}
+        for n, future in enumerate(as_completed(futures), 1):
+            try:
+                record = future.result()
+            except Exception as e:
+                record = {'video': futures[future].replace(os.sep, '/'), 'verdict': 'ERROR', 'error': str(e)}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            counts[record['verdict']] = counts.get(record['verdict'], 0) + 1
+            frames_total += record.get('frames', 0)
+            print(f"[{n}/{len(videos)}] {record['video']}: {record['verdict']}")
+
+    elapsed = time.perf_counter() - t0
+    print("=" * 60)
+    print(" | ".join(f"{k}: {v}" for k, v in sorted(counts.items())))
+    print(f"{frames_total} frame trong {elapsed:.1f}s ({frames_total / max(elapsed, 1e-6):.0f} frame/s tổng)")
+    print("=" * 60)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+
+# Tự động sửa đường dẫn import để tránh lỗi "ModuleNotFoundError"
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path: sys.path.append(current_dir)
+
+from utils.preprocessing import crop_face, FACE_CROP_PAD
+
+# Tạo tập ảnh mặt cho TextureCNN từ ảnh chụp / video thô, cắt giống hệt lúc chạy thật:
+# FaceDetector.get_bbox -> crop_face (nới FACE_CROP_PAD mỗi phía)
+#
+# Đầu ra (tương thích ImageFolder):
+#   <out>/<lớp>/<shard>/<hash nguồn>_<frame>_<mặt>.jpg
+#   <out>/_index/<hash nguồn>.jsonl   nguồn đã xử lý xong + nguồn gốc từng ảnh (source, frame, bbox)
+#   <out>/index.jsonl                 gộp toàn bộ _index sau mỗi lần chạy
+# Chạy lại sẽ bỏ qua các nguồn đã có file trong _index (tiếp tục từ chỗ dừng)
+
+IMG_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+VIDEO_EXTS = ('.mp4', '.avi', '.mov', '.mkv', '.webm')
+
+# Quét thư mục nguồn: mỗi thư mục con cấp 1 là một lớp (real / fake ...)
+def list_sources(src_root):
+    sources = []
+    for cls in sorted(d.name for d in os.scandir(src_root) if d.is_dir()):
+        for dirpath, _, files in os.walk(os.path.join(src_root, cls)):
+            for f in files:
+                if f.lower().endswith(IMG_EXTS + VIDEO_EXTS):
+                    sources.append((os.path.relpath(os.path.join(dirpath, f), src_root), cls))
+    return sources
+
+def source_id(rel):
+    return hashlib.sha1(rel.replace(os.sep, '/').encode('utf-8')).hexdigest()[:12]
+
+# --- Tiến trình con: mỗi worker giữ một FaceDetector (một Face Mesh) cho mọi nguồn nó xử lý ---
+
+_worker = {}
+
+def _init_worker(max_faces):
+    cv2.setNumThreads(1) # Mỗi tiến trình một luồng OpenCV, song song hóa bằng số tiến trình
+    from detectors.face_detector import FaceDetector
+    _worker['video'] = FaceDetector(max_num_faces=max_faces) # Bám giữa các frame liên tiếp
+    _worker['image'] = FaceDetector(max_num_faces=max_faces, static_image_mode=True)
+
+# Cắt các mặt trong một khung hình, ghi JPEG, trả về các dòng nguồn gốc
+def _emit(detector, frame, frame_idx, rel, cls, sid, out_dir, shard, min_size, quality):
+    rows = []
+    for k, face in enumerate(detector.detect_all(frame)):
+        bbox = detector.get_bbox(face)
+        if min(bbox[2], bbox[3]) < min_size:
+            continue
+        crop = crop_face(frame, bbox, FACE_CROP_PAD)
+        if crop is None:
+            continue
+        name = os.path.join(cls, shard, f"{sid}_{frame_idx:06d}_{k}.jpg")
+        cv2.imwrite(os.path.join(out_dir, name), crop, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        rows.append({'crop': name.replace(os.sep, '/'), 'class': cls, 'source': rel.replace(os.sep, '/'),
+                     'frame': frame_idx, 'bbox': [int(v) for v in bbox]})
+    return rows
+
+# Xử lý một nguồn (ảnh hoặc video); ghi _index/<sid>.jsonl khi xong (ghi file tạm rồi đổi tên)
+def process_source(rel, cls, src_root, out_dir, num_shards, frame_step, max_frames, min_size, quality):
+    t0 = time.perf_counter()
+    sid = source_id(rel)
+    shard = f"{int(sid, 16) % num_shards:03d}"
+    os.makedirs(os.path.join(out_dir, cls, shard), exist_ok=True)
+    path = os.path.join(src_root, rel)
+    rows, frames = [], 0
+
+    if rel.lower().endswith(IMG_EXTS):
+        frame = cv2.imread(path)
+        if frame is not None:
+            frames = 1
+            rows = _emit(_worker['image'], frame, 0, rel, cls, sid, out_dir, shard, min_size, quality)
+    else:
+        detector = _worker['video']
+        detector.reset() # Không mang trạng thái bám từ video trước sang
+        cap = cv2.VideoCapture(path)
+        idx = 0
+        while True:
+            # Frame bị bỏ qua chỉ grab (không chuyển màu / sao chép ra NumPy)
+            if idx % frame_step:
+                if not cap.grab():
+                    break
+                idx += 1
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+            rows.extend(_emit(detector, frame, idx, rel, cls, sid, out_dir, shard, min_size, quality))
+            frames += 1
+            idx += 1
+            if max_frames and frames >= max_frames:
+                break
+        cap.release()
+
+    index_path = os.path.join(out_dir, '_index', f"{sid}.jsonl")
+    with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    os.replace(index_path + '.tmp', index_path)
+    return rel, frames, len(rows), time.perf_counter() - t0
+
+# Gộp các file _index thành <out>/index.jsonl
+def merge_index(out_dir):
+    index_dir = os.path.join(out_dir, '_index')
+    total = 0
+    with open(os.path.join(out_dir, 'index.jsonl'), 'w', encoding='utf-8') as out:
+        for name in sorted(os.listdir(index_dir)):
+            if name.endswith('.jsonl'):
+                with open(os.path.join(index_dir, name), 'r', encoding='utf-8') as f:
+                    for line in f:
+                        out.write(line)
+                        total += 1
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a face-crop dataset with the runtime FaceDetector (parallel, resumable)")
+    parser.add_argument('--src', default=os.path.join(current_dir, 'data', 'raw'),
+                        help="raw photos/videos, one sub-folder per class")
+    parser.add_argument('--out', default=os.path.join(current_dir, 'data', 'crops'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes (one Face Mesh each)")
+    parser.add_argument('--frame-step', type=int, default=5, help="use every N-th video frame")
+    parser.add_argument('--max-frames', type=int, default=0, help="max sampled frames per video (0 = no limit)")
+    parser.add_argument('--max-faces', type=int, default=1)
+    parser.add_argument('--min-size', type=int, default=48, help="skip faces whose bbox side is smaller (pixels)")
+    parser.add_argument('--shards', type=int, default=64, help="number of sub-folders per class")
+    parser.add_argument('--quality', type=int, default=95, help="JPEG quality of the crops")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.src):
+        print(f"[LỖI] Không tìm thấy thư mục nguồn: {args.src}")
+        sys.exit(1)
+    os.makedirs(os.path.join(args.out, '_index'), exist_ok=True)
+
+    sources = list_sources(args.src)
+    done = {n[:-len('.jsonl')] for n in os.listdir(os.path.join(args.out, '_index')) if n.endswith('.jsonl')}
+    todo = [(rel, cls) for rel, cls in sources if source_id(rel) not in done]
+    # Nguồn lớn (video dài) chạy trước để các worker kết thúc gần cùng lúc
+    todo.sort(key=lambda s: -os.path.getsize(os.path.join(args.src, s[0])))
+    print(f"[INFO] {len(sources)} nguồn | {len(sources) - len(todo)} đã xong | {len(todo)} cần xử lý | {args.workers} worker")
+
+    t0 = time.perf_counter()
+    frames_total = crops_total = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.max_faces,)) as pool:
+        futures = [pool.submit(process_source, rel, cls, args.src, args.out, args.shards, args.frame_step,
+                               args.max_frames, args.min_size, args.quality) for rel, cls in todo]
+        for n, future in enumerate(as_completed(futures), 1):
+            try:
+                rel, frames, crops, secs = future.result()
+            except Exception as e:
+                print(f"[LỖI] {e}")
+                continue
+            frames_total += frames
+            crops_total += crops
+            elapsed = time.perf_counter() - t0
+            print(f"[{n}/{len(todo)}] {rel}: {frames} frame -> {crops} ảnh mặt ({secs:.1f}s) | "
+                  f"tổng {frames_total / max(elapsed, 1e-6):.1f} frame/s")
+
+    total = merge_index(args.out)
+    print(f"[THÀNH CÔNG] {crops_total} ảnh mặt mới, {total} ảnh trong {os.path.join(args.out, 'index.jsonl')}")
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,210 @@
 ﻿import cv2
 import mediapipe as mp
 import numpy as np
+from detectors.liveness_utils import face_metrics
+
+# Kết quả phát hiện của một khung hình: mảng landmarks (478, 3) float32 cùng kích thước khung hình
+# Được dựng một lần mỗi frame và dùng chung cho mọi detector
+class FaceLandmarks:
+    __slots__ = ('points', 'w', 'h', '_px', '_metrics', '_bbox')
+
+    def __init__(self, points, w, h):
+        self.points = points # Tọa độ chuẩn hóa (x, y, z), shape (478, 3)
+        self.w = w
+        self.h = h
+        self._px = None
+        self._metrics = None
+        self._bbox = None
+
+    # Tạo từ NormalizedLandmarkList của MediaPipe
+    @classmethod
+    def from_mediapipe(cls, landmarks, w, h):
+        points = np.fromiter((v for lm in landmarks.landmark for v in (lm.x, lm.y, lm.z)),
+                             dtype=np.float32, count=len(landmarks.landmark) * 3).reshape(-1, 3)
+        return cls(points, w, h)
+
+    # Kích thước khung hình dạng (h, w, c) như image.shape
+    @property
+    def shape(self):
+        return (self.h, self.w, 3)
+
+    # Tọa độ pixel (478, 2), chỉ tính một lần
+    def pixels(self):
+        if self._px is None:
+            self._px = self.points[:, :2] * np.array([self.w, self.h], dtype=np.float32)
+        return self._px
+
+    # (EAR, MAR, khoảng cách lông mày - mắt), chỉ tính một lần
+    def metrics(self):
+        if self._metrics is None:
+            self._metrics = face_metrics(self.pixels())
+        return self._metrics
 
 # lớp FaceDetector sử dụng MediaPipe để phát hiện khuôn mặt và trích xuất landmarks
 class FaceDetector:
     # khởi tạo bộ phát hiện khuôn mặt MediaPipe
-    def __init__(self):
+    # max_num_faces: số khuôn mặt tối đa trong một khung hình
+    # track_roi: chế độ bám vùng mặt (chỉ chạy Face Mesh trên vùng quanh bbox của frame trước)
+    # roi_size: cạnh dài của vùng cắt sau khi thu nhỏ, roi_pad: tỉ lệ nới rộng bbox mỗi phía
+    # rescan_interval: với nhiều mặt, cứ N lần phát hiện thì quét toàn khung hình một lần để tìm mặt mới
+    # use_gate: trước khi quét toàn khung hình, chạy bộ phát hiện mặt nhẹ (short-range) trên ảnh thu nhỏ;
+    #           chỉ chạy Face Mesh khi cổng thấy mặt, và chỉ trên vùng quanh các hộp mà cổng trả về
+    # gate_width: chiều rộng ảnh thu nhỏ đưa vào cổng
+    # static_image_mode: coi mỗi ảnh là độc lập (không bám giữa các frame), dùng khi xử lý ảnh tĩnh rời rạc
+    def __init__(self, max_num_faces=1, track_roi=False, roi_size=256, roi_pad=0.5, rescan_interval=30,
+                 use_gate=False, gate_width=320, static_image_mode=False):
         self.mp_face_mesh = mp.solutions.face_mesh # Sử dụng Face Mesh của MediaPipe
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=1,
+        self.max_num_faces = max_num_faces
+        self.static_image_mode = static_image_mode
+        self.face_mesh = self._create_mesh() # Face Mesh cho toàn khung hình
+
+        self.track_roi = track_roi
+        self.roi_size = roi_size
+        self.roi_pad = roi_pad
+        self.rescan_interval = rescan_interval
+        # Face Mesh riêng cho vùng cắt để không làm rối bộ bám nội bộ của bản toàn khung hình
+        self.roi_mesh = self._create_mesh() if (track_roi or use_gate) else None
+        self.last_bboxes = [] # các bbox của lần phát hiện gần nhất (để cắt vùng cho frame sau)
+        self._since_full = 0  # số lần phát hiện kể từ lần quét toàn khung hình gần nhất
+
+        # Cổng phát hiện mặt nhẹ (MediaPipe Face Detection, model tầm gần)
+        self.use_gate = use_gate
+        self.gate_width = gate_width
+        self.gate = mp.solutions.face_detection.FaceDetection(
+            model_selection=0, min_detection_confidence=0.5) if use_gate else None
+
+        # Bộ đếm: số lần tìm thấy trong vùng cắt / số lần phải quét toàn khung hình
+        self.roi_hits = 0
+        self.full_searches = 0
+        # Bộ đếm của cổng: có mặt (chạy Face Mesh) / không có mặt (bỏ qua Face Mesh)
+        self.gate_hits = 0
+        self.gate_misses = 0
+
+    def _create_mesh(self):
+        return self.mp_face_mesh.FaceMesh(
+            static_image_mode=self.static_image_mode,
+            max_num_faces=self.max_num_faces,
             refine_landmarks=True,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         ) # Khởi tạo FaceMesh với tham số
 
-    # phát hiện khuôn mặt và trả về landmarks cùng kích thước khung hình
+    # Xóa trạng thái bám (khi chuyển sang một nguồn video khác)
+    def reset(self):
+        self.face_mesh.reset()
+        if self.roi_mesh is not None:
+            self.roi_mesh.reset()
+        self.last_bboxes = []
+        self._since_full = 0
+
+    # phát hiện khuôn mặt, trả về FaceLandmarks của mặt đầu tiên (hoặc None nếu không thấy mặt)
     def detect(self, image):
+        faces = self.detect_all(image)
+        return faces[0] if faces else None
+
+    # phát hiện tất cả khuôn mặt, trả về list FaceLandmarks
+    def detect_all(self, image):
+        faces = []
+        # Chế độ bám: thử vùng bao quanh các mặt ở frame trước, chỉ quét toàn ảnh khi mất mặt
+        rescan_due = self.max_num_faces > 1 and self._since_full >= self.rescan_interval
+        if self.track_roi and self.last_bboxes and not rescan_due:
+            faces = self._detect_roi(image, self.last_bboxes)
+            if len(faces) >= len(self.last_bboxes):
+                self.roi_hits += 1
+                self._since_full += 1
+            else:
+                faces = [] # Mất ít nhất một mặt -> quét lại toàn khung hình
+
+        if not faces:
+            self.full_searches += 1
+            self._since_full = 0
+            faces = self._search(image)
+
+        self.last_bboxes = [self.get_bbox(f) for f in faces]
+        return faces
+
+    # Tìm mặt khi chưa bám được: qua cổng (nếu bật) rồi mới chạy Face Mesh
+    def _search(self, image):
+        if not self.use_gate:
+            return self._detect_full(image)
+
+        boxes = self._gate_boxes(image)
+        if not boxes:
+            self.gate_misses += 1
+            return [] # Không có ai trước camera -> bỏ qua Face Mesh
+        self.gate_hits += 1
+        # Chạy Face Mesh trên vùng quanh các hộp thô, quét toàn khung hình nếu vẫn không thấy
+        return self._detect_roi(image, boxes) or self._detect_full(image)
+
+    # Chạy cổng phát hiện mặt trên ảnh thu nhỏ, trả về các hộp thô (x, y, w, h) theo pixel toàn khung hình
+    def _gate_boxes(self, image):
+        h, w = image.shape[:2]
+        scale = min(1.0, self.gate_width / float(w))
+        small = image if scale >= 1.0 else cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_LINEAR)
+        results = self.gate.process(cv2.cvtColor(small, cv2.COLOR_BGR2RGB))
+        if not results.detections:
+            return []
+        boxes = []
+        for det in results.detections[:self.max_num_faces]:
+            rb = det.location_data.relative_bounding_box # Tọa độ chuẩn hóa, dùng được cho ảnh gốc
+            boxes.append((int(rb.xmin * w), int(rb.ymin * h), int(rb.width * w), int(rb.height * h)))
+        return boxes
+
+    # Chạy Face Mesh trên toàn khung hình
+    def _detect_full(self, image):
+        h, w = image.shape[:2]
         rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB) # Chuyển BGR sang RGB
         results = self.face_mesh.process(rgb_image) # Xử lý ảnh để phát hiện khuôn mặt
         if results.multi_face_landmarks: 
-            # Trả về landmarks của khuôn mặt đầu tiên
-            return results.multi_face_landmarks[0], image.shape
-        return None, None
+            return [FaceLandmarks.from_mediapipe(lms, w, h) for lms in results.multi_face_landmarks]
+        return []
+
+    # Tính vùng cắt vuông quanh hợp các bbox (đã nới rộng), cắt theo biên ảnh
+    def _roi_rect(self, bboxes, w, h):
+        b = np.array(bboxes, dtype=np.float32)
+        x, y = b[:, 0].min(), b[:, 1].min()
+        bw = (b[:, 0] + b[:, 2]).max() - x
+        bh = (b[:, 1] + b[:, 3]).max() - y
+        side = max(bw, bh) * (1.0 + 2.0 * self.roi_pad)
+        cx, cy = x + bw / 2.0, y + bh / 2.0
+        x0 = max(0, int(cx - side / 2)); y0 = max(0, int(cy - side / 2))
+        x1 = min(w, int(cx + side / 2)); y1 = min(h, int(cy + side / 2))
+        return x0, y0, x1, y1
+
+    # Chạy Face Mesh trên vùng cắt đã thu nhỏ rồi ánh xạ landmarks về tọa độ toàn khung hình
+    def _detect_roi(self, image, bboxes):
+        h, w = image.shape[:2]
+        x0, y0, x1, y1 = self._roi_rect(bboxes, w, h)
+        cw, ch = x1 - x0, y1 - y0
+        if cw < 16 or ch < 16:
+            return []
+
+        # Thu nhỏ giữ nguyên tỉ lệ để cạnh dài bằng roi_size (không phóng to vùng nhỏ)
+        scale = min(1.0, self.roi_size / float(max(cw, ch)))
+        crop = image[y0:y1, x0:x1]
+        if scale < 1.0:
+            crop = cv2.resize(crop, (max(1, int(cw * scale)), max(1, int(ch * scale))), interpolation=cv2.INTER_AREA)
+        rgb_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2RGB) # Chỉ đổi màu trên vùng nhỏ
+
+        results = self.roi_mesh.process(rgb_crop)
+        if not results.multi_face_landmarks:
+            return []
+
+        faces = []
+        for lms in results.multi_face_landmarks:
+            face = FaceLandmarks.from_mediapipe(lms, w, h)
+            # Tọa độ chuẩn hóa theo vùng cắt -> chuẩn hóa theo toàn khung hình
+            pts = face.points
+            pts[:, 0] = (x0 + pts[:, 0] * cw) / w
+            pts[:, 1] = (y0 + pts[:, 1] * ch) / h
+            pts[:, 2] *= cw / float(w) # z cùng thang đo với x
+            faces.append(face)
+        return faces
     
-    # tính bounding box từ landmarks
-    def get_bbox(self, landmarks, frame_shape):
-        h, w, _ = frame_shape # Lấy kích thước khung hình
-        pts = np.array([(int(lm.x * w), int(lm.y * h)) for lm in landmarks.landmark]) # Chuyển landmarks sang tọa độ pixel
-        x, y, w_rect, h_rect = cv2.boundingRect(pts) # Tính bounding box
+    # tính bounding box từ landmarks (chỉ tính một lần cho mỗi kết quả)
+    def get_bbox(self, face):
+        if face._bbox is None:
+            pts = face.pixels().astype(np.int32) # Tọa độ pixel (đã tính sẵn)
+            face._bbox = cv2.boundingRect(pts) # Tính bounding box
+        x, y, w_rect, h_rect = face._bbox
         return x, y, w_rect, h_rect # Trả về tọa độ và kích thước bounding box
\ No newline at end of file
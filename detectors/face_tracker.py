@@ -0,0 +1,99 @@
+﻿import time
+import numpy as np
+
+# Một khuôn mặt đang được theo dõi: id ổn định qua các frame và trạng thái riêng của nó
+class Track:
+    __slots__ = ('track_id', 'bbox', 'face', 'last_seen', 'hits', 'session')
+
+    def __init__(self, track_id, face, bbox, now, session):
+        self.track_id = track_id
+        self.face = face         # FaceLandmarks của lần thấy gần nhất
+        self.bbox = bbox         # (x, y, w, h)
+        self.last_seen = now
+        self.hits = 1            # Số frame đã ghép được
+        self.session = session   # Trạng thái liveness riêng (vd. LivenessSession)
+
+    @property
+    def area(self):
+        return self.bbox[2] * self.bbox[3]
+
+# Tính ma trận IoU giữa hai tập bbox (x, y, w, h) bằng broadcasting
+def iou_matrix(a, b):
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]; ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]; bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    iw = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    ih = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = iw * ih
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter
+    return inter / np.maximum(union, 1e-6)
+
+# FaceTracker gán id ổn định cho các khuôn mặt bằng ghép IoU và loại bỏ các track không còn xuất hiện
+class FaceTracker:
+    # get_bbox: hàm tính bbox từ FaceLandmarks (vd. FaceDetector.get_bbox)
+    # session_factory: hàm tạo trạng thái riêng cho track mới
+    # iou_threshold: IoU tối thiểu để coi là cùng một mặt
+    # max_idle: số giây không thấy mặt trước khi xoá track
+    def __init__(self, get_bbox, session_factory=None, iou_threshold=0.3, max_idle=1.0):
+        self.get_bbox = get_bbox
+        self.session_factory = session_factory
+        self.iou_threshold = iou_threshold
+        self.max_idle = max_idle
+        self.tracks = {}     # track_id -> Track
+        self.primary_id = None
+        self._next_id = 1
+
+    # Ghép các mặt của frame hiện tại vào track, trả về list Track thấy được trong frame này
+    def update(self, faces, now=None):
+        now = time.time() if now is None else now
+        bboxes = [self.get_bbox(f) for f in faces]
+        ids = list(self.tracks.keys())
+        assigned = [None] * len(faces)
+
+        if ids and faces:
+            iou = iou_matrix([self.tracks[i].bbox for i in ids], bboxes)
+            # Ghép tham lam theo IoU giảm dần (số mặt nhỏ nên ma trận T x F rất rẻ)
+            used_t, used_f = set(), set()
+            for flat in np.argsort(-iou, axis=None):
+                t, f = divmod(int(flat), len(faces))
+                if iou[t, f] < self.iou_threshold:
+                    break
+                if t in used_t or f in used_f:
+                    continue
+                used_t.add(t); used_f.add(f)
+                assigned[f] = ids[t]
+
+        visible = []
+        for f, (face, bbox) in enumerate(zip(faces, bboxes)):
+            tid = assigned[f]
+            if tid is None:
+                # Mặt mới -> tạo track mới
+                tid = self._next_id; self._next_id += 1
+                session = self.session_factory() if self.session_factory else None
+                self.tracks[tid] = Track(tid, face, bbox, now, session)
+            else:
+                track = self.tracks[tid]
+                track.face = face; track.bbox = bbox
+                track.last_seen = now; track.hits += 1
+            visible.append(self.tracks[tid])
+
+        # Loại bỏ các track đã lâu không xuất hiện
+        for tid in [i for i, t in self.tracks.items() if now - t.last_seen > self.max_idle]:
+            del self.tracks[tid]
+
+        self._update_primary(visible)
+        return visible
+
+    # Mặt chính (người đang đứng trước camera): giữ nguyên khi còn thấy, nếu mất thì chọn mặt lớn nhất
+    def _update_primary(self, visible):
+        if any(t.track_id == self.primary_id for t in visible):
+            return
+        self.primary_id = max(visible, key=lambda t: t.area).track_id if visible else None
+
+    def primary(self):
+        return self.tracks.get(self.primary_id)
+
+    def reset(self):
+        self.tracks.clear()
+        self.primary_id = None
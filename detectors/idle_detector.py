@@ -0,0 +1,73 @@
+﻿import time
+import threading
+import cv2
+import numpy as np
+
+# IdleDetector quyết định khi nào chuyển sang chế độ nghỉ tiết kiệm điện
+# Ở chế độ nghỉ: chỉ so sánh ảnh thu nhỏ xám với nền chạy (frame differencing), không chạy nhận diện
+class IdleDetector:
+    # idle_after: số giây không thấy mặt trước khi vào chế độ nghỉ
+    # idle_interval: khoảng nghỉ (giây) giữa hai lần đọc camera ở chế độ nghỉ
+    # thumb_size: kích thước ảnh thu nhỏ (w, h) dùng để so sánh
+    # diff_threshold: độ chênh lệch trung bình (0-255) so với nền để coi là có chuyển động
+    # bg_alpha: tốc độ cập nhật nền chạy (thích nghi với thay đổi ánh sáng chậm)
+    # on_change: hàm gọi khi vào / thoát chế độ nghỉ, nhận idle (bool), vd. để giảm tốc độ đọc camera
+    def __init__(self, idle_after=10.0, idle_interval=0.2, thumb_size=(64, 36), diff_threshold=8.0, bg_alpha=0.05,
+                 on_change=None):
+        self.idle_after = idle_after
+        self.idle_interval = idle_interval
+        self.thumb_size = thumb_size
+        self.diff_threshold = diff_threshold
+        self.bg_alpha = bg_alpha
+        self.on_change = on_change
+        # update (luồng nhận diện) và check_wake (luồng đọc camera) có thể chạy trên hai luồng khác nhau
+        self._lock = threading.Lock()
+
+        self.idle = False
+        self.last_active = time.time() # Lần gần nhất thấy mặt (hoặc thức dậy)
+        self.last_diff = 0.0
+        self.wakeups = 0
+        # Bộ đệm cấp phát sẵn cho ảnh thu nhỏ
+        tw, th = thumb_size
+        self._small = np.empty((th, tw, 3), dtype=np.uint8)
+        self._gray = np.empty((th, tw), dtype=np.uint8)
+        self._bg = None
+
+    # Gọi mỗi frame ở chế độ thường: vào chế độ nghỉ khi quá lâu không thấy mặt
+    def update(self, face_found, now=None):
+        with self._lock:
+            now = time.time() if now is None else now
+            if face_found:
+                self.last_active = now
+            elif now - self.last_active > self.idle_after and not self.idle:
+                self.idle = True
+                self._bg = None # Nền sẽ được khởi tạo từ frame nghỉ đầu tiên
+                if self.on_change: self.on_change(True)
+            return self.idle
+
+    # Gọi ở chế độ nghỉ: trả về True (và thoát chế độ nghỉ) nếu khung cảnh thay đổi
+    def check_wake(self, frame, now=None):
+        with self._lock:
+            if not self.idle:
+                return True # Đã thoát chế độ nghỉ (vd. luồng khác vừa thấy mặt)
+            cv2.resize(frame, self.thumb_size, dst=self._small, interpolation=cv2.INTER_AREA)
+            cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+
+            if self._bg is None:
+                self._bg = self._gray.astype(np.float32)
+                return False
+
+            self.last_diff = float(cv2.absdiff(self._gray, self._bg.astype(np.uint8)).mean())
+            if self.last_diff > self.diff_threshold:
+                self.idle = False
+                self.wakeups += 1
+                self.last_active = time.time() if now is None else now
+                if self.on_change: self.on_change(False)
+                return True
+
+            cv2.accumulateWeighted(self._gray, self._bg, self.bg_alpha) # Cập nhật nền chạy
+            return False
+
+    @property
+    def mode(self):
+        return "IDLE" if self.idle else "ACTIVE"
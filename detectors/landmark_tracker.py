@@ -0,0 +1,131 @@
+﻿import cv2
+import numpy as np
+from detectors.face_detector import FaceLandmarks
+
+# KeyframeTracker chỉ chạy FaceDetector trên các keyframe (mỗi N frame hoặc khi bám kém)
+# Giữa các keyframe, landmarks được đẩy tiếp bằng optical flow Lucas-Kanade dạng kim tự tháp
+class KeyframeTracker:
+    # detector: FaceDetector dùng cho keyframe
+    # keyframe_interval: N, số frame giữa hai lần chạy Face Mesh
+    # min_track_ratio: tỉ lệ điểm bám tốt tối thiểu, thấp hơn thì ép keyframe
+    # max_fb_error: sai số forward-backward tối đa (pixel) để coi một điểm là bám tốt
+    # blink_guard: khi EAR thấp hơn ngưỡng này (mắt đang khép) thì luôn chạy Face Mesh để không mất lần chớp mắt
+    def __init__(self, detector, keyframe_interval=3, min_track_ratio=0.8, max_fb_error=1.5,
+                 blink_guard=0.24, win_size=15, max_level=2):
+        self.detector = detector
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.min_track_ratio = min_track_ratio
+        self.max_fb_error = max_fb_error
+        self.blink_guard = blink_guard
+        self.lk_params = dict(
+            winSize=(win_size, win_size),
+            maxLevel=max_level,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)
+        )
+
+        # Bộ đệm ảnh xám luân phiên (frame trước / frame hiện tại)
+        self._gray = [None, None]
+        self._cur = 0
+        self.prev_faces = []
+        self.frames_since_key = 0
+        self.force_keyframe = True
+
+        # Bộ đếm thống kê
+        self.keyframes = 0
+        self.propagated = 0
+        self.confidence = 0.0 # Tỉ lệ điểm bám tốt ở frame gần nhất (mặt kém nhất)
+
+    # Xóa trạng thái bám (khi chuyển sang một nguồn video khác), giữ nguyên bộ đếm thống kê
+    def reset(self):
+        self.detector.reset()
+        self._gray = [None, None]
+        self._cur = 0
+        self.prev_faces = []
+        self.frames_since_key = 0
+        self.force_keyframe = True
+
+    # Cùng giao diện với FaceDetector.detect: trả về FaceLandmarks của mặt đầu tiên hoặc None
+    def detect(self, image):
+        faces = self.detect_all(image)
+        return faces[0] if faces else None
+
+    # Cùng giao diện với FaceDetector.detect_all: trả về list FaceLandmarks
+    def detect_all(self, image):
+        gray = self._to_gray(image)
+        prev_gray = self._gray[1 - self._cur]
+
+        faces = None
+        need_key = (self.force_keyframe or not self.prev_faces or prev_gray is None
+                    or self.frames_since_key + 1 >= self.keyframe_interval)
+        if not need_key:
+            faces = self._propagate(prev_gray, gray, image.shape)
+
+        if faces is None:
+            faces = self.detector.detect_all(image)
+            self.frames_since_key = 0
+            self.keyframes += 1
+            self.confidence = 1.0 if faces else 0.0
+        else:
+            self.frames_since_key += 1
+            self.propagated += 1
+            # Giúp chế độ bám vùng của FaceDetector đi theo mặt ở các frame không chạy Face Mesh
+            self.detector.last_bboxes = [self.detector.get_bbox(f) for f in faces]
+
+        # Có mắt đang khép -> frame sau bắt buộc là keyframe
+        self.force_keyframe = not faces or any(f.metrics()[0] < self.blink_guard for f in faces)
+        self.prev_faces = faces
+        self._cur = 1 - self._cur # Đổi vai hai bộ đệm
+        return faces
+
+    def get_bbox(self, face):
+        return self.detector.get_bbox(face)
+
+    # Chuyển sang ảnh xám, ghi vào bộ đệm đã cấp phát
+    def _to_gray(self, image):
+        buf = self._gray[self._cur]
+        if buf is None or buf.shape != image.shape[:2]:
+            buf = np.empty(image.shape[:2], dtype=np.uint8)
+            self._gray[self._cur] = buf
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=buf)
+        return buf
+
+    # Đẩy landmarks của mọi mặt từ frame trước sang frame hiện tại trong một lần gọi optical flow
+    # Trả về None nếu có mặt bám kém (khi đó cần keyframe)
+    def _propagate(self, prev_gray, gray, shape):
+        if prev_gray.shape != gray.shape:
+            return None
+        h, w = shape[:2]
+        counts = [len(f.points) for f in self.prev_faces]
+        p0 = np.concatenate([f.pixels() for f in self.prev_faces]).reshape(-1, 1, 2).astype(np.float32)
+
+        p1, st, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, p0, None, **self.lk_params)
+        if p1 is None:
+            return None
+        # Kiểm tra ngược (forward-backward) để loại các điểm trôi
+        p0r, st_back, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, p1, None, **self.lk_params)
+        fb_err = np.linalg.norm((p0 - p0r).reshape(-1, 2), axis=1)
+        good = (st.ravel() == 1) & (st_back.ravel() == 1) & (fb_err < self.max_fb_error)
+        p0 = p0.reshape(-1, 2); p1 = p1.reshape(-1, 2)
+
+        faces = []
+        start = 0
+        confidence = 1.0
+        for face, n in zip(self.prev_faces, counts):
+            sl = slice(start, start + n); start += n
+            g = good[sl]
+            confidence = min(confidence, float(g.mean()))
+            if confidence < self.min_track_ratio:
+                self.confidence = confidence
+                return None
+            q0, q1 = p0[sl], p1[sl]
+            # Điểm bám hỏng: dịch theo độ dời trung vị của các điểm tốt
+            shift = np.median(q1[g] - q0[g], axis=0)
+            q1[~g] = q0[~g] + shift
+
+            points = face.points.copy() # Giữ nguyên z (optical flow không có chiều sâu)
+            points[:, 0] = q1[:, 0] / w
+            points[:, 1] = q1[:, 1] / h
+            faces.append(FaceLandmarks(points, w, h))
+
+        self.confidence = confidence
+        return faces
@@ -0,0 +1,125 @@
+﻿import time
+import random
+from detectors.motion_detector import MotionDetector
+
+# --- CÁC TRẠNG THÁI CỦA MỘT PHIÊN KIỂM TRA ---
+STATE_WAITING = 0      # Chờ ổn định: thu thập lịch sử chuyển động
+STATE_ANALYZING = 1    # Phân tích: kiểm tra ảnh tĩnh/động
+STATE_CHALLENGE = 2    # Thử thách: yêu cầu người dùng hành động
+STATE_RESULT = 3       # Kết quả
+
+# --- MÃ KẾT QUẢ (mỗi giao diện tự ánh xạ sang chữ/màu hiển thị) ---
+RESULT_STATIC = "STATIC"     # Chuyển động quá thấp ngay khi phân tích -> ảnh tĩnh
+RESULT_SPOOF = "SPOOF"       # Chuyển động tụt thấp trong lúc thử thách
+RESULT_GRANTED = "GRANTED"   # Vượt qua thử thách
+RESULT_TIMEOUT = "TIMEOUT"   # Hết thời gian thử thách
+RESULT_TEXTURE = "TEXTURE"   # TextureCNN đánh giá ảnh mặt là giả (ảnh in / màn hình)
+
+CHALLENGES = ["SMILE", "SURPRISE", "BLINK"]
+# Cảm xúc cần thấy để vượt qua từng thử thách
+CHALLENGE_EMOTION = {"SMILE": "SMILING", "SURPRISE": "SURPRISED", "BLINK": "BLINKING"}
+
+# LivenessSession giữ toàn bộ trạng thái kiểm tra của một khuôn mặt:
+# lịch sử chuyển động, bộ đếm chớp mắt và máy trạng thái thử thách
+class LivenessSession:
+    # static_threshold: dưới ngưỡng này khi phân tích -> ảnh tĩnh
+    # spoof_threshold: dưới ngưỡng này trong lúc thử thách -> giả mạo (mặc định bằng static_threshold)
+    # warmup_frames: số frame cần thu thập trước khi phân tích
+    # texture_threshold: xác suất là thật (TextureCNN) thấp hơn ngưỡng này -> giả mạo
+    # texture_max_age: chỉ dùng điểm texture mới hơn số giây này
+    def __init__(self, static_threshold=1.5, spoof_threshold=None, challenge_limit=5.0,
+                 result_hold=3.0, warmup_frames=20, texture_threshold=0.5, texture_max_age=1.0):
+        self.static_threshold = static_threshold
+        self.spoof_threshold = static_threshold if spoof_threshold is None else spoof_threshold
+        self.challenge_limit = challenge_limit
+        self.result_hold = result_hold
+        self.warmup_frames = warmup_frames
+        self.texture_threshold = texture_threshold
+        self.texture_max_age = texture_max_age
+        self.motion_det = MotionDetector()
+        self.reset()
+
+    # Đặt lại toàn bộ trạng thái về ban đầu
+    def reset(self):
+        self.state = STATE_WAITING
+        self.challenge_type = ""
+        self.challenge_timer = 0
+        self.result = None
+        self.result_timer = 0
+        self.blink_count = 0
+        self.is_eye_closed = False
+        self.motion_score = 0.0
+        self.texture_score = None # Xác suất là thật mới nhất (None nếu chưa có)
+        self.motion_det.reset()
+
+    # Thời gian còn lại của thử thách (giây)
+    def time_left(self, now=None):
+        now = time.time() if now is None else now
+        return self.challenge_limit - (now - self.challenge_timer)
+
+    def _finish(self, result, now):
+        self.state = STATE_RESULT
+        self.result = result
+        self.result_timer = now
+
+    # Điểm texture còn đủ mới có cho thấy ảnh giả không
+    def _texture_fake(self, texture, now):
+        if texture is None:
+            return False
+        score, timestamp = texture
+        return now - timestamp <= self.texture_max_age and score < self.texture_threshold
+
+    # Cập nhật phiên với landmarks và cảm xúc của frame hiện tại, trả về trạng thái mới
+    # texture: (xác suất là thật, timestamp) mới nhất từ TextureWorker, hoặc None nếu chưa có
+    def update(self, face, emotion, now=None, texture=None):
+        now = time.time() if now is None else now
+        if texture is not None:
+            self.texture_score = texture[0]
+
+        # Logic đếm số lần chớp mắt
+        if "BLINKING" in emotion or "CLOSED" in emotion:
+            if not self.is_eye_closed: self.is_eye_closed = True
+        else:
+            if self.is_eye_closed: self.blink_count += 1; self.is_eye_closed = False
+
+        # Tính điểm chuyển động (Liveness Score)
+        self.motion_score = self.motion_det.update(face)
+
+        # Giai đoạn: CHỜ ỔN ĐỊNH
+        if self.state == STATE_WAITING:
+            # Nếu thu thập đủ số frame thì chuyển sang phân tích
+            if len(self.motion_det.history) >= self.warmup_frames:
+                self.state = STATE_ANALYZING
+
+        # Giai đoạn: PHÂN TÍCH ĐỘ TĨNH
+        elif self.state == STATE_ANALYZING:
+            if self.motion_score < self.static_threshold:
+                self._finish(RESULT_STATIC, now)
+            elif self._texture_fake(texture, now):
+                self._finish(RESULT_TEXTURE, now)
+            else:
+                # Chuyển động tốt -> chọn thử thách ngẫu nhiên
+                self.challenge_type = random.choice(CHALLENGES)
+                self.challenge_timer = now
+                self.state = STATE_CHALLENGE
+
+        # Giai đoạn: THỰC HIỆN THỬ THÁCH
+        elif self.state == STATE_CHALLENGE:
+            if self.motion_score < self.spoof_threshold:
+                self._finish(RESULT_SPOOF, now)
+            elif self._texture_fake(texture, now):
+                self._finish(RESULT_TEXTURE, now)
+            # Kiểm tra hành động người dùng
+            elif CHALLENGE_EMOTION.get(self.challenge_type, "?") in emotion:
+                self._finish(RESULT_GRANTED, now)
+            elif self.time_left(now) <= 0:
+                self._finish(RESULT_TIMEOUT, now)
+
+        # Giai đoạn: HIỂN THỊ KẾT QUẢ
+        elif self.state == STATE_RESULT:
+            if now - self.result_timer > self.result_hold:
+                self.state = STATE_WAITING
+                self.motion_det.reset()
+                self.blink_count = 0
+
+        return self.state
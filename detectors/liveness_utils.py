@@ -1,4 +1,6 @@
 ﻿from scipy.spatial import distance as dist
+import numpy as np
+from utils.landmarks import DIST_PAIRS
 
 # Hàm tính Eye Aspect Ratio (EAR)
 def eye_aspect_ratio(eye):
@@ -20,3 +22,16 @@ def mouth_aspect_ratio(mouth):
     
     mar = (A + B + C) / (2.0 * D)
     return mar
+
+# Tính EAR, MAR và khoảng cách lông mày - mắt trong một lần vector hóa
+# px: mảng tọa độ pixel (478, 2) của một khuôn mặt
+def face_metrics(px):
+    # Khoảng cách của tất cả các cặp điểm trong DIST_PAIRS cùng lúc
+    d = np.linalg.norm(px[DIST_PAIRS[:, 0]] - px[DIST_PAIRS[:, 1]], axis=1)
+    # d[0:2]: dọc 1, d[2:4]: dọc 2, d[4:6]: ngang (trái, phải)
+    ear_lr = (d[0:2] + d[2:4]) / (2.0 * np.maximum(d[4:6], 1e-6))
+    ear = float(ear_lr.mean())
+    # MAR (Mouth Aspect Ratio) = chiều cao / chiều rộng
+    mar = float(d[7] / d[6]) if d[6] > 0 else 0.0
+    brow = float(d[8])
+    return ear, mar, brow
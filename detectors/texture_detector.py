@@ -1,48 +1,105 @@
-﻿import torch
-import torch.nn.functional as F
-from torchvision import transforms
-from PIL import Image
-import cv2
+﻿import cv2
 import numpy as np
-from models.texture_cnn import TextureCNN
 import os
 
+# Kích thước ảnh đầu vào của TextureCNN (khớp với fc1 = 64*8*8 và train_texture_cnn.py)
+INPUT_SIZE = 64
+
+# Các backend suy luận: PyTorch (file .pth), ONNX Runtime CPU (file .onnx, tạo bằng export_onnx.py)
+# hoặc PyTorch INT8 (TorchScript .pt, tạo bằng quantize_texture_cnn.py)
+BACKENDS = ('torch', 'onnx', 'int8')
+
+# Softmax theo trục lớp bằng NumPy (dùng cho backend ONNX)
+def _softmax(logits):
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
 # TextureDetector sử dụng mô hình CNN để phân loại ảnh mặt người là thật hay giả
 class TextureDetector:
     # Khởi tạo bộ phát hiện với đường dẫn mô hình đã huấn luyện
-    def __init__(self, model_path, device='cpu'):
+    # backend='onnx' không cần import torch (khởi động nhanh và nhẹ hơn cho máy kiosk)
+    def __init__(self, model_path, device='cpu', backend='torch'):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
         self.device = device
-        self.model = TextureCNN(num_classes=2).to(self.device) # Khởi tạo mô hình
+        self.backend = backend
         self.loaded = False
         # Tải trọng số mô hình đã huấn luyện
         if os.path.exists(model_path):
-            self.model.load_state_dict(torch.load(model_path, map_location=self.device)) # Load model
-            self.model.eval() # Chuyển sang chế độ đánh giá
-            self.loaded = True 
-            print(f"[INFO] Model loaded: {model_path}")
+            try:
+                if backend == 'onnx':
+                    self._load_onnx(model_path)
+                elif backend == 'int8':
+                    self._load_int8(model_path)
+                else:
+                    self._load_torch(model_path)
+                self.loaded = True
+                print(f"[INFO] Model loaded ({backend}): {model_path}")
+            except ImportError as e:
+                # Thiếu thư viện của backend (torch / onnxruntime) -> chạy tiếp không có điểm texture
+                print(f"[WARNING] Backend '{backend}' unavailable: {e}")
         else:
             print(f"[WARNING] Model not found: {model_path}. Please train first!")
 
-        # Thiết lập biến đổi ảnh đầu vào
-        self.transform = transforms.Compose([
-            transforms.Resize((32, 32)), # Resize chuẩn input của model
-            transforms.ToTensor(),
-            transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
-        ])
+        # Bộ đệm đầu vào (N, 3, 64, 64) cấp phát sẵn, chỉ cấp phát lại khi batch lớn hơn
+        self._batch = np.empty((0, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+        self._resized = np.empty((INPUT_SIZE, INPUT_SIZE, 3), dtype=np.uint8)
+
+    def _load_torch(self, model_path):
+        import torch
+        from models.texture_cnn import TextureCNN
+        # Khởi tạo mô hình khớp với trọng số (mô hình gốc hoặc biến thể đã tỉa)
+        self.model = TextureCNN.from_state_dict(torch.load(model_path, map_location=self.device)).to(self.device)
+        self.model.eval() # Chuyển sang chế độ đánh giá
+
+    def _load_int8(self, model_path):
+        import torch
+        self.model = torch.jit.load(model_path, map_location='cpu') # Model lượng tử hóa chỉ chạy trên CPU
+        self.model.eval()
+        self.device = 'cpu'
+
+    def _load_onnx(self, model_path):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    # Tiền xử lý bằng OpenCV/NumPy: resize 64x64, BGR -> RGB, chuẩn hóa về [-1, 1] (như Normalize(0.5, 0.5))
+    # Ghi thẳng vào bộ đệm, trả về view (N, 3, 64, 64)
+    def _preprocess(self, crops):
+        n = len(crops)
+        if self._batch.shape[0] < n:
+            self._batch = np.empty((n, 3, INPUT_SIZE, INPUT_SIZE), dtype=np.float32)
+        batch = self._batch[:n]
+        for i, crop in enumerate(crops):
+            cv2.resize(crop, (INPUT_SIZE, INPUT_SIZE), dst=self._resized, interpolation=cv2.INTER_AREA)
+            # HWC (BGR) -> CHW (RGB): đảo kênh và chuyển trục trong một phép gán
+            batch[i] = self._resized[:, :, ::-1].transpose(2, 0, 1)
+        batch *= 1.0 / 127.5
+        batch -= 1.0
+        return batch
+
+    # Dự đoán độ thật cho nhiều ảnh mặt (BGR) một lần, trả về mảng xác suất là thật (0.0 - 1.0)
+    def predict_batch(self, crops):
+        if not self.loaded or len(crops) == 0:
+            return np.zeros(len(crops), dtype=np.float32) # Nếu model chưa load, trả về 0.0
+
+        batch = self._preprocess(crops)
+        if self.backend == 'onnx':
+            probs = _softmax(self.session.run(None, {self.input_name: batch})[0])
+            return probs[:, 1] # Giả sử index 1 là Real
+        return self._run_torch(batch)
+
+    def _run_torch(self, batch):
+        import torch
+        import torch.nn.functional as F
+        inputs = torch.from_numpy(batch).to(self.device) # Không sao chép trên CPU
+        with torch.inference_mode():
+            outputs = self.model(inputs)
+            probs = F.softmax(outputs, dim=1)
+            real_scores = probs[:, 1].cpu().numpy() # Giả sử index 1 là Real
+
+        return real_scores
 
     # Dự đoán độ thật của ảnh mặt (trả về xác suất là thật từ 0.0 đến 1.0)
     def predict(self, face_bgr):
-        if not self.loaded: return 0.0 # Nếu model chưa load, trả về 0.0
-        
-        # Chuyển đổi sang format model hiểu
-        img_rgb = cv2.cvtColor(face_bgr, cv2.COLOR_BGR2RGB) #   Chuyển BGR sang RGB
-        pil_img = Image.fromarray(img_rgb) # Chuyển sang PIL Image
-        img_tensor = self.transform(pil_img).unsqueeze(0).to(self.device) # Thêm batch dimension và chuyển device
-        
-        # Dự đoán với mô hình
-        with torch.no_grad():
-            outputs = self.model(img_tensor)
-            probs = F.softmax(outputs, dim=1)
-            real_score = probs[0][1].item() # Giả sử index 1 là Real
-            
-        return real_score
\ No newline at end of file
+        return float(self.predict_batch([face_bgr])[0])
@@ -0,0 +1,137 @@
+﻿import time
+import threading
+import cv2
+import numpy as np
+
+# TextureScoreCache nhớ điểm texture theo từng track để không chạy lại CNN trên các frame gần như giống nhau
+# Chữ ký rẻ của ảnh mặt: ảnh xám thu nhỏ 16x16; chỉ chạy lại CNN khi ảnh đổi quá ngưỡng hoặc kết quả quá cũ
+class TextureScoreCache:
+    # diff_threshold: chênh lệch trung bình (0-255) của chữ ký để coi là ảnh đã thay đổi
+    # ttl: tuổi tối đa (giây) của điểm đã lưu
+    # ema_alpha: hệ số làm mượt điểm theo trung bình động mũ (EMA)
+    def __init__(self, diff_threshold=6.0, ttl=1.0, ema_alpha=0.3, thumb_size=16):
+        self.diff_threshold = diff_threshold
+        self.ttl = ttl
+        self.ema_alpha = ema_alpha
+        self.thumb_size = thumb_size
+        self._entries = {} # track_id -> [chữ ký, điểm EMA, thời điểm chạy CNN]
+
+        # Bộ đếm: dùng lại điểm đã nhớ / phải chạy CNN
+        self.hits = 0
+        self.misses = 0
+        self._started = time.time()
+
+    # Chữ ký rẻ: thu nhỏ trước rồi mới đổi sang ảnh xám
+    def signature(self, crop):
+        small = cv2.resize(crop, (self.thumb_size, self.thumb_size), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.float32)
+
+    # Trả về điểm đã nhớ nếu ảnh chưa đổi và còn hạn, ngược lại None
+    def lookup(self, track_id, sig, now):
+        entry = self._entries.get(track_id)
+        if entry is not None and now - entry[2] <= self.ttl \
+                and float(np.abs(sig - entry[0]).mean()) < self.diff_threshold:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    # Lưu điểm mới của CNN, trả về điểm đã làm mượt
+    def store(self, track_id, sig, score, now):
+        entry = self._entries.get(track_id)
+        if entry is not None:
+            score = self.ema_alpha * score + (1 - self.ema_alpha) * entry[1]
+        self._entries[track_id] = [sig, score, now]
+        return score
+
+    def forget(self, live_ids):
+        for tid in [t for t in list(self._entries) if t not in live_ids]:
+            self._entries.pop(tid, None)
+
+    # Tỉ lệ dùng lại điểm đã nhớ
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    # Số lần chạy CNN thực tế mỗi giây
+    @property
+    def inference_rate(self):
+        return self.misses / max(time.time() - self._started, 1e-6)
+
+# TextureWorker chấm điểm TextureCNN trên luồng nền để vòng lặp khung hình không bị chặn
+# Chỉ giữ ảnh mặt mới nhất: ảnh cũ chưa kịp chấm sẽ bị bỏ (đếm trong self.dropped)
+class TextureWorker(threading.Thread):
+    # detector: TextureDetector đã nạp model
+    # num_threads: số luồng PyTorch cho suy luận (giữ nhỏ để không tranh CPU với vòng lặp camera)
+    # cache: TextureScoreCache (mặc định tạo mới); None để luôn chạy CNN
+    def __init__(self, detector, num_threads=1, cache=True):
+        super().__init__(daemon=True)
+        self.detector = detector
+        self.num_threads = num_threads
+        self.cache = TextureScoreCache() if cache is True else (cache or None)
+        self._cond = threading.Condition()
+        self._pending = None   # (track_id, crop, timestamp) mới nhất chưa chấm
+        self._results = {}     # track_id -> (xác suất là thật, timestamp của ảnh)
+        self._running = True
+
+        # Bộ đếm thống kê
+        self.submitted = 0
+        self.dropped = 0
+        self.scored = 0
+        self.last_latency = 0.0 # Thời gian chấm một ảnh gần nhất (giây)
+
+    # Gửi ảnh mặt mới nhất của một track (không chặn)
+    def submit(self, track_id, crop, timestamp=None):
+        if crop is None:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1 # Ảnh trước chưa kịp chấm -> bỏ
+            self._pending = (track_id, crop, timestamp)
+            self.submitted += 1
+            self._cond.notify()
+
+    # Đọc kết quả mới nhất của một track (không chặn): (xác suất là thật, timestamp) hoặc None
+    def result(self, track_id):
+        return self._results.get(track_id)
+
+    # Xoá kết quả của các track không còn tồn tại
+    def forget(self, live_ids):
+        for tid in [t for t in list(self._results) if t not in live_ids]: # list() sao chép các khoá nguyên tử (luồng nền có thể đang ghi)
+            self._results.pop(tid, None)
+        if self.cache:
+            self.cache.forget(live_ids)
+
+    def run(self):
+        if self.detector.backend != 'onnx':
+            import torch
+            torch.set_num_threads(self.num_threads)
+
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                track_id, crop, timestamp = self._pending
+                self._pending = None
+
+            now = time.time()
+            sig = self.cache.signature(crop) if self.cache else None
+            score = self.cache.lookup(track_id, sig, now) if self.cache else None
+            if score is None:
+                t0 = time.perf_counter()
+                score = float(self.detector.predict_batch([crop])[0])
+                self.last_latency = time.perf_counter() - t0
+                self.scored += 1
+                if self.cache:
+                    score = self.cache.store(track_id, sig, score, now)
+            self._results[track_id] = (score, timestamp) # Gán dict là nguyên tử, bên đọc không cần khoá
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self.join(timeout=1.0)
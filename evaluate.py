@@ -1,5 +1,6 @@
 ﻿import sys
 import os
+import time
 import torch
 from torchvision import datasets, transforms
 from torch.utils.data import DataLoader
@@ -21,14 +22,99 @@ except ImportError:
     sys.path.append(parent_dir)
     from models.texture_cnn import TextureCNN
 
+from utils.dataset_cache import build_cache, default_cache_dir, CachedImageDataset, normalize_batch
+from utils.split_manifest import read_manifest, split_items, split_root, manifest_cache_dir, ManifestDataset
+from utils.metrics import SpoofMetrics, throughput_profile, compare_reports, load_report, save_report
+
+# Biến đổi ảnh đầu vào (giống lúc train)
+def get_transform():
+    return transforms.Compose([
+        transforms.Resize((64, 64)),
+        transforms.ToTensor(),
+        transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)) # Chuẩn hóa
+    ])
+
+# Tạo DataLoader; workers > 0 thì giữ tiến trình worker sống giữa các epoch và nạp trước prefetch batch mỗi worker
+# sampler (vd. DistributedSampler) thay cho shuffle
+def make_loader(data, batch_size=32, shuffle=False, workers=0, prefetch=2, pin_memory=False, sampler=None):
+    kwargs = {'num_workers': workers, 'pin_memory': pin_memory}
+    if workers > 0:
+        kwargs.update(persistent_workers=True, prefetch_factor=prefetch)
+    return DataLoader(data, batch_size=batch_size, shuffle=shuffle, sampler=sampler, **kwargs)
+
+# Tạo Dataset cho một thư mục ảnh dạng ImageFolder, hoặc cho một tập ('train' / 'test') của manifest chia tập
+# cache=True: đọc từ cache memmap đã tiền xử lý (tạo/cập nhật tăng dần trước khi dùng), batch ra là uint8
+def load_dataset(data_dir, cache=False, manifest=None, split='test'):
+    if manifest:
+        m = read_manifest(manifest)
+        if cache:
+            return CachedImageDataset(build_cache(split_root(m, split), manifest_cache_dir(manifest, split),
+                                                  classes=m['classes'], items=split_items(m, split)))
+        return ManifestDataset(m, split, transform=get_transform())
+    if cache:
+        return CachedImageDataset(build_cache(data_dir, default_cache_dir(data_dir)))
+    return datasets.ImageFolder(root=data_dir, transform=get_transform())  # Load dữ liệu
+
+# Tạo DataLoader cho một thư mục ảnh (hoặc một tập của manifest), trả về (dataset, loader)
+def build_loader(data_dir, batch_size=32, shuffle=False, cache=False, manifest=None, split='test', **loader_kwargs):
+    data = load_dataset(data_dir, cache, manifest, split)
+    return data, make_loader(data, batch_size, shuffle, **loader_kwargs)
+
+# Đưa batch lên thiết bị; batch uint8 từ cache được chuẩn hóa sau khi chuyển (truyền ít dữ liệu hơn 4 lần)
+def to_device(images, device):
+    images = images.to(device, non_blocking=True) # Không chặn nếu batch nằm trong pinned memory
+    return normalize_batch(images) if images.dtype == torch.uint8 else images
+
+# Đếm số dự đoán đúng của mô hình trên loader, trả về (correct, total)
+def count_correct(model, loader, device='cpu'):
+    correct = 0
+    total = 0
+    with torch.no_grad(): # Không tính toán đạo hàm cho nhẹ
+        for images, labels in loader: # Lặp qua từng batch
+            images, labels = to_device(images, device), labels.to(device) # Đưa lên GPU nếu có
+            
+            outputs = model(images) # Dự đoán
+            _, predicted = torch.max(outputs.data, 1) # Lấy nhãn dự đoán
+            
+            total += labels.size(0) # Cộng số ảnh đã đo
+            correct += (predicted == labels).sum().item() # Cộng số dự đoán đúng
+    return correct, total
+
+# Tích lũy chỉ số chống giả mạo (APCER/BPCER/ACER/EER/ROC + ma trận nhầm lẫn) trên loader
+def collect_metrics(model, loader, real_label, num_classes, threshold=0.5, device='cpu'):
+    metrics = SpoofMetrics(num_classes=num_classes, real_label=real_label, threshold=threshold)
+    with torch.inference_mode():
+        for images, labels in loader:
+            outputs = model(to_device(images, device))
+            probs = torch.softmax(outputs, dim=1)
+            metrics.update(probs[:, real_label].cpu().numpy(), labels.numpy(), outputs.argmax(dim=1).cpu().numpy())
+    return metrics
+
+# Độ trễ trung vị (ms) của một lần forward với batch_size ảnh trên thiết bị hiện tại
+def latency_ms(model, batch_size=1, runs=200, warmup=20, device='cpu'):
+    x = torch.randn(batch_size, 3, 64, 64, device=device)
+    times = []
+    with torch.inference_mode():
+        for i in range(warmup + runs):
+            t0 = time.perf_counter()
+            model(x)
+            if i >= warmup:
+                times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return times[len(times) // 2]
+
 # Hàm đánh giá mô hình trên tập test
-def evaluate():
+# output: ghi báo cáo JSON (chỉ số + thông lượng); baseline: so sánh với báo cáo JSON đã lưu
+# Trả về False nếu có chỉ số tụt so với baseline
+# manifest: đánh giá trên tập 'test' của manifest chia tập (utils/split_manifest.py) thay cho data/test
+def evaluate(cache=False, model_path=None, output=None, baseline=None, threshold=0.5, batch_sizes=(1, 8, 32, 128),
+             manifest=None):
     DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu') # Sử dụng GPU nếu có
     print(f"[INFO] Đang chạy trên thiết bị: {DEVICE}") # In thiết bị
     
     # Đường dẫn đến folder test và file model
-    test_dir = os.path.join(current_dir, 'data', 'test')
-    model_path = os.path.join(current_dir, 'models', 'trained_model.pth')
+    test_dir = manifest or os.path.join(current_dir, 'data', 'test')
+    model_path = model_path or os.path.join(current_dir, 'models', 'trained_model.pth')
 
     # In thông tin
     print(f"[INFO] Dữ liệu test: {test_dir}")
@@ -47,15 +133,8 @@ def evaluate():
         return
 
     #LOAD DỮ LIỆU
-    transform = transforms.Compose([
-        transforms.Resize((64, 64)),
-        transforms.ToTensor(),
-        transforms.Normalize((0.5, 0.5, 0.5), (0.5, 0.5, 0.5)) # Chuẩn hóa
-    ])
-
     try: # Đọc dữ liệu test
-        test_data = datasets.ImageFolder(root=test_dir, transform=transform)  # Load dữ liệu
-        test_loader = DataLoader(test_data, batch_size=32, shuffle=False)
+        test_data, test_loader = build_loader(test_dir, batch_size=32, cache=cache, manifest=manifest, split='test')
     except Exception as e:
         print(f"[LỖI] Không đọc được dữ liệu ảnh: {e}")
         return
@@ -67,37 +146,75 @@ def evaluate():
 
     #LOAD MODEL & ĐÁNH GIÁ
     try:
-        model = TextureCNN(num_classes=num_classes).to(DEVICE)
-        model.load_state_dict(torch.load(model_path, map_location=DEVICE))
+        model = TextureCNN.from_state_dict(torch.load(model_path, map_location=DEVICE)).to(DEVICE)
+        if model.fc2.out_features != num_classes:
+            raise ValueError(f"model has {model.fc2.out_features} classes, test set has {num_classes}")
         model.eval() # Chuyển sang chế độ đánh giá (quan trọng!)
     except Exception as e:
         print(f"[LỖI LOAD MODEL] Có thể số lượng lớp (num_classes) không khớp hoặc file lỗi.")
         print(f"Chi tiết: {e}")
         return
 
-    correct = 0
-    total = 0
-    
     print("\nĐang chấm điểm...") 
-    
-    with torch.no_grad(): # Không tính toán đạo hàm cho nhẹ
-        for images, labels in test_loader: # Lặp qua từng batch
-            images, labels = images.to(DEVICE), labels.to(DEVICE) # Đưa lên GPU nếu có
-            
-            outputs = model(images) # Dự đoán
-            _, predicted = torch.max(outputs.data, 1) # Lấy nhãn dự đoán
-            
-            total += labels.size(0) # Cộng số ảnh đã đo
-            correct += (predicted == labels).sum().item() # Cộng số dự đoán đúng
+    # Lớp "thật": theo tên thư mục nếu có, nếu không giả định index 1 (như TextureDetector)
+    real_label = next((i for c, i in test_data.class_to_idx.items() if c.lower() in ('real', 'live')), 1)
+    metrics = collect_metrics(model, test_loader, real_label, num_classes, threshold, DEVICE)
+    total = metrics.count
 
-    if total > 0: # Tránh chia cho 0
-        accuracy = 100 * correct / total # Tính độ chính xác
-        print("="*50)
-        print(f"KẾT QUẢ ĐÁNH GIÁ TRÊN {total} ẢNH:") # In kết quả
-        print(f"Độ chính xác (Accuracy): {accuracy:.2f}%") 
-        print("="*50)
-    else:
+    if total == 0: # Tránh chia cho 0
         print("[CẢNH BÁO] Không có ảnh nào trong tập test để chấm điểm.")
+        return
+
+    summary = metrics.summary()
+    print("\nĐang đo thông lượng...")
+    throughput = throughput_profile(model, batch_sizes, device=str(DEVICE))
+
+    print("="*50)
+    print(f"KẾT QUẢ ĐÁNH GIÁ TRÊN {total} ẢNH:") # In kết quả
+    print(f"Độ chính xác (Accuracy): {100 * summary['accuracy']:.2f}%") 
+    print(f"APCER: {100 * summary['apcer']:.2f}% | BPCER: {100 * summary['bpcer']:.2f}% | "
+          f"ACER: {100 * summary['acer']:.2f}% (ngưỡng {summary['threshold']:.2f})")
+    print(f"EER: {100 * summary['eer']['eer']:.2f}% (ngưỡng {summary['eer']['threshold']:.3f}) | AUC: {summary['auc']:.4f}")
+    print(f"Ma trận nhầm lẫn (hàng = nhãn, cột = dự đoán, {test_data.classes}): {summary['confusion']}")
+    print("-"*50)
+    print(f"{'Batch':>5} | {'p50':>8} | {'p95':>8} | {'p99':>8} | {'Ảnh/giây':>10}")
+    for bs, t in throughput.items():
+        print(f"{bs:>5} | {t['p50_ms']:>5.2f} ms | {t['p95_ms']:>5.2f} ms | {t['p99_ms']:>5.2f} ms | {t['images_per_sec']:>10.1f}")
+    print("="*50)
+
+    report = {
+        'model': os.path.basename(model_path),
+        'test_dir': test_dir,
+        'device': str(DEVICE),
+        'classes': test_data.classes,
+        'real_label': real_label,
+        'metrics': summary,
+        'throughput': throughput,
+    }
+    if output:
+        save_report(report, output)
+        print(f"[INFO] Đã ghi báo cáo JSON: {output}")
+
+    if baseline:
+        regressions = compare_reports(report, load_report(baseline))
+        if regressions:
+            print(f"[CẢNH BÁO] {len(regressions)} chỉ số kém hơn baseline ({baseline}):")
+            for r in regressions:
+                print(f"  - {r['metric']}: {r['baseline']} -> {r['current']}")
+            return False
+        print(f"[INFO] Không có chỉ số nào kém hơn baseline ({baseline}).")
+    return True
 
 if __name__ == '__main__':
-    evaluate()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Evaluate TextureCNN on data/test")
+    parser.add_argument('--cache', action='store_true', help="read data/test from the memory-mapped cache (data/cache/test)")
+    parser.add_argument('--model', default=None, help="model weights (default: models/trained_model.pth)")
+    parser.add_argument('--json', default=None, help="write the metrics + throughput report to this JSON file")
+    parser.add_argument('--baseline', default=None, help="baseline JSON report; exit 1 if any metric regresses")
+    parser.add_argument('--threshold', type=float, default=0.5, help="real-probability acceptance threshold")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--manifest', default=None, help="evaluate the 'test' split of a split manifest instead of data/test")
+    args = parser.parse_args()
+    ok = evaluate(args.cache, args.model, args.json, args.baseline, args.threshold, args.batch_sizes, args.manifest)
+    sys.exit(0 if ok else 1)
\ No newline at end of file
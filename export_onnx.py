@@ -0,0 +1,68 @@
+import os
+import sys
+import argparse
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# Tự động sửa đường dẫn import để tránh lỗi "ModuleNotFoundError"
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path: sys.path.append(current_dir)
+
+from models.texture_cnn import TextureCNN
+
+INPUT_SIZE = 64 # Kích thước ảnh đầu vào của TextureCNN
+
+# Xuất TextureCNN (trained_model.pth) sang ONNX với trục batch động
+def export(model_path, onnx_path, opset=13):
+    model = TextureCNN.from_state_dict(torch.load(model_path, map_location='cpu'))
+    model.eval()
+
+    dummy = torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE)
+    torch.onnx.export(
+        model, dummy, onnx_path,
+        input_names=['input'], output_names=['logits'],
+        dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+        opset_version=opset,
+    )
+    print(f"[THÀNH CÔNG] Đã xuất ONNX: {onnx_path}")
+    return model
+
+# So sánh xác suất của ONNX Runtime với PyTorch trên một batch ngẫu nhiên
+def verify(model, onnx_path, batch_size=8, atol=1e-4):
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        print("[CẢNH BÁO] Chưa cài onnxruntime, bỏ qua bước kiểm tra.")
+        return True
+
+    x = np.random.uniform(-1, 1, size=(batch_size, 3, INPUT_SIZE, INPUT_SIZE)).astype(np.float32)
+    with torch.inference_mode():
+        ref = F.softmax(model(torch.from_numpy(x)), dim=1).numpy()
+
+    session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+    logits = session.run(None, {session.get_inputs()[0].name: x})[0]
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    out = e / e.sum(axis=1, keepdims=True)
+
+    max_diff = float(np.abs(out - ref).max())
+    ok = max_diff <= atol
+    print(f"[INFO] Sai lệch xác suất lớn nhất (batch {batch_size}): {max_diff:.2e} "
+          f"({'OK' if ok else 'VƯỢT'} ngưỡng {atol:.0e})")
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export TextureCNN to ONNX (dynamic batch axis)")
+    parser.add_argument('--model', default=os.path.join(current_dir, 'models', 'trained_model.pth'))
+    parser.add_argument('--output', default=os.path.join(current_dir, 'models', 'trained_model.onnx'))
+    parser.add_argument('--opset', type=int, default=13)
+    parser.add_argument('--atol', type=float, default=1e-4, help="max allowed probability difference vs PyTorch")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"[LỖI] Không tìm thấy file model: {args.model}")
+        sys.exit(1)
+
+    model = export(args.model, args.output, args.opset)
+    if not verify(model, args.output, atol=args.atol):
+        sys.exit(1)
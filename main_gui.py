@@ -2,11 +2,12 @@ import sys
 import os
 import cv2
 import time
-import random
+import threading
+import numpy as np
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QPushButton, QFrame, 
                              QGridLayout, QSizePolicy, QMessageBox)
-from PySide6.QtCore import Qt, QThread, Signal, Slot, QTimer
+from PySide6.QtCore import Qt, QThread, Signal, Slot, QTimer, QEvent
 from PySide6.QtGui import QImage, QPixmap, QFont, QColor
 
 # --- CẤU HÌNH HIỂN THỊ ---
@@ -16,30 +17,84 @@ os.environ["QT_SCALE_FACTOR"] = "1"
 # --- IMPORT CÁC MODULE XỬ LÝ AI ---
 try:
     from detectors.face_detector import FaceDetector
+    from detectors.landmark_tracker import KeyframeTracker
     from detectors.emotion_detector import EmotionDetector
-    from detectors.motion_detector import MotionDetector
+    from detectors.face_tracker import FaceTracker
+    from detectors.idle_detector import IdleDetector
+    from detectors.liveness_session import (LivenessSession, STATE_WAITING, STATE_ANALYZING,
+                                            STATE_CHALLENGE, STATE_RESULT, RESULT_STATIC,
+                                            RESULT_SPOOF, RESULT_GRANTED, RESULT_TIMEOUT, RESULT_TEXTURE)
+    from detectors.texture_detector import TextureDetector
+    from detectors.texture_worker import TextureWorker
+    from utils.preprocessing import crop_face
+    from utils.camera import CameraStream
+    from utils.overlay import draw_corners
 except ImportError:
     # Tạo các lớp giả lập để test giao diện nếu thiếu file backend
     class FaceDetector: 
-        def detect(self, img): return [], None
-        def get_bbox(self, l, s): return 0,0,0,0
+        def __init__(self, **kwargs): pass
+        def detect(self, img): return None
+        def detect_all(self, img): return []
+        def get_bbox(self, f): return 0,0,0,0
+    class KeyframeTracker:
+        def __init__(self, detector, **kwargs): self.detector = detector
+        def detect(self, img): return self.detector.detect(img)
+        def detect_all(self, img): return self.detector.detect_all(img)
+        def get_bbox(self, f): return self.detector.get_bbox(f)
     class EmotionDetector:
-        def detect_state(self, l, w, h): return "No Face", 0
-    class MotionDetector:
-        def update(self, l): return 0.0
+        def detect_state(self, f): return "No Face", 0
+    class FaceTracker:
+        def __init__(self, get_bbox, **kwargs): pass
+        def update(self, faces, now=None): return []
+        def primary(self): return None
         def reset(self): pass
-        self.history = []
+    class LivenessSession: pass
+    class IdleDetector:
+        idle = False; mode = "ACTIVE"; idle_interval = 0.2
+        def __init__(self, **kwargs): pass
+        def update(self, face_found, now=None): return False
+        def check_wake(self, frame, now=None): return True
+    class TextureDetector:
+        loaded = False
+        def __init__(self, *args, **kwargs): pass
+    TextureWorker = None
+    def crop_face(frame, bbox): return None
+    class CameraStream:
+        captured = delivered = dropped = 0
+        def __init__(self, *args, **kwargs): self.cap = cv2.VideoCapture(0)
+        def start(self): return self
+        def read(self, timeout=None): return self.cap.read()
+        def set_interval(self, sec): pass
+        def release(self): self.cap.release()
+    def draw_corners(img, x, y, w, h, **kwargs): pass
+    STATE_WAITING, STATE_ANALYZING, STATE_CHALLENGE, STATE_RESULT = 0, 1, 2, 3
+    RESULT_STATIC, RESULT_SPOOF, RESULT_GRANTED, RESULT_TIMEOUT, RESULT_TEXTURE = "STATIC", "SPOOF", "GRANTED", "TIMEOUT", "TEXTURE"
+from utils.pipeline import Pipeline, Stage, DROP_BLOCK, DROP_OLDEST
+from utils.pacing import FramePacer
 
 # --- ĐỊNH NGHĨA CÁC TRẠNG THÁI (STATE MACHINE) ---
+# (WAITING / ANALYZING / CHALLENGE / RESULT nằm trong detectors.liveness_session, mỗi khuôn mặt một phiên)
 STATE_IDLE = -1          # Trạng thái nghỉ (Chưa bật camera)
-STATE_WAITING = 0        # Trạng thái chờ: Đang quét tìm mặt
-STATE_ANALYZING = 1      # Trạng thái phân tích: Kiểm tra ảnh tĩnh/động
-STATE_CHALLENGE = 2      # Trạng thái thử thách: Yêu cầu người dùng hành động
-STATE_RESULT = 3         # Trạng thái kết quả: Hiển thị Đạt/Không đạt
 
 # Các ngưỡng số liệu kỹ thuật
 STATIC_THRESHOLD = 1.5   # Ngưỡng điểm chuyển động (Dưới mức này coi là ảnh tĩnh)
 CHALLENGE_LIMIT = 5.0    # Thời gian tối đa để thực hiện thử thách (giây)
+KEYFRAME_INTERVAL = 3    # Chạy Face Mesh mỗi N frame, giữa chừng dùng optical flow
+MAX_FACES = 4            # Số khuôn mặt theo dõi tối đa (mỗi mặt có phiên kiểm tra riêng)
+TEXTURE_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'trained_model.pth')
+TEXTURE_THRESHOLD = 0.5  # Xác suất là thật (TextureCNN) dưới ngưỡng này -> giả mạo
+IDLE_AFTER = 10.0        # Không thấy mặt quá số giây này -> chế độ nghỉ (đọc camera chậm, chỉ so sánh ảnh thu nhỏ)
+TARGET_FPS = 30.0        # FPS tối đa camera đưa vào pipeline (0 = theo nhịp camera)
+STATS_INTERVAL = 0.1     # Gửi thống kê lên giao diện tối đa ~10 lần/giây (gửi ngay khi trạng thái đổi)
+
+# Chữ, màu nền và màu chữ hiển thị cho từng mã kết quả
+RESULT_DISPLAY = {
+    RESULT_STATIC: ("WARNING: STATIC IMAGE", "#FFEBEE", "#C62828"),
+    RESULT_SPOOF: ("SPOOF DETECTED", "#FFEBEE", "#C62828"),
+    RESULT_GRANTED: ("ACCESS GRANTED", "#E8F5E9", "#2E7D32"),
+    RESULT_TIMEOUT: ("FAILED: TIMEOUT", "#FFEBEE", "#C62828"),
+    RESULT_TEXTURE: ("SPOOF DETECTED (TEXTURE)", "#FFEBEE", "#C62828"),
+}
 
 # --- LUỒNG XỬ LÝ AI ---
 class AIWorker(QThread):
@@ -53,19 +108,21 @@ class AIWorker(QThread):
         self.is_running = True      
         self.camera_on = False      
         self.reset_logic()          
+        # Hiển thị: worker thu nhỏ frame đúng bằng kích thước label trước khi gửi
+        self.display_size = (640, 480)  # GUI cập nhật qua set_display_size khi label đổi kích thước
+        self.frame_pending = False      # Frame đã gửi mà GUI chưa vẽ -> bỏ frame mới, không dồn tín hiệu
+        self.frames_coalesced = 0
+        self._qimage = None             # QImage tự sở hữu bộ nhớ, ghi thẳng ảnh RGB vào đó
+        self._stats_time = 0.0
+        self._stats_key = None
+        self._stats_lock = threading.Lock() # emit_stats được gọi từ nhiều luồng (vòng chính, tầng capture, tầng render)
 
     def reset_logic(self):
         """Hàm đặt lại toàn bộ các biến logic về trạng thái ban đầu"""
         self.current_state = STATE_WAITING
-        self.challenge_type = ""
-        self.result_text = ""
-        self.result_color = "#FFFFFF"
         self.blink_count = 0
-        self.is_eye_closed = False
         self.motion_score = 0.0
-        self.need_reset_detector = True # Reset bộ nhớ detector
-        self.challenge_timer = 0
-        self.result_timer = 0
+        self.need_reset_detector = True # Xoá toàn bộ track (và phiên kiểm tra của chúng)
 
     def set_camera(self, on):
         """Hàm nhận lệnh Bật/Tắt từ giao diện chính"""
@@ -76,190 +133,252 @@ class AIWorker(QThread):
             self.current_state = STATE_WAITING
             self.need_reset_detector = True
 
+    def set_display_size(self, w, h):
+        """GUI gọi khi label hiển thị đổi kích thước"""
+        self.display_size = (max(1, w), max(1, h))
+
+    def frame_consumed(self):
+        """GUI gọi sau khi đã vẽ frame: cho phép gửi frame tiếp theo"""
+        self.frame_pending = False
+
+    def emit_frame(self, frame):
+        """Thu nhỏ frame (BGR) về kích thước label, đổi sang RGB thẳng vào QImage rồi gửi lên giao diện"""
+        if self.frame_pending:
+            # GUI chưa vẽ xong frame trước -> bỏ frame này thay vì để tín hiệu dồn lại
+            self.frames_coalesced += 1
+            return
+        h, w = frame.shape[:2]
+        lw, lh = self.display_size
+        scale = min(lw / w, lh / h)
+        tw, th = max(1, int(w * scale)), max(1, int(h * scale))
+        if (tw, th) != (w, h):
+            frame = cv2.resize(frame, (tw, th), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+        img = self._qimage
+        if img is None or img.width() != tw or img.height() != th:
+            img = self._qimage = QImage(tw, th, QImage.Format_RGB888)
+        # View NumPy vào bộ nhớ của QImage (mỗi dòng có thể có byte đệm -> dùng bytesPerLine làm stride)
+        buf = np.ndarray((th, tw, 3), dtype=np.uint8, buffer=img.bits(), strides=(img.bytesPerLine(), 3, 1))
+        # Chuyển đổi màu từ OpenCV (BGR) sang Qt (RGB) để hiển thị đúng màu
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=buf)
+        self.frame_pending = True
+        self.frame_update.emit(img)
+
+    def emit_stats(self, stats):
+        """Gửi thống kê, giới hạn tần suất; trạng thái / chế độ / màu đổi thì gửi ngay"""
+        key = (self.current_state, stats["mode"], stats["status_color"])
+        with self._stats_lock:
+            now = time.monotonic()
+            if key == self._stats_key and now - self._stats_time < STATS_INTERVAL:
+                return
+            self._stats_key, self._stats_time = key, now
+        self.stats_update.emit(stats)
+
     def run(self):
-        """Hàm chạy chính của luồng"""
+        """Hàm chạy chính của luồng: bật/tắt pipeline xử lý theo trạng thái camera"""
         # Khởi tạo các mô hình AI
-        face_det = FaceDetector()
-        emotion_det = EmotionDetector()
-        motion_det = MotionDetector()
-        cap = None
+        # Chỉ quét toàn khung hình khi mất mặt (qua cổng phát hiện mặt nhẹ), chỉ chạy Face Mesh trên keyframe
+        self.face_det = KeyframeTracker(FaceDetector(max_num_faces=MAX_FACES, track_roi=True, use_gate=True), keyframe_interval=KEYFRAME_INTERVAL)
+        self.emotion_det = EmotionDetector()
+        # Mỗi khuôn mặt có phiên kiểm tra riêng: người đi ngang phía sau không làm hỏng phiên của người dùng
+        self.tracker = FaceTracker(self.face_det.get_bbox, session_factory=lambda: LivenessSession(
+            STATIC_THRESHOLD, spoof_threshold=STATIC_THRESHOLD - 0.5, challenge_limit=CHALLENGE_LIMIT,
+            texture_threshold=TEXTURE_THRESHOLD))
+        self.idle_det = IdleDetector(idle_after=IDLE_AFTER, on_change=self.on_idle_change)
+        # Chấm điểm TextureCNN trên luồng nền, vòng lặp chỉ gửi ảnh mặt mới nhất và đọc kết quả sẵn có
+        texture_det = TextureDetector(TEXTURE_MODEL_PATH)
+        self.texture_worker = TextureWorker(texture_det) if texture_det.loaded else None
+        if self.texture_worker: self.texture_worker.start()
+        self.cap = None
+        self.pipeline = None
 
         while self.is_running:
             # === TRƯỜNG HỢP 1: CAMERA ĐANG TẮT ===
             if not self.camera_on:
                 # Nếu camera đang mở
-                if cap is not None:
-                    cap.release()
-                    cap = None
+                if self.pipeline is not None:
+                    self.stop_pipeline()
                 
-                off_frame = QImage(640, 480, QImage.Format_RGB888)
-                off_frame.fill(QColor(224, 247, 250)) 
-                self.frame_update.emit(off_frame)
+                if not self.frame_pending:
+                    off_frame = QImage(640, 480, QImage.Format_RGB888)
+                    off_frame.fill(QColor(224, 247, 250)) 
+                    self.frame_pending = True
+                    self.frame_update.emit(off_frame)
                 
-                self.stats_update.emit({
+                self.emit_stats({
                     "emotion": "OFF", "blink": 0, "motion": 0.0,
                     "instruction": "PRESS 'START' TO BEGIN",
-                    "status_color": "#B2EBF2", "text_color": "#006064"
+                    "status_color": "#B2EBF2", "text_color": "#006064", "mode": "OFF"
                 })
                 time.sleep(0.1)
                 continue
 
             # === TRƯỜNG HỢP 2: CAMERA ĐANG BẬT ===
-            # Nếu chưa kết nối camera thì kết nối
-            if cap is None:
-                cap = cv2.VideoCapture(0)
-                cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-                self.reset_logic()
-
-            # Đọc khung hình từ camera
-            ret, frame = cap.read()
-            if not ret: time.sleep(0.05); continue
-
-            # Lật ngược ảnh (hiệu ứng gương)
-            frame = cv2.flip(frame, 1)
-            h, w, _ = frame.shape
-
-            # Reset các bộ detector nếu có yêu cầu
-            if self.need_reset_detector:
-                motion_det.reset(); self.blink_count = 0; self.need_reset_detector = False
-
-            # Khởi tạo các biến hiển thị mặc định
-            instruction_text = "..."
-            status_color = "#FFF"
-            text_color = "#333"
-            current_emotion = "--"
-
-            # 1. Phát hiện khuôn mặt
-            landmarks, shape = face_det.detect(frame)
-
-            if not landmarks:
-                # Nếu không thấy mặt -> Quay về trạng thái chờ
-                self.current_state = STATE_WAITING
-                instruction_text = "FACE NOT FOUND"
-                status_color = "#FFF9C4" # Vàng nhạt cảnh báo
-                text_color = "#F57F17"
-                motion_det.reset()
-            else:
-                # Lấy tọa độ hộp bao quanh mặt (Bounding Box)
-                fx, fy, fw, fh = face_det.get_bbox(landmarks, shape)
-                self.draw_corners(frame, fx, fy, fw, fh)
-                
-                # 2. Nhận diện cảm xúc & Trạng thái mắt
-                current_emotion, _ = emotion_det.detect_state(landmarks, w, h)
-                
-                # Logic đếm số lần chớp mắt
-                if "BLINKING" in current_emotion or "CLOSED" in current_emotion:
-                    if not self.is_eye_closed: self.is_eye_closed = True 
-                else:
-                    if self.is_eye_closed: self.blink_count += 1; self.is_eye_closed = False
-                
-                # 3. Tính điểm chuyển động (Liveness Score)
-                self.motion_score = motion_det.update(landmarks)
-                
-                # Giai đoạn: CHỜ ỔN ĐỊNH
-                if self.current_state == STATE_WAITING:
-                    instruction_text = "SCANNING FACE..."
-                    status_color = "#E1F5FE" 
-                    text_color = "#0277BD"
-                    # Nếu thu thập đủ 20 frame thì chuyển sang phân tích
-                    if len(motion_det.history) >= 20: 
-                        self.current_state = STATE_ANALYZING
-
-                # Giai đoạn: PHÂN TÍCH ĐỘ TĨNH
-                elif self.current_state == STATE_ANALYZING:
-                    instruction_text = "ANALYZING LIVENESS..."
-                    # Nếu điểm chuyển động thấp hơn ngưỡng -> Nghi ngờ ảnh tĩnh
-                    if self.motion_score < STATIC_THRESHOLD:
-                        self.current_state = STATE_RESULT
-                        self.result_text = "WARNING: STATIC IMAGE"
-                        self.result_color = "#FFEBEE"; self.text_res_color = "#C62828"
-                        self.result_timer = time.time()
-                    else:
-                        # Nếu chuyển động tốt -> TỰ ĐỘNG chọn thử thách ngẫu nhiên
-                        challenges = ["SMILE", "SURPRISE", "BLINK"]
-                        self.challenge_type = random.choice(challenges)
-                        self.challenge_timer = time.time()
-                        self.current_state = STATE_CHALLENGE
-
-                # Giai đoạn: THỰC HIỆN THỬ THÁCH
-                elif self.current_state == STATE_CHALLENGE:
-                    elapsed = time.time() - self.challenge_timer
-                    time_left = CHALLENGE_LIMIT - elapsed
-                    
-                    eng_map = {
-                        "SMILE": "PLEASE SMILE", 
-                        "SURPRISE": "SHOW SURPRISE", 
-                        "BLINK": "BLINK EYES"
-                    }
-                    req_text = eng_map.get(self.challenge_type, self.challenge_type)
-                    
-                    instruction_text = f"ACTION: {req_text} ({time_left:.1f}s)"
-                    status_color = "#FFF3E0" # Màu cam nhạt
-                    text_color = "#EF6C00"
-
-                    # Kiểm tra liên tục
-                    if self.motion_score < STATIC_THRESHOLD - 0.5:
-                         self.current_state = STATE_RESULT
-                         self.result_text = "SPOOF DETECTED"
-                         self.result_color = "#FFEBEE"; self.text_res_color = "#C62828"
-                         self.result_timer = time.time()
-
-                    # Kiểm tra hành động người dùng
-                    passed = False
-                    if self.challenge_type == "SMILE" and "SMILING" in current_emotion: passed = True
-                    elif self.challenge_type == "SURPRISE" and "SURPRISED" in current_emotion: passed = True
-                    elif self.challenge_type == "BLINK" and "BLINKING" in current_emotion: passed = True
-
-                    # Xử lý kết quả thử thách
-                    if passed:
-                        self.current_state = STATE_RESULT
-                        self.result_text = "ACCESS GRANTED"
-                        self.result_color = "#E8F5E9"; self.text_res_color = "#2E7D32"
-                        self.result_timer = time.time()
-                    elif time_left <= 0:
-                        self.current_state = STATE_RESULT
-                        self.result_text = "FAILED: TIMEOUT"
-                        self.result_color = "#FFEBEE"; self.text_res_color = "#C62828"
-                        self.result_timer = time.time()
-
-                # Giai đoạn: HIỂN THỊ KẾT QUẢ
-                elif self.current_state == STATE_RESULT:
-                    instruction_text = self.result_text
-                    status_color = self.result_color
-                    text_color = getattr(self, 'text_res_color', "#000")
-                    
-                    if time.time() - self.result_timer > 3.0:
-                        self.current_state = STATE_WAITING
-                        motion_det.reset()
-                        self.blink_count = 0
-
-            # Chuyển đổi màu từ OpenCV (BGR) sang Qt (RGB) để hiển thị đúng màu
-            rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            qt_image = QImage(rgb_image.data, w, h, w*3, QImage.Format_RGB888)
-            self.frame_update.emit(qt_image)
-            
-            # Gửi dữ liệu thống kê về giao diện
-            self.stats_update.emit({
-                "emotion": current_emotion, "blink": self.blink_count,
-                "motion": self.motion_score, "instruction": instruction_text,
-                "status_color": status_color, "text_color": text_color
+            # Các tầng chạy trên luồng riêng, luồng này chỉ theo dõi lệnh bật/tắt
+            if self.pipeline is None:
+                self.start_pipeline()
+            time.sleep(0.05)
+
+        if self.pipeline is not None: self.stop_pipeline()
+        if self.texture_worker: self.texture_worker.stop()
+
+    def start_pipeline(self):
+        """Mở camera và chạy 4 tầng: đọc camera -> nhận diện mặt -> phân tích -> vẽ/gửi lên giao diện"""
+        # Đọc camera trên luồng riêng, luôn xử lý frame mới nhất (độ trễ hiển thị thấp)
+        self.cap = CameraStream(0, width=1280, height=720).start()
+        # Nhịp mục tiêu: camera đọc tối đa TARGET_FPS frame/giây (không ngủ trong pipeline),
+        # tầng render đánh dấu mỗi frame hiển thị để đo FPS đạt được và số frame trễ hạn
+        self.pacer = FramePacer(TARGET_FPS)
+        self.on_idle_change(self.idle_det.idle)
+        self.reset_logic()
+        self.pipeline = Pipeline([
+            # Nhận diện chậm hơn camera -> bỏ frame cũ, luôn xử lý frame mới nhất
+            Stage("detect", self.detect_stage, queue_size=1, drop=DROP_OLDEST),
+            # Phiên kiểm tra cần mọi frame đã nhận diện (lịch sử chuyển động) -> chờ, không bỏ
+            Stage("analyze", self.analyze_stage, queue_size=2, drop=DROP_BLOCK),
+            # Hiển thị chỉ cần frame mới nhất
+            Stage("render", self.render_stage, queue_size=1, drop=DROP_OLDEST),
+        ], source=self.capture_stage, name="AIWorker").start()
+
+    def stop_pipeline(self):
+        """Dừng các tầng và đóng camera, in mức sử dụng từng tầng"""
+        self.cap.release() # Đánh thức tầng đọc camera đang chờ frame
+        self.pipeline.stop()
+        print(f"[INFO] Pipeline: {self.pipeline.summary()} | frame gộp (GUI chưa vẽ): {self.frames_coalesced}")
+        print(f"[INFO] Nhịp khung hình: {self.pacer.summary()}")
+        self.pipeline = None
+        self.cap = None
+
+    def on_idle_change(self, idle):
+        """IdleDetector gọi khi vào / thoát chế độ nghỉ: giảm / khôi phục tốc độ đọc camera"""
+        cap = self.cap
+        if cap is not None:
+            cap.set_interval(self.idle_det.idle_interval if idle else self.pacer.period)
+
+    def capture_stage(self):
+        """Tầng 1: lấy frame mới nhất, kiểm tra chế độ nghỉ, lật ảnh"""
+        # Chỉ CameraStream.read điều nhịp tầng này: chờ frame mới (camera đã được giới hạn ở TARGET_FPS)
+        ret, frame = self.cap.read(timeout=0.5)
+        if not ret: time.sleep(0.05); return None
+
+        # Chế độ nghỉ: chỉ so sánh ảnh thu nhỏ với nền, không lật/đổi màu/nhận diện
+        if self.idle_det.idle and not self.idle_det.check_wake(frame):
+            self.emit_stats({
+                "emotion": "--", "blink": 0, "motion": 0.0,
+                "instruction": "IDLE - STEP IN FRONT OF THE CAMERA",
+                "status_color": "#ECEFF1", "text_color": "#546E7A", "mode": self.idle_det.mode
             })
-            # Giới hạn tốc độ khung hình (~30 FPS) để giảm tải
-            time.sleep(0.03)
-
-    def draw_corners(self, img, x, y, w, h):
-        """Hàm vẽ 4 góc bao quanh khuôn mặt"""
-        color = (255, 191, 0) 
-        t = 2; l = 25
-        # Góc trên trái
-        cv2.line(img, (x, y), (x + l, y), color, t); cv2.line(img, (x, y), (x, y + l), color, t)
-        # Góc trên phải
-        cv2.line(img, (x + w, y), (x + w - l, y), color, t); cv2.line(img, (x + w, y), (x + w, y + l), color, t)
-        # Góc dưới trái
-        cv2.line(img, (x, y + h), (x + l, y + h), color, t); cv2.line(img, (x, y + h), (x, y + h - l), color, t)
-        # Góc dưới phải
-        cv2.line(img, (x + w, y + h), (x + w - l, y + h), color, t); cv2.line(img, (x + w, y + h), (x + w, y + h - l), color, t)
+            # Không cần ngủ thêm: ở chế độ nghỉ camera chỉ đọc mỗi idle_interval giây nên read() tự chờ
+            self.pacer.reset() # Khoảng nghỉ không tính là trễ hạn
+            return None
+
+        # Lật ngược ảnh (hiệu ứng gương); cv2.flip tạo mảng mới nên không còn trỏ vào vòng đệm của camera
+        return {"frame": cv2.flip(frame, 1), "now": time.time()}
+
+    def detect_stage(self, item):
+        """Tầng 2: phát hiện khuôn mặt, ghép vào các track, gửi ảnh mặt cho TextureCNN"""
+        frame, now = item["frame"], item["now"]
+        # Reset các phiên kiểm tra nếu có yêu cầu
+        if self.need_reset_detector:
+            self.tracker.reset(); self.blink_count = 0; self.need_reset_detector = False
+
+        tracks = self.tracker.update(self.face_det.detect_all(frame), now)
+        primary = self.tracker.primary() # Người đang đứng trước camera
+        self.idle_det.update(bool(tracks), now) # Quá lâu không có ai -> chuyển sang chế độ nghỉ ở frame sau
+        if self.texture_worker:
+            # Cắt mặt trước khi vẽ lên khung hình
+            if primary is not None: self.texture_worker.submit(primary.track_id, crop_face(frame, primary.bbox), now)
+            self.texture_worker.forget(self.tracker.tracks)
+
+        # Chụp lại mặt / bbox của frame này: tầng detect có thể cập nhật track cho frame sau trong lúc tầng sau còn chạy
+        item["tracks"] = [(track, track.face, track.bbox) for track in tracks]
+        item["primary"] = primary
+        return item
+
+    def analyze_stage(self, item):
+        """Tầng 3: nhận diện cảm xúc, cập nhật phiên kiểm tra của từng mặt, chọn hướng dẫn hiển thị"""
+        now, primary = item["now"], item["primary"]
+        # Khởi tạo các biến hiển thị mặc định
+        instruction_text = "..."
+        status_color = "#FFF"
+        text_color = "#333"
+        current_emotion = "--"
+
+        if primary is None:
+            # Nếu không thấy mặt -> Quay về trạng thái chờ
+            self.current_state = STATE_WAITING
+            instruction_text = "FACE NOT FOUND"
+            status_color = "#FFF9C4" # Vàng nhạt cảnh báo
+            text_color = "#F57F17"
+
+        for track, face, _ in item["tracks"]:
+            # 2. Nhận diện cảm xúc, 3. Cập nhật phiên kiểm tra riêng của mặt này
+            emotion, _ = self.emotion_det.detect_state(face)
+            session = track.session
+            texture = self.texture_worker.result(track.track_id) if self.texture_worker else None
+            session.update(face, emotion, now, texture)
+            if track is not primary:
+                continue
+
+            current_emotion = emotion
+            self.current_state = session.state
+            self.blink_count = session.blink_count
+            self.motion_score = session.motion_score
+
+            # Giai đoạn: CHỜ ỔN ĐỊNH
+            if session.state == STATE_WAITING:
+                instruction_text = "SCANNING FACE..."
+                status_color = "#E1F5FE" 
+                text_color = "#0277BD"
+
+            # Giai đoạn: PHÂN TÍCH ĐỘ TĨNH
+            elif session.state == STATE_ANALYZING:
+                instruction_text = "ANALYZING LIVENESS..."
+
+            # Giai đoạn: THỰC HIỆN THỬ THÁCH
+            elif session.state == STATE_CHALLENGE:
+                eng_map = {
+                    "SMILE": "PLEASE SMILE", 
+                    "SURPRISE": "SHOW SURPRISE", 
+                    "BLINK": "BLINK EYES"
+                }
+                req_text = eng_map.get(session.challenge_type, session.challenge_type)
+                
+                instruction_text = f"ACTION: {req_text} ({session.time_left(now):.1f}s)"
+                status_color = "#FFF3E0" # Màu cam nhạt
+                text_color = "#EF6C00"
+
+            # Giai đoạn: HIỂN THỊ KẾT QUẢ
+            elif session.state == STATE_RESULT:
+                instruction_text, status_color, text_color = RESULT_DISPLAY[session.result]
+
+        item["stats"] = {
+            "emotion": current_emotion, "blink": self.blink_count,
+            "motion": self.motion_score, "instruction": instruction_text,
+            "status_color": status_color, "text_color": text_color, "mode": self.idle_det.mode,
+            "texture": primary.session.texture_score if primary is not None else None,
+        }
+        return item
+
+    def render_stage(self, item):
+        """Tầng 4: vẽ khung mặt, thu nhỏ + đổi màu, gửi ảnh và thống kê lên giao diện"""
+        frame = item["frame"]
+        for _, _, bbox in item["tracks"]:
+            # Vẽ 4 góc quanh mặt (Bounding Box) trên ảnh gốc, trước khi thu nhỏ
+            draw_corners(frame, *bbox)
+        self.emit_frame(frame)
+        self.pacer.tick() # Frame đã xử lý xong: đo FPS / trễ hạn theo thời điểm hoàn thành, không theo lúc camera trả frame
+
+        # Gửi dữ liệu thống kê về giao diện, kèm mức sử dụng (thời gian bận / thời gian chạy) của từng tầng
+        stats = item["stats"]
+        cap, pipeline = self.cap, self.pipeline # Có thể đã bị stop_pipeline đặt về None
+        if cap is not None: stats["dropped"] = cap.dropped
+        stats["fps"] = round(self.pacer.fps, 1)
+        stats["deadline_misses"] = self.pacer.misses
+        if pipeline is not None:
+            stats["utilization"] = {name: round(s['util'], 2) for name, s in pipeline.utilization().items()}
+        self.emit_stats(stats)
+        return item
 
     def stop_worker(self):
         """Hàm dừng luồng an toàn"""
@@ -301,7 +420,6 @@ class FaceIDApp(QMainWindow):
         self.lbl_video = QLabel("CAMERA OFF")
         self.lbl_video.setAlignment(Qt.AlignCenter)
         self.lbl_video.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
-        self.lbl_video.setScaledContents(True)
         self.lbl_video.setStyleSheet("background-color: #000; border-radius: 6px; color: #888;")
         v_layout.addWidget(self.lbl_video)
 
@@ -424,6 +542,8 @@ class FaceIDApp(QMainWindow):
         self.worker = AIWorker()
         self.worker.frame_update.connect(self.update_video)
         self.worker.stats_update.connect(self.update_stats)
+        # Báo kích thước label cho worker mỗi khi label đổi kích thước
+        self.lbl_video.installEventFilter(self)
         self.worker.start()
 
         QTimer.singleShot(500, self.show_help_dialog)
@@ -488,8 +608,15 @@ class FaceIDApp(QMainWindow):
     # --- CẬP NHẬT GIAO DIỆN TỪ TÍN HIỆU CỦA AI ---
     @Slot(QImage)
     def update_video(self, img):
-        """Cập nhật hình ảnh camera lên Label"""
-        self.lbl_video.setPixmap(QPixmap.fromImage(img).scaled(self.lbl_video.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation))
+        """Cập nhật hình ảnh camera lên Label (ảnh đã được worker thu nhỏ đúng kích thước label)"""
+        self.lbl_video.setPixmap(QPixmap.fromImage(img))
+        self.worker.frame_consumed()
+
+    def eventFilter(self, obj, event):
+        """Gửi kích thước mới của label hiển thị cho worker"""
+        if obj is self.lbl_video and event.type() == QEvent.Resize:
+            self.worker.set_display_size(obj.width(), obj.height())
+        return super().eventFilter(obj, event)
 
     @Slot(dict)
     def update_stats(self, s):
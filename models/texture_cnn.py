@@ -4,30 +4,48 @@ import torch.nn.functional as F
 
 # Định nghĩa mô hình CNN đơn giản để phân loại ảnh texture1
 class TextureCNN(nn.Module):
-    def __init__(self, num_classes=2):
+    # widths: số kênh của 3 tầng conv, hidden: số neuron của fc1
+    # Mặc định (16, 32, 64) / 128 là mô hình gốc; các giá trị nhỏ hơn dùng cho biến thể đã tỉa (pruned)
+    # dropout: tỉ lệ dropout trước tầng output (không ảnh hưởng định dạng trọng số)
+    def __init__(self, num_classes=2, widths=(16, 32, 64), hidden=128, dropout=0.5):
         super(TextureCNN, self).__init__()
         # Input: Ảnh màu (3 kênh RGB) kích thước 64x64
+        c1, c2, c3 = widths
+        self.widths = tuple(widths)
+        self.hidden = hidden
         
         # Layer 1: 64x64 -> 32x32 (sau pool)
-        self.conv1 = nn.Conv2d(3, 16, kernel_size=3, padding=1)
-        self.bn1 = nn.BatchNorm2d(16)
+        self.conv1 = nn.Conv2d(3, c1, kernel_size=3, padding=1)
+        self.bn1 = nn.BatchNorm2d(c1)
         
         # Layer 2: 32x32 -> 16x16 (sau pool)
-        self.conv2 = nn.Conv2d(16, 32, kernel_size=3, padding=1)
-        self.bn2 = nn.BatchNorm2d(32)
+        self.conv2 = nn.Conv2d(c1, c2, kernel_size=3, padding=1)
+        self.bn2 = nn.BatchNorm2d(c2)
         
         # Layer 3: 16x16 -> 8x8 (sau pool)
-        self.conv3 = nn.Conv2d(32, 64, kernel_size=3, padding=1)
-        self.bn3 = nn.BatchNorm2d(64)
+        self.conv3 = nn.Conv2d(c2, c3, kernel_size=3, padding=1)
+        self.bn3 = nn.BatchNorm2d(c3)
         
         # Max Pooling (giảm kích thước đi 2 lần)
         self.pool = nn.MaxPool2d(2, 2)
         
         # Fully Connected Layer
         # Tính toán: 64 kênh * 8 * 8 (kích thước ảnh cuối cùng) = 4096
-        self.fc1 = nn.Linear(64 * 8 * 8, 128) # 128 neurons
-        self.dropout = nn.Dropout(0.5) # Dropout để tránh overfitting
-        self.fc2 = nn.Linear(128, num_classes) # Output layer
+        self.flat_dim = c3 * 8 * 8
+        self.fc1 = nn.Linear(self.flat_dim, hidden) # 128 neurons
+        self.dropout = nn.Dropout(dropout) # Dropout để tránh overfitting
+        self.fc2 = nn.Linear(hidden, num_classes) # Output layer
+
+    # Tạo mô hình khớp với state_dict (tự suy ra widths/hidden từ kích thước trọng số)
+    # Dùng để nạp cả mô hình gốc lẫn các biến thể đã tỉa
+    @classmethod
+    def from_state_dict(cls, state_dict):
+        widths = tuple(state_dict[f'conv{i}.weight'].shape[0] for i in (1, 2, 3))
+        hidden, _ = state_dict['fc1.weight'].shape
+        num_classes = state_dict['fc2.weight'].shape[0]
+        model = cls(num_classes=num_classes, widths=widths, hidden=hidden)
+        model.load_state_dict(state_dict)
+        return model
 
     def forward(self, x):
         # Qua 3 tầng Conv + ReLU + Pool
@@ -35,8 +53,8 @@ class TextureCNN(nn.Module):
         x = self.pool(F.relu(self.bn2(self.conv2(x)))) # 32x32 -> 16x16
         x = self.pool(F.relu(self.bn3(self.conv3(x)))) # 16x16 -> 8x8
         
-        # Duỗi ảnh ra (Flatten)
-        x = x.view(-1, 64 * 8 * 8) 
+        # Duỗi ảnh ra (Flatten); không dùng view: đầu ra pool của mô hình lượng tử hóa không liên tục (non-contiguous)
+        x = torch.flatten(x, 1)
         
         # Phân loại
         x = F.relu(self.fc1(x))
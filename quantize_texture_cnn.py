@@ -0,0 +1,86 @@
+import os
+import sys
+import copy
+import argparse
+import torch
+from torch.utils.data import DataLoader, Subset
+
+# Tự động sửa đường dẫn import để tránh lỗi "ModuleNotFoundError"
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path: sys.path.append(current_dir)
+
+from models.texture_cnn import TextureCNN
+from evaluate import build_loader, count_correct, latency_ms
+
+INPUT_SIZE = 64 # Kích thước ảnh đầu vào của TextureCNN
+
+# Lượng tử hóa INT8 (FX graph mode, post-training static)
+# prepare_fx tự gộp conv+bn+relu trước khi chèn observer
+def quantize(model, calib_loader, engine):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    torch.backends.quantized.engine = engine
+    example = (torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE),)
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), example)
+
+    # Hiệu chỉnh (calibration): chạy một phần dữ liệu train để observer thu thập dải giá trị
+    with torch.inference_mode():
+        for images, _ in calib_loader:
+            prepared(images)
+    return convert_fx(prepared)
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 quantization of TextureCNN with an accuracy guardrail")
+    parser.add_argument('--model', default=os.path.join(current_dir, 'models', 'trained_model.pth'))
+    parser.add_argument('--output', default=os.path.join(current_dir, 'models', 'trained_model_int8.pt'))
+    parser.add_argument('--train-dir', default=os.path.join(current_dir, 'data', 'train'))
+    parser.add_argument('--test-dir', default=os.path.join(current_dir, 'data', 'test'))
+    parser.add_argument('--calib-size', type=int, default=512, help="number of training images used for calibration")
+    parser.add_argument('--max-drop', type=float, default=1.0, help="max accuracy drop allowed (percentage points)")
+    parser.add_argument('--engine', default='x86', help="quantized engine: x86 / fbgemm / qnnpack (ARM)")
+    args = parser.parse_args()
+
+    for path in (args.model, args.train_dir, args.test_dir):
+        if not os.path.exists(path):
+            print(f"[LỖI] Không tìm thấy: {path}")
+            sys.exit(1)
+
+    # Dữ liệu hiệu chỉnh: lấy ngẫu nhiên calib_size ảnh trong data/train
+    train_data, _ = build_loader(args.train_dir)
+    idx = torch.randperm(len(train_data))[:args.calib_size].tolist()
+    calib_loader = DataLoader(Subset(train_data, idx), batch_size=32, shuffle=False)
+    test_data, test_loader = build_loader(args.test_dir, batch_size=32)
+
+    fp32 = TextureCNN.from_state_dict(torch.load(args.model, map_location='cpu'))
+    fp32.eval()
+
+    print(f"[INFO] Hiệu chỉnh trên {len(idx)} ảnh (engine: {args.engine})...")
+    int8 = quantize(fp32, calib_loader, args.engine)
+
+    # So sánh FP32 và INT8 theo kiểu evaluate.py
+    results = {}
+    for name, model in (('FP32', fp32), ('INT8', int8)):
+        correct, total = count_correct(model, test_loader)
+        results[name] = (100 * correct / max(total, 1), latency_ms(model))
+
+    print("=" * 50)
+    print(f"{'Model':<6} | {'Accuracy':>9} | {'Latency/ảnh':>12}")
+    for name, (acc, lat) in results.items():
+        print(f"{name:<6} | {acc:>8.2f}% | {lat:>9.3f} ms")
+    print("=" * 50)
+
+    drop = results['FP32'][0] - results['INT8'][0]
+    if drop > args.max_drop:
+        print(f"[LỖI] Độ chính xác giảm {drop:.2f} điểm (> {args.max_drop:.2f}). KHÔNG ghi model INT8.")
+        sys.exit(1)
+
+    # Lưu dạng TorchScript để TextureDetector(backend='int8') nạp được mà không cần định nghĩa lại mô hình
+    scripted = torch.jit.trace(int8, torch.randn(1, 3, INPUT_SIZE, INPUT_SIZE))
+    torch.jit.save(scripted, args.output)
+    size_fp32 = os.path.getsize(args.model) / 1024
+    size_int8 = os.path.getsize(args.output) / 1024
+    print(f"[THÀNH CÔNG] Đã lưu model INT8: {args.output} ({size_fp32:.0f} KB -> {size_int8:.0f} KB)")
+
+if __name__ == '__main__':
+    main()
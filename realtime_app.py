@@ -1,173 +1,129 @@
 ﻿import cv2
 import numpy as np
+import os
 import time
-import random
 from detectors.face_detector import FaceDetector
+from detectors.landmark_tracker import KeyframeTracker
 from detectors.emotion_detector import EmotionDetector
-from detectors.motion_detector import MotionDetector
-
-STATE_WAITING = 0      
-STATE_ANALYZING = 1    
-STATE_CHALLENGE = 2    
-STATE_RESULT = 3       
+from detectors.face_tracker import FaceTracker
+from detectors.idle_detector import IdleDetector
+from detectors.liveness_session import (LivenessSession, STATE_CHALLENGE, STATE_RESULT,
+                                        RESULT_STATIC, RESULT_SPOOF, RESULT_GRANTED, RESULT_TIMEOUT, RESULT_TEXTURE)
+from detectors.texture_detector import TextureDetector
+from detectors.texture_worker import TextureWorker
+from utils.preprocessing import crop_face
+from utils.camera import CameraStream
+from utils.overlay import DashboardOverlay
+from utils.pacing import FramePacer
 
 STATIC_THRESHOLD = 1.5 
+CHALLENGE_LIMIT = 5.0
+KEYFRAME_INTERVAL = 3 # Chạy Face Mesh mỗi N frame, giữa chừng dùng optical flow
+MAX_FACES = 4         # Số khuôn mặt theo dõi tối đa (mỗi mặt có phiên kiểm tra riêng)
+TEXTURE_MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'trained_model.pth')
+TEXTURE_THRESHOLD = 0.5 # Xác suất là thật (TextureCNN) dưới ngưỡng này -> giả mạo
+TARGET_FPS = 30.0     # FPS tối đa của vòng lặp hiển thị (0 = không giới hạn)
+IDLE_AFTER = 10.0     # Không thấy mặt quá số giây này -> chế độ nghỉ (đọc camera chậm, chỉ so sánh ảnh thu nhỏ)
+
+# Chữ và màu hiển thị cho từng mã kết quả
+RESULT_DISPLAY = {
+    RESULT_STATIC: ("FAKE: STATIC PHOTO", (0, 0, 255)),
+    RESULT_SPOOF: ("FAKE: KE GIA MAO", (0, 0, 255)),
+    RESULT_GRANTED: ("ACCESS GRANTED", (0, 255, 0)),
+    RESULT_TIMEOUT: ("FAILED: TIME OUT", (0, 0, 255)),
+    RESULT_TEXTURE: ("FAKE: SPOOF TEXTURE", (0, 0, 255)),
+}
 
 # Vẽ bảng thông tin trên khung hình
+# Nền và chữ tĩnh được vẽ sẵn một lần, mỗi frame chỉ trộn vùng của bảng (không sao chép cả khung hình)
+_dashboard = DashboardOverlay(STATIC_THRESHOLD)
+
 def draw_dashboard(frame, emotion, blink_count, motion_score, state_text, state_color):
     """Bảng thông tin"""
-    h_frame, w_frame, _ = frame.shape
-    
-    # 1. Vẽ nền bảng thông tin (Góc trái trên)
-    overlay = frame.copy()
-    cv2.rectangle(overlay, (10, 10), (300, 160), (0, 0, 0), -1)
-    
-    # 2. Vẽ nền thanh hướng dẫn (Góc dưới)
-    cv2.rectangle(overlay, (0, h_frame - 40), (w_frame, h_frame), (0, 0, 0), -1)
-    
-    # Áp dụng độ trong suốt
-    alpha = 0.6
-    cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
-
-    #HIỂN THỊ THÔNG SỐ DASHBOARD
-    cv2.putText(frame, "--- DASHBOARD ---", (30, 35), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-    
-    # Cảm xúc
-    e_color = (255, 255, 255)
-    if "SMILE" in emotion: e_color = (0, 255, 0)
-    elif "SURPRISE" in emotion: e_color = (0, 255, 255)
-    elif "BLINK" in emotion: e_color = (100, 100, 255)
-    cv2.putText(frame, f"Emotion: {emotion}", (30, 65), cv2.FONT_HERSHEY_SIMPLEX, 0.6, e_color, 2)
-    
-    # Số lần chớp mắt
-    cv2.putText(frame, f"Blinks: {blink_count}", (30, 95), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-    
-    # Chỉ số chuyển động
-    m_color = (0, 255, 0) if motion_score > STATIC_THRESHOLD else (0, 0, 255)
-    cv2.putText(frame, f"Motion: {motion_score:.2f}", (30, 125), cv2.FONT_HERSHEY_SIMPLEX, 0.6, m_color, 1)
-
-    # --- HIỂN THỊ HƯỚNG DẪN THOÁT (QUAN TRỌNG) ---
-    cv2.putText(frame, "PRESS 'Q' TO QUIT", (w_frame // 2 - 100, h_frame - 12), 
-                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (200, 200, 200), 2)
-
-    # Trạng thái hệ thống (Pass/Fail)
-    if state_text:
-        cv2.putText(frame, state_text, (30, 200), cv2.FONT_HERSHEY_SIMPLEX, 0.8, state_color, 2)
+    _dashboard.draw(frame, emotion, blink_count, motion_score, state_text, state_color)
 
 # Chương trình chính
 def main():
-    face_det = FaceDetector() 
+    # Bám vùng mặt, chỉ chạy Face Mesh trên keyframe; khi mất mặt thì cổng phát hiện nhẹ quyết định có chạy Face Mesh hay không
+    face_det = KeyframeTracker(FaceDetector(max_num_faces=MAX_FACES, track_roi=True, use_gate=True), keyframe_interval=KEYFRAME_INTERVAL)
     emotion_det = EmotionDetector() 
-    motion_det = MotionDetector()
-
-    cap = cv2.VideoCapture(0) # Mở camera mặc định
-    
-    current_state = STATE_WAITING # Trạng thái ban đầu
-    
-    # Biến thách thức
-    challenge_type = ""
-    challenge_timer = 0
-    CHALLENGE_LIMIT = 5.0
-    # Kết quả
-    result_text = ""
-    result_color = (0,0,0)
-    result_timer = 0
-    # Đếm chớp mắt
-    blink_count = 0
-    is_eye_closed = False 
+    # Mỗi khuôn mặt được gán id ổn định và có phiên kiểm tra (chuyển động, chớp mắt, thử thách) riêng
+    tracker = FaceTracker(face_det.get_bbox,
+                          session_factory=lambda: LivenessSession(STATIC_THRESHOLD, challenge_limit=CHALLENGE_LIMIT,
+                                                                  texture_threshold=TEXTURE_THRESHOLD))
+    # Chấm điểm TextureCNN trên luồng nền, vòng lặp chỉ gửi ảnh mặt mới nhất và đọc kết quả sẵn có
+    texture_det = TextureDetector(TEXTURE_MODEL_PATH)
+    texture_worker = TextureWorker(texture_det) if texture_det.loaded else None
+    if texture_worker: texture_worker.start()
+
+    # Đọc camera trên luồng riêng, vòng lặp luôn lấy frame mới nhất (không xử lý frame cũ bị dồn lại)
+    cap = CameraStream(0).start()
+
+    # Ở chế độ nghỉ luồng camera chỉ đọc mỗi idle_interval giây (không giải mã frame thừa)
+    idle_det = IdleDetector(idle_after=IDLE_AFTER,
+                            on_change=lambda idle: cap.set_interval(idle_det.idle_interval if idle else 0.0))
+    # waitKey chỉ chờ phần còn lại của chu kỳ frame thay vì cố định 5 ms
+    pacer = FramePacer(TARGET_FPS)
 
     print("Hệ thống đang chạy.\n Bấm vào cửa sổ camera và nhấn 'Q' để thoát.")
     # Vòng lặp chính
     while True:
-        ret, frame = cap.read() # Đọc khung hình từ camera
+        ret, frame = cap.read() # Lấy khung hình mới nhất
         if not ret: break # Nếu không đọc được thì thoát
+
+        # Chế độ nghỉ: chỉ so sánh ảnh thu nhỏ với nền, không lật/đổi màu/nhận diện
+        if idle_det.idle and not idle_det.check_wake(frame):
+            # cap.read() đã chờ theo nhịp đọc chậm của camera, chỉ cần xử lý phím
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                print("Đã nhận lệnh thoát (Q).")
+                break
+            pacer.reset() # Khoảng nghỉ không tính là trễ hạn
+            continue
         
         frame = cv2.flip(frame, 1) # Lật khung hình ngang
-        h, w, _ = frame.shape # Kích thước khung hình
 
-        # 1. Phát hiện mặt
-        landmarks, shape = face_det.detect(frame)
+        # 1. Phát hiện mặt và ghép vào các track
+        now = time.time()
+        tracks = tracker.update(face_det.detect_all(frame), now)
+        primary = tracker.primary() # Người đang đứng trước camera
+        if texture_worker:
+            # Cắt mặt trước khi vẽ lên khung hình
+            if primary is not None: texture_worker.submit(primary.track_id, crop_face(frame, primary.bbox), now)
+            texture_worker.forget(tracker.tracks)
+        if idle_det.update(bool(tracks), now): # Quá lâu không có ai -> chế độ nghỉ từ frame sau
+            cv2.putText(frame, "IDLE MODE", (30, 240), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (160, 160, 160), 2)
         
         motion_score = 0.0
+        blink_count = 0
         current_emotion = "No Face"
         # Xử lý theo trạng thái
-        if not landmarks: # Không phát hiện mặt
-            current_state = STATE_WAITING # Quay về trạng thái chờ
-            motion_det.reset()
-            is_eye_closed = False # Đặt lại trạng thái chớp mắt
+        if primary is None: # Không phát hiện mặt
             cv2.putText(frame, "Waiting for face...", (320, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 1) # Thông báo chờ mặt
-        else:
-            fx, fy, fw, fh = face_det.get_bbox(landmarks, shape) # Lấy hộp giới hạn mặt
-            cv2.rectangle(frame, (fx, fy), (fx+fw, fy+fh), (255, 0, 0), 2) # Vẽ hộp giới hạn mặt
-
-            # Nhận diện
-            current_emotion, _ = emotion_det.detect_state(landmarks, w, h)
-            
-            # Đếm chớp mắt
-            if "BLINKING" in current_emotion or "CLOSED" in current_emotion:
-                if not is_eye_closed:
-                    is_eye_closed = True 
-            else:
-                if is_eye_closed:
-                    blink_count += 1
-                    is_eye_closed = False
-
-            # Cập nhật Motion
-            motion_score = motion_det.update(landmarks)
-
-            #trạng thái
-            if current_state == STATE_WAITING:
-                if len(motion_det.history) >= 20: # Đủ dữ liệu để phân tích
-                    current_state = STATE_ANALYZING # Chuyển sang trạng thái phân tích
-
-            elif current_state == STATE_ANALYZING: # Phân tích chuyển động
-                if motion_score < STATIC_THRESHOLD: # Phát hiện tĩnh
-                    current_state = STATE_RESULT # Chuyển sang trạng thái kết quả
-                    result_text = "FAKE: STATIC PHOTO"
-                    result_color = (0, 0, 255)
-                    result_timer = time.time()
-                else:
-                    challenges = ["SMILE", "SURPRISE", "BLINK"]
-                    challenge_type = random.choice(challenges)
-                    challenge_timer = time.time()
-                    current_state = STATE_CHALLENGE
-
-            elif current_state == STATE_CHALLENGE:
-                elapsed = time.time() - challenge_timer
-                time_left = CHALLENGE_LIMIT - elapsed
+        
+        for track in tracks:
+            fx, fy, fw, fh = track.bbox # Hộp giới hạn mặt
+            is_primary = track is primary
+            cv2.rectangle(frame, (fx, fy), (fx+fw, fy+fh), (255, 0, 0) if is_primary else (128, 128, 128), 2) # Vẽ hộp giới hạn mặt
+
+            # Nhận diện và cập nhật phiên kiểm tra của riêng mặt này
+            emotion, _ = emotion_det.detect_state(track.face)
+            session = track.session
+            texture = texture_worker.result(track.track_id) if texture_worker else None
+            session.update(track.face, emotion, now, texture)
+            if not is_primary:
+                continue
+
+            current_emotion = emotion
+            motion_score = session.motion_score
+            blink_count = session.blink_count
+            if session.state == STATE_CHALLENGE:
                 # Hiển thị thách thức
-                cv2.putText(frame, f"PLEASE: {challenge_type}", (320, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
-                cv2.putText(frame, f"Time: {time_left:.1f}s", (320, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 1)
-                # Kiểm tra kết quả thách thức
-                if motion_score < STATIC_THRESHOLD:
-                     current_state = STATE_RESULT
-                     result_text = "FAKE: KE GIA MAO"
-                     result_color = (0, 0, 255)
-                     result_timer = time.time()
-                # Kiểm tra thách thức
-                passed = False
-                if challenge_type == "SMILE" and "SMILING" in current_emotion: passed = True
-                elif challenge_type == "SURPRISE" and "SURPRISED" in current_emotion: passed = True
-                elif challenge_type == "BLINK" and "BLINKING" in current_emotion: passed = True
-                # Chuyển sang trạng thái kết quả nếu vượt qua thách thức
-                if passed:
-                    current_state = STATE_RESULT
-                    result_text = "ACCESS GRANTED"
-                    result_color = (0, 255, 0)
-                    result_timer = time.time()
-                # Kiểm tra hết thời gian
-                if time_left <= 0: # Hết thời gian
-                    current_state = STATE_RESULT # Chuyển sang trạng thái kết quả
-                    result_text = "FAILED: TIME OUT" # Thông báo thất bại
-                    result_color = (0, 0, 255)
-                    result_timer = time.time() # Đặt thời gian kết quả
+                cv2.putText(frame, f"PLEASE: {session.challenge_type}", (320, 50), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
+                cv2.putText(frame, f"Time: {session.time_left(now):.1f}s", (320, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 1)
             # Hiển thị kết quả
-            elif current_state == STATE_RESULT: 
+            elif session.state == STATE_RESULT:
+                result_text, result_color = RESULT_DISPLAY[session.result]
                 cv2.putText(frame, result_text, (320, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.0, result_color, 2) # Hiển thị kết quả
-                if time.time() - result_timer > 3.0:
-                    current_state = STATE_WAITING # Quay về trạng thái chờ
-                    motion_det.reset()
-                    blink_count = 0
 
         # Vẽ Dashboard
         draw_dashboard(frame, current_emotion, blink_count, motion_score, "", (0,0,0))
@@ -175,12 +131,27 @@ def main():
         cv2.imshow("Face Liveness System", frame)
         
         # Xử lý thoát
-        if cv2.waitKey(5) & 0xFF == ord('q'):
+        key = cv2.waitKey(pacer.remaining_ms())
+        pacer.tick()
+        if key & 0xFF == ord('q'):
             print("Đã nhận lệnh thoát (Q).")
             break
 
+    if texture_worker: texture_worker.stop()
     cap.release()
     cv2.destroyAllWindows()
 
+    # Thống kê hiệu quả của cổng phát hiện mặt và chế độ bám
+    det = face_det.detector
+    print(f"[INFO] Camera: {cap.captured} frame | đã xử lý {cap.delivered} | bỏ qua {cap.dropped}")
+    print(f"[INFO] Nhịp khung hình: {pacer.summary()}")
+    print(f"[INFO] Gate: {det.gate_hits} hit / {det.gate_misses} miss | "
+          f"ROI: {det.roi_hits} | Full search: {det.full_searches} | "
+          f"Keyframe: {face_det.keyframes} / Propagated: {face_det.propagated}")
+    if texture_worker and texture_worker.cache:
+        cache = texture_worker.cache
+        print(f"[INFO] Texture cache: hit rate {cache.hit_rate:.0%} | CNN {cache.inference_rate:.1f}/s | "
+              f"dropped crops: {texture_worker.dropped}")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,173 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from torch.utils.data import Subset
+
+# Tự động sửa đường dẫn import để tránh lỗi "ModuleNotFoundError"
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path: sys.path.append(current_dir)
+
+from models.texture_cnn import TextureCNN
+from evaluate import load_dataset, make_loader, count_correct
+from train_texture_cnn import run_epoch
+from utils.dataset_cache import CachedImageDataset
+
+BASE_WIDTHS = (16, 32, 64) # Độ rộng của mô hình gốc, nhân với width_mult
+BASE_HIDDEN = 128
+
+# Sinh danh sách cấu hình thử nghiệm
+# grid: mọi tổ hợp của các giá trị đã cho
+# random: lr lấy log-uniform và dropout lấy uniform trong [min, max] của giá trị đã cho, batch/width chọn ngẫu nhiên
+def make_trials(space, search='grid', num_trials=20, seed=0):
+    keys = ('lr', 'batch_size', 'width_mult', 'dropout')
+    if search == 'grid':
+        return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+    rng = random.Random(seed)
+    lo, hi = math.log(min(space['lr'])), math.log(max(space['lr']))
+    trials = []
+    for _ in range(num_trials):
+        trials.append({
+            'lr': float(f"{math.exp(rng.uniform(lo, hi)):.3g}"),
+            'batch_size': rng.choice(space['batch_size']),
+            'width_mult': rng.choice(space['width_mult']),
+            'dropout': round(rng.uniform(min(space['dropout']), max(space['dropout'])), 3),
+        })
+    return trials
+
+# Chia chỉ số train/val cố định (cùng seed -> mọi thử nghiệm dùng cùng tập val)
+def split_indices(n, val_frac, seed=0):
+    perm = torch.randperm(n, generator=torch.Generator().manual_seed(seed)).tolist()
+    n_val = max(1, int(n * val_frac))
+    return perm[n_val:], perm[:n_val]
+
+# Median stopping: sau grace epoch, dừng nếu val acc thấp hơn trung vị của các thử nghiệm khác ở cùng epoch
+def _should_prune(trial_id, epoch, acc, history, grace, min_trials):
+    if epoch < grace:
+        return False
+    others = [accs[epoch] for tid, accs in history.items() if tid != trial_id and len(accs) > epoch]
+    if len(others) < min_trials:
+        return False
+    others.sort()
+    mid = len(others) // 2
+    median = others[mid] if len(others) % 2 else (others[mid - 1] + others[mid]) / 2
+    return acc < median
+
+# Chạy một thử nghiệm trong tiến trình con
+# Mọi tiến trình mở cùng file memmap của cache -> ảnh đã giải mã nằm một lần trong page cache của hệ điều hành
+def run_trial(trial_id, params, cache_dir, val_frac, epochs, patience, grace, min_trials, threads, history):
+    torch.set_num_threads(threads) # Giới hạn luồng mỗi thử nghiệm để các tiến trình không tranh lõi CPU
+    torch.manual_seed(trial_id)
+    t0 = time.perf_counter()
+
+    data = CachedImageDataset(cache_dir)
+    train_idx, val_idx = split_indices(len(data), val_frac)
+    train_loader = make_loader(Subset(data, train_idx), params['batch_size'], shuffle=True)
+    val_loader = make_loader(Subset(data, val_idx), 256)
+
+    mult = params['width_mult']
+    model = TextureCNN(num_classes=len(data.classes),
+                       widths=[max(1, int(round(c * mult))) for c in BASE_WIDTHS],
+                       hidden=max(1, int(round(BASE_HIDDEN * mult))),
+                       dropout=params['dropout'])
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=params['lr'])
+
+    accs, best_acc, best_epoch, status = [], 0.0, 0, 'done'
+    for epoch in range(epochs):
+        run_epoch(model, train_loader, criterion, optimizer, 'cpu')
+        model.eval()
+        correct, total = count_correct(model, val_loader)
+        acc = 100 * correct / max(total, 1)
+        accs.append(acc)
+        history[trial_id] = list(accs) # Gán lại cả danh sách để proxy của Manager nhận thay đổi
+
+        if acc > best_acc:
+            best_acc, best_epoch = acc, epoch + 1
+        if _should_prune(trial_id, epoch, acc, history, grace, min_trials):
+            status = 'pruned'
+            break
+        if epoch + 1 - best_epoch >= patience:
+            status = 'plateau'
+            break
+
+    return {
+        'trial': trial_id, **params,
+        'val_acc': round(best_acc, 2), 'best_epoch': best_epoch, 'epochs_run': len(accs),
+        'status': status, 'params': sum(p.numel() for p in model.parameters()),
+        'seconds': round(time.perf_counter() - t0, 1), 'curve': [round(a, 2) for a in accs],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel hyperparameter sweep for TextureCNN")
+    parser.add_argument('--search', choices=('grid', 'random'), default='grid')
+    parser.add_argument('--trials', type=int, default=20, help="number of trials for --search random")
+    parser.add_argument('--lr', type=float, nargs='+', default=[0.0003, 0.001, 0.003])
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[16, 32, 64])
+    parser.add_argument('--width-mult', type=float, nargs='+', default=[1.0, 0.5])
+    parser.add_argument('--dropout', type=float, nargs='+', default=[0.3, 0.5])
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--patience', type=int, default=4, help="stop a trial after this many epochs without improvement")
+    parser.add_argument('--grace', type=int, default=3, help="epochs before median stopping may prune a trial")
+    parser.add_argument('--min-trials', type=int, default=3, help="trials needed at an epoch before median stopping applies")
+    parser.add_argument('--val-frac', type=float, default=0.15, help="fraction of data/train held out for validation")
+    parser.add_argument('--threads', type=int, default=2, help="torch threads per trial")
+    parser.add_argument('--jobs', type=int, default=None, help="concurrent trials (default: cores / threads)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join(current_dir, 'models', 'sweep_leaderboard.jsonl'))
+    parser.add_argument('--manifest', default=None, help="sweep on the 'train' split of a split manifest instead of data/train")
+    args = parser.parse_args()
+
+    DATA_DIR = args.manifest or os.path.join(current_dir, 'data', 'train')
+    if not os.path.exists(DATA_DIR):
+        print(f"[LỖI] Không tìm thấy: {DATA_DIR}")
+        sys.exit(1)
+
+    # Giải mã dữ liệu một lần vào cache memmap, mọi thử nghiệm đọc chung
+    cache_dir = load_dataset(DATA_DIR, cache=True, manifest=args.manifest, split='train').cache_dir
+
+    space = {'lr': args.lr, 'batch_size': args.batch_size, 'width_mult': args.width_mult, 'dropout': args.dropout}
+    trials = make_trials(space, args.search, args.trials, args.seed)
+    jobs = args.jobs or max(1, (os.cpu_count() or 1) // args.threads)
+    print(f"[INFO] {len(trials)} thử nghiệm ({args.search}) | {jobs} chạy song song x {args.threads} luồng")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    results = []
+    ctx = mp.get_context('spawn') # Tránh fork tiến trình đã khởi tạo thread pool của torch
+    with ctx.Manager() as manager, open(args.output, 'a', encoding='utf-8') as out:
+        history = manager.dict()
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=ctx) as pool:
+            futures = [pool.submit(run_trial, i, params, cache_dir, args.val_frac, args.epochs, args.patience,
+                                   args.grace, args.min_trials, args.threads, history)
+                       for i, params in enumerate(trials)]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                out.write(json.dumps(result, ensure_ascii=False) + "\n") # Ghi ngay để không mất kết quả nếu dừng giữa chừng
+                out.flush()
+                print(f"[{len(results)}/{len(trials)}] #{result['trial']} lr={result['lr']:g} "
+                      f"bs={result['batch_size']} w={result['width_mult']:g} do={result['dropout']:g} -> "
+                      f"{result['val_acc']:.2f}% ({result['status']}, {result['epochs_run']} epoch, {result['seconds']}s)")
+
+    results.sort(key=lambda r: -r['val_acc'])
+    print("\n" + "=" * 78)
+    print(f"{'#':>4} | {'lr':>8} | {'batch':>5} | {'width':>5} | {'dropout':>7} | {'val acc':>8} | {'epoch':>5} | status")
+    print("-" * 78)
+    for r in results[:10]:
+        print(f"{r['trial']:>4} | {r['lr']:>8.2g} | {r['batch_size']:>5} | {r['width_mult']:>5.2g} | "
+              f"{r['dropout']:>7.2g} | {r['val_acc']:>7.2f}% | {r['best_epoch']:>5} | {r['status']}")
+    print("=" * 78)
+    print(f"[THÀNH CÔNG] Bảng xếp hạng: {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.metrics import SpoofMetrics
+
+# 4 ảnh thật (nhãn 1) và 4 ảnh tấn công (nhãn 0); mỗi loại có đúng một mẫu nằm sai phía ngưỡng 0.5
+REAL = [0.9, 0.8, 0.7, 0.3]
+ATTACK = [0.1, 0.2, 0.4, 0.6]
+
+def _metrics(real, attack):
+    m = SpoofMetrics(num_bins=100)
+    m.update(real + attack, [1] * len(real) + [0] * len(attack))
+    return m
+
+def test_apcer_bpcer_acer_at_threshold():
+    r = _metrics(REAL, ATTACK).at_threshold(0.5)
+    assert r['apcer'] == pytest.approx(0.25) # 0.6 được chấp nhận
+    assert r['bpcer'] == pytest.approx(0.25) # 0.3 bị từ chối
+    assert r['acer'] == pytest.approx(0.25)
+
+def test_strict_threshold_trades_apcer_for_bpcer():
+    r = _metrics(REAL, ATTACK).at_threshold(0.75)
+    assert r['apcer'] == pytest.approx(0.0)
+    assert r['bpcer'] == pytest.approx(0.5)
+    assert r['acer'] == pytest.approx(0.25)
+
+def test_eer():
+    e = _metrics(REAL, ATTACK).eer()
+    assert e['eer'] == pytest.approx(0.25)
+    assert 0.4 < e['threshold'] <= 0.6
+
+def test_separable_scores_have_zero_eer_and_unit_auc():
+    m = _metrics([0.9, 0.8], [0.1, 0.2])
+    assert m.eer()['eer'] == pytest.approx(0.0)
+    assert m.auc() == pytest.approx(1.0)
+
+def test_confusion_and_count():
+    s = _metrics(REAL, ATTACK).summary()
+    assert s['count'] == 8
+    assert s['confusion'] == [[3, 1], [1, 3]]
+    assert s['accuracy'] == pytest.approx(0.75)
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import random
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.pipeline import Pipeline, Stage, DROP_BLOCK, DROP_OLDEST, DROP_NEWEST
+
+def _queued(stage):
+    return [item for _, item in stage.queue.items]
+
+def test_drop_oldest_keeps_newest_items():
+    stage = Stage("s", lambda x: x, queue_size=2, drop=DROP_OLDEST)
+    for i in range(5):
+        stage.offer(i)
+    assert _queued(stage) == [3, 4]
+    assert stage.dropped == 3
+
+def test_drop_newest_keeps_queued_items():
+    stage = Stage("s", lambda x: x, queue_size=2, drop=DROP_NEWEST)
+    for i in range(5):
+        stage.offer(i)
+    assert _queued(stage) == [0, 1]
+    assert stage.dropped == 3
+
+def test_tickets_release_in_order_and_skip_dropped():
+    stage = Stage("s", lambda x: x)
+    tickets = [stage._ticket() for _ in range(4)]
+    assert stage._complete(tickets[2], "c") == []     # Chưa tới lượt
+    assert stage._complete(tickets[1], None) == []    # Vé 1 bị bỏ, vé 0 vẫn chưa xong
+    assert stage._complete(tickets[0], "a") == ["a", "c"]
+    assert stage._complete(tickets[3], "d") == ["d"]
+
+def test_pipeline_preserves_order_across_workers():
+    out, lock = [], threading.Lock()
+
+    def slow(x):
+        time.sleep(random.random() * 0.003)
+        return x
+
+    def keep_even(x):
+        return x if x % 2 == 0 else None
+
+    def sink(x):
+        with lock:
+            out.append(x)
+        return x
+
+    pipeline = Pipeline([
+        Stage("slow", slow, workers=4, queue_size=8, drop=DROP_BLOCK),
+        Stage("filter", keep_even, workers=2, queue_size=8, drop=DROP_BLOCK),
+        Stage("sink", sink, queue_size=8, drop=DROP_BLOCK),
+    ]).start()
+    for i in range(200):
+        pipeline.submit(i)
+    deadline = time.time() + 5
+    while len(out) < 100 and time.time() < deadline:
+        time.sleep(0.01)
+    pipeline.stop()
+
+    assert out == list(range(0, 200, 2))
+    report = pipeline.utilization()
+    assert report["slow"]["processed"] == 200
+    assert report["slow"]["dropped"] == 0
+    assert 0.0 <= report["slow"]["util"] <= 1.0
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.texture_cnn import TextureCNN
+from quantize_texture_cnn import quantize, INPUT_SIZE
+
+def _engines():
+    supported = torch.backends.quantized.supported_engines
+    return [e for e in ('x86', 'fbgemm', 'qnnpack', 'onednn') if e in supported]
+
+@pytest.mark.parametrize("engine", _engines())
+def test_quantized_model_runs_on_any_batch_size(engine):
+    torch.manual_seed(0)
+    model = TextureCNN().eval()
+    calib = [(torch.randn(8, 3, INPUT_SIZE, INPUT_SIZE), None) for _ in range(2)]
+    int8 = quantize(model, calib, engine)
+    with torch.inference_mode():
+        for bs in (1, 32):
+            out = int8(torch.randn(bs, 3, INPUT_SIZE, INPUT_SIZE))
+            assert out.shape == (bs, 2)
@@ -0,0 +1,58 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from utils.split_manifest import assign_split, build_manifest, move_test_files, split_items, split_root
+
+KEYS = [f"real/person_{i:05d}.jpg" for i in range(20000)]
+
+def test_assign_split_is_stable_across_runs():
+    here = [assign_split(k, 0.2) for k in KEYS[:200]]
+    assert here == [assign_split(k, 0.2) for k in KEYS[:200]]
+    # Tiến trình mới (hash seed khác) vẫn cho cùng kết quả
+    code = ("import sys; sys.path.insert(0, sys.argv[1]); from utils.split_manifest import assign_split; "
+            "print(''.join(str(assign_split(f'real/person_{i:05d}.jpg', 0.2)) for i in range(200)))")
+    other = subprocess.run([sys.executable, "-c", code, ROOT], capture_output=True, text=True, check=True)
+    assert other.stdout.strip() == "".join(map(str, here))
+
+@pytest.mark.parametrize("ratio", [0.1, 0.2, 0.5])
+def test_test_fraction_matches_ratio(ratio):
+    frac = sum(assign_split(k, ratio) for k in KEYS) / len(KEYS)
+    assert frac == pytest.approx(ratio, abs=0.015)
+
+def test_salt_changes_split():
+    assert [assign_split(k, 0.5) for k in KEYS[:100]] != [assign_split(k, 0.5, salt="x") for k in KEYS[:100]]
+
+def test_manifest_split_is_reproducible(tmp_path):
+    for cls in ("fake", "real"):
+        os.makedirs(tmp_path / cls)
+        for i in range(50):
+            (tmp_path / cls / f"{i}.jpg").write_bytes(f"{cls}-{i}".encode())
+    first = build_manifest(str(tmp_path), 0.3, by='content', workers=2)
+    second = build_manifest(str(tmp_path), 0.3, by='content', workers=2)
+    assert first['classes'] == ["fake", "real"]
+    assert [f[:3] for f in first['files']] == [f[:3] for f in second['files']]
+
+def test_moved_test_split_survives_rebuild(tmp_path):
+    root, dest = tmp_path / "train", tmp_path / "test"
+    for cls in ("fake", "real"):
+        os.makedirs(root / cls)
+        for i in range(30):
+            (root / cls / f"{i}.jpg").write_bytes(f"{cls}-{i}".encode())
+    manifest = build_manifest(str(root), 0.3, workers=2)
+    test = split_items(manifest, 'test')
+    assert move_test_files(manifest, str(dest)) == len(test) > 0
+
+    # Sau khi chuyển, mọi file của cả hai tập vẫn tìm thấy qua split_root
+    for split in ('train', 'test'):
+        assert all(os.path.exists(os.path.join(split_root(manifest, split), rel))
+                   for rel, _ in split_items(manifest, split))
+
+    # Chia lại từ root (chỉ còn ảnh train) không làm mất tập test đã chuyển
+    rebuilt = build_manifest(str(root), 0.3, workers=2, old=manifest)
+    assert sorted(split_items(rebuilt, 'test')) == sorted(test)
+    assert rebuilt['test_root'] == manifest['test_root']
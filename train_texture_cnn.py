@@ -1,10 +1,12 @@
 ﻿import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
-from torch.utils.data import DataLoader
 from torchvision import transforms, datasets
 import os
 import sys
+import time
+import argparse
 
 # Tự động sửa đường dẫn import để tránh lỗi "ModuleNotFoundError"
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,15 +19,57 @@ except ImportError:
     sys.path.append(os.path.dirname(current_dir))
     from models.texture_cnn import TextureCNN
 
-def train():
+from evaluate import get_transform, load_dataset, build_loader, make_loader, count_correct, latency_ms, to_device
+from utils.augment import BatchAugment
+from utils.dataset_cache import default_cache_dir, CachedImageDataset
+from utils.split_manifest import manifest_cache_dir
+
+# Số tiến trình nạp dữ liệu mặc định (giữ lại lõi cho vòng lặp huấn luyện)
+DEFAULT_WORKERS = min(4, max(1, (os.cpu_count() or 1) - 1))
+
+# Chạy một epoch huấn luyện, trả về (tổng loss, số đúng, số ảnh, số batch, thời gian chờ dữ liệu)
+# Thời gian chờ DataLoader: tỉ lệ cao nghĩa là bộ nạp dữ liệu (không phải mô hình) đang là nút thắt
+def run_epoch(model, loader, criterion, optimizer, device, augmenter=None):
+    model.train()
+    running_loss = 0.0
+    correct = 0
+    total = 0
+    batches = 0
+    data_time = 0.0
+    t_fetch = time.perf_counter()
+
+    for images, labels in loader:
+        data_time += time.perf_counter() - t_fetch
+        images, labels = to_device(images, device), labels.to(device, non_blocking=True)
+        if augmenter is not None:
+            images = augmenter(images)
+
+        optimizer.zero_grad()
+        outputs = model(images)
+        loss = criterion(outputs, labels)
+        loss.backward() # Với DDP: gradient được all-reduce giữa các rank ngay trong backward
+        optimizer.step()
+
+        running_loss += loss.item()
+        _, predicted = torch.max(outputs.data, 1)
+        total += labels.size(0)
+        correct += (predicted == labels).sum().item()
+        batches += 1
+        t_fetch = time.perf_counter()
+    return running_loss, correct, total, batches, data_time
+
+# workers / prefetch: số tiến trình DataLoader và số batch mỗi worker nạp trước
+# augment: tăng cường dữ liệu trên cả batch (lật, màu, blur, nén JPEG) ngay trên thiết bị huấn luyện
+# manifest: học trên tập 'train' của manifest chia tập (utils/split_manifest.py) thay cho data/train
+def train(cache=False, batch_size=16, workers=DEFAULT_WORKERS, prefetch=2, augment=False, manifest=None):
     # 1. Cấu hình
     # Trỏ thẳng vào thư mục chứa code hiện tại + /data/train
-    DATA_DIR = os.path.join(current_dir, 'data', 'train')
+    DATA_DIR = manifest or os.path.join(current_dir, 'data', 'train')
     MODEL_DIR = os.path.join(current_dir, 'models')
     MODEL_PATH = os.path.join(MODEL_DIR, 'trained_model.pth')
     
     DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-    BATCH_SIZE = 16
+    BATCH_SIZE = batch_size
     EPOCHS = 20
     LR = 0.001
 
@@ -42,7 +86,12 @@ def train():
     ])
 
     try:
-        train_data = datasets.ImageFolder(root=DATA_DIR, transform=transform)
+        if cache or manifest:
+            # cache: đọc ảnh đã giải mã + resize sẵn (chỉ xử lý lại file mới/đã đổi)
+            # manifest: chỉ lấy các file thuộc tập 'train', không cần di chuyển file
+            train_data = load_dataset(DATA_DIR, cache, manifest, split='train')
+        else:
+            train_data = datasets.ImageFolder(root=DATA_DIR, transform=transform)
     except Exception as e:
         print(f"[LỖI LOAD DATA] {e}")
         return
@@ -52,7 +101,12 @@ def train():
     if len(train_data.classes) != 2:
         print(f"[CẢNH BÁO] Số lớp dữ liệu là {len(train_data.classes)} (Cần 2: real/fake).")
 
-    train_loader = DataLoader(train_data, batch_size=BATCH_SIZE, shuffle=True)
+    # pin_memory chỉ có ích khi chép sang GPU
+    train_loader = make_loader(train_data, BATCH_SIZE, shuffle=True, workers=workers, prefetch=prefetch,
+                               pin_memory=DEVICE.type == 'cuda')
+    augmenter = BatchAugment() if augment else None
+    print(f"[INFO] DataLoader: batch {BATCH_SIZE} | {workers} worker | prefetch {prefetch} | "
+          f"augment {'bật' if augment else 'tắt'}")
 
     # 3. Khởi tạo Model
     print(f"[INFO] Khởi tạo model trên {DEVICE}...")
@@ -64,39 +118,273 @@ def train():
     # 4. Training Loop
     print("Bắt đầu huấn luyện...")
     for epoch in range(EPOCHS):
-        model.train()
-        running_loss = 0.0
-        correct = 0
-        total = 0
-        
-        for i, (images, labels) in enumerate(train_loader):
-            images, labels = images.to(DEVICE), labels.to(DEVICE)
-            
-            optimizer.zero_grad()
-            
-            try:
-                outputs = model(images)
-                loss = criterion(outputs, labels)
-                loss.backward()
-                optimizer.step()
-                
-                running_loss += loss.item()
-                _, predicted = torch.max(outputs.data, 1)
-                total += labels.size(0)
-                correct += (predicted == labels).sum().item()
-            except RuntimeError as e:
-                print(f"\n[LỖI KHI TRAIN] {e}")
-                print("Khả năng cao là lỗi kích thước ảnh. Hãy chắc chắn transforms.Resize((64,64)).")
-                return
-
-        avg_loss = running_loss / len(train_loader)
+        t_epoch = time.perf_counter()
+        try:
+            running_loss, correct, total, batches, data_time = run_epoch(
+                model, train_loader, criterion, optimizer, DEVICE, augmenter)
+        except RuntimeError as e:
+            print(f"\n[LỖI KHI TRAIN] {e}")
+            print("Khả năng cao là lỗi kích thước ảnh. Hãy chắc chắn transforms.Resize((64,64)).")
+            return
+
+        elapsed = time.perf_counter() - t_epoch
+        avg_loss = running_loss / batches
         acc = 100 * correct / total
-        print(f"Epoch {epoch+1}/{EPOCHS} | Loss: {avg_loss:.4f} | Acc: {acc:.2f}%")
+        print(f"Epoch {epoch+1}/{EPOCHS} | Loss: {avg_loss:.4f} | Acc: {acc:.2f}% | "
+              f"{batches / elapsed:.1f} batch/s | chờ dữ liệu {100 * data_time / elapsed:.0f}%")
 
     # 5. Lưu model
     if not os.path.exists(MODEL_DIR): os.makedirs(MODEL_DIR)
     torch.save(model.state_dict(), MODEL_PATH)
     print(f"\n[THÀNH CÔNG] Đã lưu model: {MODEL_PATH}")
 
+# --- TỈA KÊNH (STRUCTURED PRUNING) + CHƯNG CẤT (DISTILLATION) ---
+
+# Chọn các chỉ số có chuẩn L1 lớn nhất (giữ nguyên thứ tự)
+def _top_l1(weight, k):
+    scores = weight.abs().reshape(weight.shape[0], -1).sum(dim=1)
+    return torch.sort(torch.topk(scores, k).indices).values
+
+# Tạo mô hình học trò hẹp hơn từ mô hình thầy: giữ các kênh conv / neuron fc1 có chuẩn L1 lớn nhất
+# rồi chép trọng số tương ứng sang (để học trò bắt đầu gần với thầy thay vì khởi tạo ngẫu nhiên)
+def prune_student(teacher, width_mult):
+    t = teacher.state_dict()
+    widths = [max(1, int(round(c * width_mult))) for c in teacher.widths]
+    hidden = max(1, int(round(teacher.hidden * width_mult)))
+    student = TextureCNN(num_classes=teacher.fc2.out_features, widths=widths, hidden=hidden)
+    s = student.state_dict()
+
+    keep_in = torch.arange(3) # Kênh đầu vào RGB
+    for i, w in zip((1, 2, 3), widths):
+        keep = _top_l1(t[f'conv{i}.weight'], w)
+        s[f'conv{i}.weight'] = t[f'conv{i}.weight'][keep][:, keep_in].clone()
+        s[f'conv{i}.bias'] = t[f'conv{i}.bias'][keep].clone()
+        for name in ('weight', 'bias', 'running_mean', 'running_var'):
+            s[f'bn{i}.{name}'] = t[f'bn{i}.{name}'][keep].clone()
+        keep_in = keep
+
+    # fc1 nhận đầu vào đã duỗi theo thứ tự (kênh, 8, 8) -> mỗi kênh giữ lại ứng với 64 đặc trưng liên tiếp
+    feat = (keep_in.unsqueeze(1) * 64 + torch.arange(64)).reshape(-1)
+    keep_h = _top_l1(t['fc1.weight'], hidden)
+    s['fc1.weight'] = t['fc1.weight'][keep_h][:, feat].clone()
+    s['fc1.bias'] = t['fc1.bias'][keep_h].clone()
+    s['fc2.weight'] = t['fc2.weight'][:, keep_h].clone()
+    s['fc2.bias'] = t['fc2.bias'].clone()
+    student.load_state_dict(s)
+    return student
+
+# Hàm mất mát thầy-trò: KL giữa phân phối "mềm" (nhiệt độ T) + cross-entropy với nhãn thật
+def distill_loss(student_logits, teacher_logits, labels, T, alpha):
+    soft = F.kl_div(F.log_softmax(student_logits / T, dim=1), F.softmax(teacher_logits / T, dim=1),
+                    reduction='batchmean') * (T * T)
+    hard = F.cross_entropy(student_logits, labels)
+    return alpha * soft + (1 - alpha) * hard
+
+def distill(teacher, student, loader, epochs, lr, T, alpha, device):
+    teacher.eval()
+    optimizer = optim.Adam(student.parameters(), lr=lr)
+    for epoch in range(epochs):
+        student.train()
+        running_loss = 0.0
+        for images, labels in loader:
+            images, labels = to_device(images, device), labels.to(device)
+            with torch.no_grad():
+                teacher_logits = teacher(images)
+            optimizer.zero_grad()
+            loss = distill_loss(student(images), teacher_logits, labels, T, alpha)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item()
+        print(f"  Epoch {epoch+1}/{epochs} | Loss: {running_loss / len(loader):.4f}")
+    student.eval()
+    return student
+
+# Chưng cất mô hình hiện tại thành các biến thể hẹp hơn và in bảng so sánh
+def distill_variants(width_mults=(0.75, 0.5, 0.25), epochs=10, T=4.0, alpha=0.7, batch_size=16, lr=0.001, cache=False,
+                     manifest=None):
+    DATA_DIR = manifest or os.path.join(current_dir, 'data', 'train')
+    TEST_DIR = manifest or os.path.join(current_dir, 'data', 'test')
+    MODEL_DIR = os.path.join(current_dir, 'models')
+    MODEL_PATH = os.path.join(MODEL_DIR, 'trained_model.pth')
+    DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    for path in (DATA_DIR, TEST_DIR, MODEL_PATH):
+        if not os.path.exists(path):
+            print(f"[LỖI] Không tìm thấy: {path}")
+            return
+
+    _, train_loader = build_loader(DATA_DIR, batch_size=batch_size, shuffle=True, cache=cache, manifest=manifest, split='train')
+    _, test_loader = build_loader(TEST_DIR, batch_size=32, cache=cache, manifest=manifest, split='test')
+    teacher = TextureCNN.from_state_dict(torch.load(MODEL_PATH, map_location=DEVICE)).to(DEVICE)
+
+    # Đo một mô hình: số tham số, dung lượng file, độ trễ CPU (batch 1 và 32), độ chính xác test
+    def measure(name, model, path):
+        correct, total = count_correct(model.to(DEVICE).eval(), test_loader, DEVICE)
+        cpu_model = model.cpu()
+        row = (name, sum(p.numel() for p in cpu_model.parameters()), os.path.getsize(path) / 1024,
+               latency_ms(cpu_model, 1), latency_ms(cpu_model, 32), 100 * correct / max(total, 1))
+        model.to(DEVICE)
+        return row
+
+    rows = [measure("teacher", teacher, MODEL_PATH)]
+    for mult in width_mults:
+        print(f"\n[INFO] Biến thể x{mult}: tỉa kênh rồi chưng cất {epochs} epoch...")
+        student = prune_student(teacher, mult).to(DEVICE)
+        distill(teacher, student, train_loader, epochs, lr, T, alpha, DEVICE)
+        path = os.path.join(MODEL_DIR, f'trained_model_w{mult:g}.pth')
+        torch.save(student.state_dict(), path)
+        rows.append(measure(f"x{mult:g} {student.widths}/{student.hidden}", student, path))
+
+    print("\n" + "=" * 86)
+    print(f"{'Variant':<26} | {'Params':>9} | {'Size':>8} | {'Lat b1':>9} | {'Lat b32':>9} | {'Accuracy':>8}")
+    print("-" * 86)
+    for name, params, size_kb, lat1, lat32, acc in rows:
+        print(f"{name:<26} | {params:>9,} | {size_kb:>5.0f} KB | {lat1:>6.3f} ms | {lat32:>6.2f} ms | {acc:>7.2f}%")
+    print("=" * 86)
+
+
+# --- HUẤN LUYỆN SONG SONG DỮ LIỆU NHIỀU TIẾN TRÌNH (CPU, torch.distributed + gloo) ---
+
+def _free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+# Tiến trình của một rank: mỗi rank học trên một phần dữ liệu (DistributedSampler),
+# DDP all-reduce gradient sau mỗi backward nên mọi rank giữ cùng một bộ trọng số
+def _ddp_worker(rank, world_size, port, cache, batch_size, epochs, lr, workers, save, report, manifest=None,
+                prefetch=2, augment=False):
+    import torch.distributed as dist
+    from torch.nn.parallel import DistributedDataParallel as DDP
+    from torch.utils.data.distributed import DistributedSampler
+
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(port)
+    dist.init_process_group('gloo', rank=rank, world_size=world_size)
+    # Chia đều lõi CPU cho các rank để các tiến trình không tranh luồng của nhau
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    torch.manual_seed(0)
+
+    DATA_DIR = os.path.join(current_dir, 'data', 'train')
+    MODEL_PATH = os.path.join(current_dir, 'models', 'trained_model.pth')
+    if cache:
+        # Cache đã được tiến trình cha build
+        train_data = CachedImageDataset(manifest_cache_dir(manifest, 'train') if manifest else default_cache_dir(DATA_DIR))
+    elif manifest:
+        train_data = load_dataset(DATA_DIR, manifest=manifest, split='train')
+    else:
+        train_data = datasets.ImageFolder(root=DATA_DIR, transform=get_transform())
+    sampler = DistributedSampler(train_data, num_replicas=world_size, rank=rank, shuffle=True, seed=0)
+    loader = make_loader(train_data, batch_size, workers=workers, prefetch=prefetch, sampler=sampler)
+
+    model = DDP(TextureCNN(num_classes=len(train_data.classes)))
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    augmenter = BatchAugment() if augment else None
+    torch.manual_seed(rank) # Trọng số đã đồng bộ từ rank 0 khi tạo DDP; từ đây mỗi rank tăng cường ngẫu nhiên khác nhau
+
+    images_seen = 0
+    t_start = time.perf_counter()
+    for epoch in range(epochs):
+        sampler.set_epoch(epoch) # Xáo trộn khác nhau mỗi epoch nhưng nhất quán giữa các rank
+        running_loss, correct, total, batches, _ = run_epoch(model, loader, criterion, optimizer, 'cpu', augmenter)
+        images_seen += total
+
+        stats = torch.tensor([running_loss, correct, total, batches], dtype=torch.float64)
+        dist.all_reduce(stats)
+        if rank == 0:
+            loss_sum, correct, total, batches = stats.tolist()
+            print(f"Epoch {epoch+1}/{epochs} | Loss: {loss_sum / batches:.4f} | Acc: {100 * correct / total:.2f}% "
+                  f"| {world_size} rank")
+
+    # Thông lượng = tổng số ảnh của mọi rank / thời gian của rank chậm nhất
+    elapsed = torch.tensor([time.perf_counter() - t_start], dtype=torch.float64)
+    seen = torch.tensor([images_seen], dtype=torch.float64)
+    dist.all_reduce(elapsed, op=dist.ReduceOp.MAX)
+    dist.all_reduce(seen)
+
+    if rank == 0:
+        if save:
+            # Lưu state_dict của mô hình bên trong (không có tiền tố 'module.') -> cùng định dạng với train()
+            torch.save(model.module.state_dict(), MODEL_PATH)
+            print(f"\n[THÀNH CÔNG] Đã lưu model: {MODEL_PATH}")
+        report.put(seen.item() / elapsed.item())
+    dist.destroy_process_group()
+
+# Huấn luyện bằng world_size tiến trình trên một máy, trả về thông lượng (ảnh/giây)
+# batch_size là batch của mỗi rank (batch toàn cục = batch_size * world_size)
+def train_distributed(world_size, cache=False, batch_size=16, epochs=20, lr=0.001, workers=0, save=True, manifest=None,
+                      prefetch=2, augment=False):
+    import torch.multiprocessing as mp
+
+    DATA_DIR = manifest or os.path.join(current_dir, 'data', 'train')
+    if not os.path.exists(DATA_DIR):
+        print(f"[LỖI] Không tìm thấy: {DATA_DIR}")
+        return None
+    if cache:
+        load_dataset(DATA_DIR, cache, manifest, split='train') # Build một lần trước khi các rank mở memmap
+    os.makedirs(os.path.join(current_dir, 'models'), exist_ok=True)
+
+    print(f"[INFO] Huấn luyện phân tán: {world_size} rank (gloo) | batch {batch_size}/rank | {epochs} epoch | "
+          f"{workers} worker | prefetch {prefetch} | augment {'bật' if augment else 'tắt'}")
+    report = mp.get_context('spawn').SimpleQueue()
+    mp.spawn(_ddp_worker, args=(world_size, _free_port(), cache, batch_size, epochs, lr, workers, save, report, manifest,
+                             prefetch, augment),
+             nprocs=world_size, join=True)
+    return report.get()
+
+# Đo thông lượng với các số rank khác nhau (không ghi model) và in bảng mở rộng
+def ddp_scaling(rank_counts, epochs=1, cache=False, batch_size=16, workers=0, manifest=None, prefetch=2, augment=False):
+    rows = []
+    for n in rank_counts:
+        ips = train_distributed(n, cache=cache, batch_size=batch_size, epochs=epochs, workers=workers, save=False,
+                                manifest=manifest, prefetch=prefetch, augment=augment)
+        if ips is None:
+            return
+        rows.append((n, ips))
+
+    base_n, base = rows[0]
+    print("\n" + "=" * 52)
+    print(f"{'Ranks':>5} | {'Ảnh/giây':>10} | {'Tăng tốc':>9} | {'Hiệu suất':>10}")
+    print("-" * 52)
+    for n, ips in rows:
+        speedup = ips / base
+        print(f"{n:>5} | {ips:>10.1f} | {speedup:>8.2f}x | {100 * speedup * base_n / n:>9.0f}%")
+    print("=" * 52)
+
+
 if __name__ == '__main__':
-    train()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train TextureCNN")
+    parser.add_argument('--distill', action='store_true',
+                        help="prune + distill trained_model.pth into narrower variants and print a comparison table")
+    parser.add_argument('--widths', type=float, nargs='+', default=[0.75, 0.5, 0.25], help="width multipliers of the variants")
+    parser.add_argument('--distill-epochs', type=int, default=10)
+    parser.add_argument('--temperature', type=float, default=4.0)
+    parser.add_argument('--alpha', type=float, default=0.7, help="weight of the teacher (soft) loss")
+    parser.add_argument('--cache', action='store_true',
+                        help="read images from the memory-mapped cache in data/cache/ (built/updated incrementally)")
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="DataLoader worker processes (0 = main process)")
+    parser.add_argument('--prefetch', type=int, default=2, help="batches prefetched per worker")
+    parser.add_argument('--augment', action='store_true', help="batched flip / color jitter / blur / JPEG augmentation")
+    parser.add_argument('--ddp', type=int, default=0, metavar='N',
+                        help="train with N local CPU processes (torch.distributed, gloo); --batch-size is per rank")
+    parser.add_argument('--ddp-scaling', type=int, nargs='+', metavar='N',
+                        help="measure throughput for each rank count (e.g. 1 2 4 8) without saving a model")
+    parser.add_argument('--epochs', type=int, default=None, help="epochs for --ddp (default 20) / --ddp-scaling (default 1)")
+    parser.add_argument('--manifest', default=None,
+                        help="train on the 'train' split of a split manifest (utils/split_manifest.py) instead of data/train")
+    args = parser.parse_args()
+
+    if args.ddp_scaling:
+        ddp_scaling(args.ddp_scaling, args.epochs or 1, args.cache, args.batch_size, args.workers, args.manifest,
+                    args.prefetch, args.augment)
+    elif args.ddp:
+        train_distributed(args.ddp, args.cache, args.batch_size, args.epochs or 20, workers=args.workers,
+                          manifest=args.manifest, prefetch=args.prefetch, augment=args.augment)
+    elif args.distill:
+        distill_variants(args.widths, args.distill_epochs, args.temperature, args.alpha, cache=args.cache,
+                         manifest=args.manifest)
+    else:
+        train(args.cache, args.batch_size, args.workers, args.prefetch, args.augment, args.manifest)
\ No newline at end of file
@@ -0,0 +1,111 @@
+import math
+import torch
+import torch.nn.functional as F
+
+# Bảng lượng tử hóa độ sáng chuẩn của JPEG (Annex K) cho khối 8x8
+_JPEG_Q = torch.tensor([
+    [16, 11, 10, 16, 24, 40, 51, 61],
+    [12, 12, 14, 19, 26, 58, 60, 55],
+    [14, 13, 16, 24, 40, 57, 69, 56],
+    [14, 17, 22, 29, 51, 87, 80, 62],
+    [18, 22, 37, 56, 68, 109, 103, 77],
+    [24, 35, 55, 64, 81, 104, 113, 92],
+    [49, 64, 78, 87, 103, 121, 120, 101],
+    [72, 92, 95, 98, 112, 100, 103, 99],
+], dtype=torch.float32)
+
+# Ma trận DCT-II trực chuẩn 8x8: coeffs = D @ block @ D^T
+def _dct_matrix(n=8):
+    k = torch.arange(n, dtype=torch.float32).unsqueeze(1)
+    i = torch.arange(n, dtype=torch.float32).unsqueeze(0)
+    d = torch.cos(math.pi * (2 * i + 1) * k / (2 * n)) * math.sqrt(2.0 / n)
+    d[0] /= math.sqrt(2.0)
+    return d
+
+# Tăng cường dữ liệu trên cả batch tensor (B, 3, H, W) đã chuẩn hóa về [-1, 1], chạy trên thiết bị của batch
+# Mỗi phép biến đổi được bật ngẫu nhiên theo từng ảnh bằng mặt nạ, không lặp Python theo ảnh
+class BatchAugment:
+    # flip_p: xác suất lật ngang
+    # brightness / contrast / saturation: biên độ dao động (vd. 0.2 -> hệ số trong [0.8, 1.2])
+    # blur_p, blur_sigma: xác suất và khoảng sigma của Gaussian blur 3x3
+    # jpeg_p, jpeg_quality: xác suất và khoảng chất lượng JPEG mô phỏng (lượng tử hóa DCT 8x8)
+    def __init__(self, flip_p=0.5, brightness=0.2, contrast=0.2, saturation=0.2,
+                 blur_p=0.2, blur_sigma=(0.3, 1.2), jpeg_p=0.3, jpeg_quality=(40, 95)):
+        self.flip_p = flip_p
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self.blur_p = blur_p
+        self.blur_sigma = blur_sigma
+        self.jpeg_p = jpeg_p
+        self.jpeg_quality = jpeg_quality
+        self._dct = _dct_matrix()
+
+    # Hệ số ngẫu nhiên mỗi ảnh trong [1 - amount, 1 + amount], dạng (B, 1, 1, 1)
+    @staticmethod
+    def _factor(b, amount, device):
+        return 1.0 + (torch.rand(b, 1, 1, 1, device=device) * 2 - 1) * amount
+
+    @staticmethod
+    def _mask(b, p, device):
+        return (torch.rand(b, 1, 1, 1, device=device) < p)
+
+    def flip(self, x):
+        return torch.where(self._mask(x.shape[0], self.flip_p, x.device), x.flip(3), x)
+
+    # Color jitter trên ảnh [0, 1]
+    def color_jitter(self, x):
+        b, device = x.shape[0], x.device
+        if self.brightness > 0:
+            x = x * self._factor(b, self.brightness, device)
+        if self.contrast > 0:
+            mean = x.mean(dim=(1, 2, 3), keepdim=True)
+            x = (x - mean) * self._factor(b, self.contrast, device) + mean
+        if self.saturation > 0:
+            gray = (0.299 * x[:, 0:1] + 0.587 * x[:, 1:2] + 0.114 * x[:, 2:3])
+            x = (x - gray) * self._factor(b, self.saturation, device) + gray
+        return x.clamp_(0.0, 1.0)
+
+    # Gaussian blur 3x3 với sigma riêng cho mỗi ảnh (kernel tách được, dùng conv nhóm theo ảnh)
+    def blur(self, x):
+        b, c, h, w = x.shape
+        lo, hi = self.blur_sigma
+        sigma = torch.empty(b, 1, device=x.device).uniform_(lo, hi)
+        k1 = torch.exp(-torch.tensor([1.0, 0.0, 1.0], device=x.device) / (2 * sigma ** 2)) # (B, 3)
+        k1 = k1 / k1.sum(dim=1, keepdim=True)
+        kernel = (k1.unsqueeze(2) * k1.unsqueeze(1)).repeat_interleave(c, dim=0).unsqueeze(1) # (B*C, 1, 3, 3)
+        out = F.conv2d(F.pad(x.reshape(1, b * c, h, w), (1, 1, 1, 1), mode='replicate'), kernel, groups=b * c)
+        out = out.reshape(b, c, h, w)
+        return torch.where(self._mask(b, self.blur_p, x.device), out, x)
+
+    # Mô phỏng nén JPEG: DCT từng khối 8x8, lượng tử hóa theo bảng chuẩn co giãn theo chất lượng, rồi IDCT
+    def jpeg(self, x):
+        b, c, h, w = x.shape
+        if h % 8 or w % 8:
+            return x
+        device = x.device
+        d = self._dct.to(device)
+        lo, hi = self.jpeg_quality
+        q = torch.randint(lo, hi + 1, (b,), device=device).float()
+        scale = torch.where(q < 50, 5000.0 / q, 200.0 - 2 * q) / 100.0 # Công thức co giãn của libjpeg
+        table = (_JPEG_Q.to(device) * scale.view(b, 1, 1)).clamp_(min=1.0).view(b, 1, 1, 1, 8, 8)
+
+        # (B, C, H, W) -> (B, C, H/8, W/8, 8, 8)
+        blocks = (x * 255.0 - 128.0).reshape(b, c, h // 8, 8, w // 8, 8).permute(0, 1, 2, 4, 3, 5)
+        coeffs = d @ blocks @ d.T
+        coeffs = torch.round(coeffs / table) * table
+        blocks = d.T @ coeffs @ d
+        out = ((blocks.permute(0, 1, 2, 4, 3, 5).reshape(b, c, h, w) + 128.0) / 255.0).clamp_(0.0, 1.0)
+        return torch.where(self._mask(b, self.jpeg_p, device), out, x)
+
+    @torch.no_grad()
+    def __call__(self, x):
+        x = (x + 1.0) * 0.5 # [-1, 1] -> [0, 1]
+        if self.flip_p > 0:
+            x = self.flip(x)
+        x = self.color_jitter(x)
+        if self.blur_p > 0:
+            x = self.blur(x)
+        if self.jpeg_p > 0:
+            x = self.jpeg(x)
+        return x * 2.0 - 1.0
@@ -0,0 +1,126 @@
+import time
+import threading
+import cv2
+import numpy as np
+
+# CameraStream đọc camera trên luồng riêng vào một vòng đệm (ring buffer) cấp phát sẵn
+# Người dùng luôn nhận frame MỚI NHẤT; các frame bị ghi đè trước khi kịp đọc được đếm là bỏ qua (dropped)
+# Driver không còn giữ hàng đợi frame cũ khi vòng xử lý bị chậm -> độ trễ hiển thị thấp
+class CameraStream:
+    # src: chỉ số camera hoặc đường dẫn video
+    # width / height: độ phân giải yêu cầu (None = mặc định của driver)
+    # buffer_size: số ô của vòng đệm (tối thiểu 3: một ô đang ghi, một ô mới nhất, một ô người dùng đang giữ)
+    def __init__(self, src=0, width=None, height=None, buffer_size=3):
+        self.cap = cv2.VideoCapture(src)
+        if width: self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height: self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1) # Không để driver giữ frame cũ
+        self.buffer_size = max(3, buffer_size)
+
+        self._ring = None   # (buffer_size, h, w, 3) uint8, cấp phát khi có frame đầu tiên
+        self._seq = [0] * self.buffer_size
+        self._stamp = [0.0] * self.buffer_size
+        self._latest = -1   # Ô chứa frame mới nhất
+        self._held = -1     # Ô người dùng đang giữ (không ghi đè)
+        self._cond = threading.Condition()
+        self._thread = None
+        self.running = False
+        self.interval = 0.0 # Khoảng tối thiểu giữa hai lần đọc camera (giây), 0 = theo nhịp camera
+        self._last_capture = 0.0
+
+        self.captured = 0   # Số frame đã đọc từ camera
+        self.delivered = 0  # Số frame đã trả cho người dùng
+        self.dropped = 0    # Số frame bị frame mới hơn ghi đè trước khi được đọc
+        self.seq = 0        # Số thứ tự của frame trả về gần nhất
+        self.timestamp = 0.0 # time.monotonic() lúc chụp frame trả về gần nhất
+        self._last_seq = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        if self._thread is None:
+            self.running = True
+            self._thread = threading.Thread(target=self._run, name="CameraStream", daemon=True)
+            self._thread.start()
+        return self
+
+    # Giới hạn tốc độ đọc camera (vd. chế độ nghỉ); 0 = đọc theo nhịp camera. Có hiệu lực ngay cả khi luồng đang chờ
+    def set_interval(self, sec):
+        with self._cond:
+            self.interval = max(0.0, sec)
+            self._cond.notify_all()
+
+    def _run(self):
+        while self.running:
+            with self._cond:
+                # Chờ đủ khoảng giữa hai lần đọc (không đọc / giải mã frame nào trong lúc chờ)
+                while self.running and time.monotonic() - self._last_capture < self.interval:
+                    self._cond.wait(self.interval - (time.monotonic() - self._last_capture))
+                if not self.running:
+                    break
+                # Chọn ô để ghi: không phải ô mới nhất (sắp được đọc) và không phải ô đang bị giữ
+                slot = next(i for i in range(self.buffer_size) if i != self._latest and i != self._held)
+            ring = self._ring
+            if ring is None:
+                ok, frame = self.cap.read()
+            else:
+                ok, frame = self.cap.read(ring[slot]) # Giải mã thẳng vào ô của vòng đệm
+            if ok and (ring is None or frame.shape != ring.shape[1:]):
+                # Frame đầu tiên hoặc độ phân giải đổi giữa chừng -> cấp phát vòng đệm theo kích thước mới
+                # (frame người dùng đang giữ vẫn trỏ vào mảng cũ nên không bị hỏng)
+                ring = np.empty((self.buffer_size,) + frame.shape, dtype=frame.dtype)
+                ring[slot] = frame
+            elif ok and not np.shares_memory(frame, ring[slot]):
+                ring[slot] = frame
+            stamp = time.monotonic()
+            self._last_capture = stamp
+            if not ok:
+                with self._cond:
+                    self.running = False
+                    self._cond.notify_all()
+                break
+
+            with self._cond:
+                if ring is not self._ring:
+                    # Đổi vòng đệm cùng lúc với ô mới nhất: các ô khác của mảng mới chưa có dữ liệu
+                    self._ring = ring
+                    self._seq = [0] * self.buffer_size
+                self.captured += 1
+                self._seq[slot] = self.captured
+                self._stamp[slot] = stamp
+                self._latest = slot
+                self._cond.notify_all()
+
+    # Lấy frame mới nhất (chờ tới khi có frame chưa đọc, tối đa timeout giây nếu có)
+    # Trả về (ok, frame) như cv2.VideoCapture.read(); frame là view vào vòng đệm, chỉ hợp lệ tới lần read() sau
+    def read(self, timeout=None):
+        with self._cond:
+            if not self._cond.wait_for(lambda: not self.running or
+                                       (self._latest >= 0 and self._seq[self._latest] > self._last_seq), timeout):
+                return False, None
+            if self._latest < 0 or self._seq[self._latest] <= self._last_seq:
+                return False, None # Luồng đọc đã dừng (hết video / mất camera)
+            slot = self._latest
+            ring = self._ring # Lấy vòng đệm trong khóa: luồng đọc có thể thay mảng mới khi đổi độ phân giải
+            self._held = slot
+            seq = self._seq[slot]
+            self.dropped += seq - self._last_seq - 1
+            self._last_seq = seq
+            self.delivered += 1
+            self.seq = seq
+            self.timestamp = self._stamp[slot]
+        return True, ring[slot]
+
+    # Độ trễ (giây) từ lúc chụp tới hiện tại của frame trả về gần nhất
+    def age(self):
+        return time.monotonic() - self.timestamp
+
+    def release(self):
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self.cap.release()
@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+
+# Bộ nhớ đệm dữ liệu đã tiền xử lý: giải mã + resize mỗi ảnh MỘT lần, lưu thành mảng uint8 (N, 64, 64, 3)
+# ánh xạ bộ nhớ (memory-mapped) kèm mảng nhãn và manifest. Lần build sau chỉ xử lý lại các file đã đổi.
+#
+#   <cache_dir>/images.npy    uint8 (N, size, size, 3), thứ tự kênh RGB (giống ImageFolder/PIL)
+#   <cache_dir>/labels.npy    int64 (N,)
+#   <cache_dir>/manifest.json {"size", "classes", "entries": [[relpath, mtime_ns, bytes, sha1, label], ...]}
+
+IMG_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+CACHE_SIZE = 64 # Kích thước ảnh đầu vào của TextureCNN
+
+# Quét thư mục theo kiểu ImageFolder: mỗi thư mục con là một lớp, tìm ảnh đệ quy bên trong
+# Trả về (classes, [(relpath, label), ...]) đã sắp xếp
+def scan_image_folder(root):
+    classes = sorted(d.name for d in os.scandir(root) if d.is_dir())
+    items = []
+    for label, cls in enumerate(classes):
+        for dirpath, _, files in os.walk(os.path.join(root, cls)):
+            for f in files:
+                if f.lower().endswith(IMG_EXTS):
+                    items.append((os.path.relpath(os.path.join(dirpath, f), root), label))
+    items.sort()
+    return classes, items
+
+# Đọc file một lần: trả về (sha1, ảnh RGB đã resize) hoặc (sha1, None) nếu không giải mã được
+def _load(path, size):
+    data = np.fromfile(path, dtype=np.uint8)
+    sha1 = hashlib.sha1(data).hexdigest()
+    img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if img is None:
+        return sha1, None
+    img = cv2.resize(img, (size, size), interpolation=cv2.INTER_AREA)
+    return sha1, cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+# Thư mục cache mặc định của một tập ảnh: data/train -> data/cache/train
+def default_cache_dir(data_dir):
+    data_dir = os.path.abspath(data_dir)
+    return os.path.join(os.path.dirname(data_dir), 'cache', os.path.basename(data_dir))
+
+def _read_manifest(cache_dir):
+    path = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# Tạo/cập nhật cache cho một thư mục ảnh
+# items: danh sách (relpath, label) có sẵn (vd. từ manifest chia tập); mặc định quét root kiểu ImageFolder
+def build_cache(root, cache_dir, size=CACHE_SIZE, workers=None, classes=None, items=None):
+    if items is None:
+        classes, items = scan_image_folder(root)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Nạp cache cũ (nếu cùng kích thước ảnh) để dùng lại các dòng không đổi
+    old = _read_manifest(cache_dir)
+    old_rows, old_images = {}, None
+    if old is not None and old.get('size') == size and os.path.exists(os.path.join(cache_dir, 'images.npy')):
+        old_images = np.load(os.path.join(cache_dir, 'images.npy'), mmap_mode='r')
+        old_rows = {e[0]: (i, e) for i, e in enumerate(old['entries'])}
+    old_by_hash = {e[3]: i for i, e in old_rows.values()}
+
+    # Phân loại: dùng lại (mtime + kích thước khớp) hoặc cần đọc lại file
+    entries, reuse, todo = [], {}, []
+    for n, (rel, label) in enumerate(items):
+        st = os.stat(os.path.join(root, rel))
+        entries.append([rel, st.st_mtime_ns, st.st_size, None, label])
+        prev = old_rows.get(rel)
+        if prev is not None and prev[1][1] == st.st_mtime_ns and prev[1][2] == st.st_size:
+            reuse[n] = prev[0]
+            entries[n][3] = prev[1][3]
+        else:
+            todo.append(n)
+
+    # Không có gì thay đổi -> dùng nguyên cache cũ, không ghi lại file nào
+    if not todo and old_images is not None and old.get('classes') == classes and old['entries'] == entries:
+        print(f"[INFO] Cache {cache_dir}: {len(entries)} ảnh | không thay đổi")
+        return cache_dir
+
+    # Đọc + giải mã song song (OpenCV nhả GIL khi giải mã)
+    decoded = {}
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for n, (sha1, img) in zip(todo, pool.map(lambda n: _load(os.path.join(root, items[n][0]), size), todo)):
+            entries[n][3] = sha1
+            if sha1 in old_by_hash:
+                reuse[n] = old_by_hash[sha1] # File đổi mtime nhưng nội dung y hệt -> dùng lại dòng cũ
+            elif img is not None:
+                decoded[n] = img
+
+    # Bỏ các file hỏng (không giải mã được)
+    keep = [n for n in range(len(entries)) if n in reuse or n in decoded]
+    dropped = len(entries) - len(keep)
+
+    labels = np.array([entries[n][4] for n in keep], dtype=np.int64)
+    # Mọi dòng vẫn nằm đúng vị trí cũ (chỉ đổi mtime / nhãn) -> giữ nguyên images.npy, chỉ ghi lại nhãn và manifest
+    same_rows = (not decoded and old_images is not None and len(keep) == len(old_images)
+                 and all(reuse[n] == row for row, n in enumerate(keep)))
+    if not same_rows:
+        # Ghi mảng mới ra file tạm rồi đổi tên (cache cũ vẫn đọc được trong lúc build)
+        tmp_images = os.path.join(cache_dir, 'images.tmp.npy')
+        images = np.lib.format.open_memmap(tmp_images, mode='w+', dtype=np.uint8, shape=(len(keep), size, size, 3))
+        for row, n in enumerate(keep):
+            images[row] = old_images[reuse[n]] if n in reuse else decoded[n]
+        images.flush()
+        del images
+    del old_images
+
+    if not same_rows:
+        os.replace(tmp_images, os.path.join(cache_dir, 'images.npy'))
+    np.save(os.path.join(cache_dir, 'labels.npy'), labels)
+    with open(os.path.join(cache_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'size': size, 'root': os.path.abspath(root), 'classes': classes,
+                   'entries': [entries[n] for n in keep]}, f)
+
+    print(f"[INFO] Cache {cache_dir}: {len(keep)} ảnh | dùng lại {len(reuse)} | "
+          f"giải mã mới {len(decoded)} | bỏ {dropped} file lỗi")
+    return cache_dir
+
+# Chuẩn hóa một batch uint8 (B, H, W, 3) thành tensor float (B, 3, H, W) trong [-1, 1]
+# (tương đương ToTensor + Normalize(0.5, 0.5) nhưng làm một lần cho cả batch)
+def normalize_batch(images):
+    return images.permute(0, 3, 1, 2).float().div_(127.5).sub_(1.0)
+
+try:
+    import torch
+    from torch.utils.data import Dataset
+except ImportError:
+    Dataset = object
+
+# Dataset đọc trực tiếp từ cache (không sao chép): trả về ảnh uint8 (H, W, 3) và nhãn
+# Dùng normalize_batch trên batch để ra đầu vào của mô hình
+class CachedImageDataset(Dataset):
+    def __init__(self, cache_dir):
+        manifest = _read_manifest(cache_dir)
+        if manifest is None:
+            raise FileNotFoundError(f"No dataset cache at {cache_dir}")
+        self.classes = manifest['classes']
+        self.class_to_idx = {c: i for i, c in enumerate(self.classes)}
+        self.cache_dir = cache_dir
+        self.labels = np.load(os.path.join(cache_dir, 'labels.npy'))
+        self.targets = self.labels.tolist()
+        self._images = None
+
+    # Mở memmap khi cần: mỗi worker của DataLoader tự mở lại file thay vì nhận bản sao toàn bộ mảng qua pickle
+    @property
+    def images(self):
+        if self._images is None:
+            # mmap 'c' (copy-on-write): view ghi được nên torch.from_numpy không cảnh báo, nhưng không bao giờ ghi ra đĩa
+            self._images = np.load(os.path.join(self.cache_dir, 'images.npy'), mmap_mode='c')
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_images'] = None
+        return state
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, i):
+        return torch.from_numpy(self.images[i]), int(self.labels[i])
+
+if __name__ == '__main__':
+    # python utils/dataset_cache.py <thư mục ảnh> <thư mục cache>
+    if len(sys.argv) != 3:
+        print("Usage: python utils/dataset_cache.py <image_root> <cache_dir>")
+        sys.exit(1)
+    build_cache(sys.argv[1], sys.argv[2])
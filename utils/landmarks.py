@@ -1,4 +1,6 @@
 ﻿
+import numpy as np
+
 # Chỉ số Landmark cho MediaPipe Face Mesh
 # Mắt trái
 LEFT_EYE = [362, 385, 387, 263, 373, 380]
@@ -14,3 +16,24 @@ LIPS_OUTER = [61, 291, 0, 17]
 #LÔNG MÀY
 LEFT_EYEBROW = [70, 63, 105, 66, 107]
 RIGHT_EYEBROW = [336, 296, 334, 293, 300]
+
+# Số điểm landmark của Face Mesh (refine_landmarks=True)
+NUM_LANDMARKS = 478
+
+# --- MẢNG CHỈ SỐ DỰNG SẴN CHO TÍNH TOÁN VECTOR HÓA ---
+# Các cặp điểm cần đo khoảng cách, tính chung trong một lần (xem liveness_utils.face_metrics)
+# Mỗi mắt: dọc 1 (p1-p5), dọc 2 (p2-p4), ngang (p0-p3)
+DIST_PAIRS = np.array(
+    [[eye[1], eye[5]] for eye in (LEFT_EYE, RIGHT_EYE)] +
+    [[eye[2], eye[4]] for eye in (LEFT_EYE, RIGHT_EYE)] +
+    [[eye[0], eye[3]] for eye in (LEFT_EYE, RIGHT_EYE)] +
+    [[LIPS_OUTER[0], LIPS_OUTER[1]],   # Chiều rộng miệng (61-291)
+     [LIPS_OUTER[2], LIPS_OUTER[3]],   # Chiều cao miệng (0-17)
+     [105, 373]],                      # Lông mày trái - mắt trái
+    dtype=np.intp)
+
+# Môi: Trái(61), Phải(291), Trên(0), Dưới(17)
+MOUTH_IDX = np.array(LIPS_OUTER, dtype=np.intp)
+
+# Điểm neo chuyển động đầu: Mũi(1), Mắt trái(33), Mắt phải(263), Cằm(152)
+MOTION_ANCHORS = np.array([1, 33, 263, 152], dtype=np.intp)
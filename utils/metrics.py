@@ -1 +1,160 @@
+import json
+import time
+import numpy as np
 
+# Chỉ số chống giả mạo theo ISO/IEC 30107-3, tích lũy theo luồng với bộ nhớ cố định
+#   APCER: tỉ lệ ảnh tấn công (giả) bị chấp nhận là thật
+#   BPCER: tỉ lệ ảnh thật (bona fide) bị từ chối
+#   ACER : trung bình của APCER và BPCER
+#   EER  : điểm mà APCER = BPCER
+# Điểm số là xác suất "thật" (0.0 - 1.0), được gom vào histogram num_bins ngăn cho mỗi loại
+class SpoofMetrics:
+    # real_label: chỉ số lớp "thật" (TextureDetector giả định 1); threshold: ngưỡng chấp nhận mặc định
+    def __init__(self, num_classes=2, real_label=1, threshold=0.5, num_bins=1000):
+        self.num_classes = num_classes
+        self.real_label = real_label
+        self.threshold = threshold
+        self.num_bins = num_bins
+        self.reset()
+
+    def reset(self):
+        self.real_hist = np.zeros(self.num_bins, dtype=np.int64)
+        self.attack_hist = np.zeros(self.num_bins, dtype=np.int64)
+        self.confusion = np.zeros((self.num_classes, self.num_classes), dtype=np.int64) # [nhãn thật, dự đoán]
+
+    # scores: xác suất thật (N,), labels: nhãn (N,), preds: lớp dự đoán (N,) (mặc định lấy theo ngưỡng)
+    def update(self, scores, labels, preds=None):
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        labels = np.asarray(labels, dtype=np.int64).ravel()
+        bins = np.clip((scores * self.num_bins).astype(np.int64), 0, self.num_bins - 1)
+        is_real = labels == self.real_label
+        self.real_hist += np.bincount(bins[is_real], minlength=self.num_bins)
+        self.attack_hist += np.bincount(bins[~is_real], minlength=self.num_bins)
+
+        if preds is None:
+            preds = np.where(scores >= self.threshold, self.real_label, 1 - self.real_label)
+        preds = np.asarray(preds, dtype=np.int64).ravel()
+        np.add.at(self.confusion, (labels, preds), 1)
+
+    @property
+    def count(self):
+        return int(self.real_hist.sum() + self.attack_hist.sum())
+
+    # APCER / BPCER tại mọi ngưỡng biên của histogram: ngưỡng t_k = k / num_bins, k = 0..num_bins
+    # Chấp nhận là thật khi score >= t_k
+    def _curves(self):
+        n_attack = max(int(self.attack_hist.sum()), 1)
+        n_real = max(int(self.real_hist.sum()), 1)
+        # Số mẫu có bin >= k (đảo cumsum), thêm 0 ở cuối cho ngưỡng 1.0+
+        attack_ge = np.concatenate([np.cumsum(self.attack_hist[::-1])[::-1], [0]])
+        real_ge = np.concatenate([np.cumsum(self.real_hist[::-1])[::-1], [0]])
+        apcer = attack_ge / n_attack
+        bpcer = 1.0 - real_ge / n_real
+        thresholds = np.arange(self.num_bins + 1) / self.num_bins
+        return thresholds, apcer, bpcer
+
+    def at_threshold(self, threshold=None):
+        threshold = self.threshold if threshold is None else threshold
+        thresholds, apcer, bpcer = self._curves()
+        k = int(np.clip(np.ceil(threshold * self.num_bins), 0, self.num_bins))
+        return {'threshold': float(thresholds[k]), 'apcer': float(apcer[k]), 'bpcer': float(bpcer[k]),
+                'acer': float((apcer[k] + bpcer[k]) / 2)}
+
+    # EER: ngưỡng có |APCER - BPCER| nhỏ nhất, EER = trung bình hai giá trị tại đó
+    def eer(self):
+        thresholds, apcer, bpcer = self._curves()
+        k = int(np.argmin(np.abs(apcer - bpcer)))
+        return {'eer': float((apcer[k] + bpcer[k]) / 2), 'threshold': float(thresholds[k])}
+
+    # Các điểm ROC (FPR = APCER, TPR = 1 - BPCER) và DET (APCER, BPCER), rút gọn còn tối đa points điểm
+    def curves(self, points=101):
+        thresholds, apcer, bpcer = self._curves()
+        idx = np.unique(np.linspace(0, self.num_bins, min(points, self.num_bins + 1)).round().astype(int))
+        return {
+            'threshold': thresholds[idx].round(4).tolist(),
+            'roc': {'fpr': apcer[idx].round(6).tolist(), 'tpr': (1.0 - bpcer[idx]).round(6).tolist()},
+            'det': {'apcer': apcer[idx].round(6).tolist(), 'bpcer': bpcer[idx].round(6).tolist()},
+        }
+
+    def auc(self):
+        _, apcer, bpcer = self._curves()
+        fpr, tpr = apcer[::-1], (1.0 - bpcer)[::-1] # Sắp FPR tăng dần
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+    def summary(self, points=101):
+        total = self.confusion.sum()
+        return {
+            'count': self.count,
+            'accuracy': float(np.trace(self.confusion) / total) if total else 0.0,
+            **self.at_threshold(),
+            'eer': self.eer(),
+            'auc': self.auc(),
+            'confusion': self.confusion.tolist(),
+            'curves': self.curves(points),
+        }
+
+# Đo thông lượng và độ trễ từng batch (p50/p95/p99, ms) cho từng kích thước batch
+def throughput_profile(model, batch_sizes=(1, 8, 32, 128), runs=100, warmup=10, device='cpu', input_size=64):
+    import torch
+    results = {}
+    with torch.inference_mode():
+        for bs in batch_sizes:
+            x = torch.randn(bs, 3, input_size, input_size, device=device)
+            times = []
+            for i in range(warmup + runs):
+                t0 = time.perf_counter()
+                model(x)
+                if device != 'cpu' and torch.cuda.is_available():
+                    torch.cuda.synchronize()
+                if i >= warmup:
+                    times.append((time.perf_counter() - t0) * 1000)
+            times = np.asarray(times)
+            p50, p95, p99 = np.percentile(times, [50, 95, 99])
+            results[str(bs)] = {'p50_ms': round(float(p50), 4), 'p95_ms': round(float(p95), 4),
+                                'p99_ms': round(float(p99), 4),
+                                'images_per_sec': round(float(bs * 1000 / times.mean()), 1)}
+    return results
+
+# Các chỉ số được so sánh với baseline: (đường dẫn trong báo cáo, hướng tốt hơn)
+COMPARE_KEYS = (
+    (('accuracy',), 'higher'),
+    (('acer',), 'lower'),
+    (('apcer',), 'lower'),
+    (('bpcer',), 'lower'),
+    (('eer', 'eer'), 'lower'),
+    (('auc',), 'higher'),
+)
+
+def _get(report, path):
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report
+
+# So sánh báo cáo với baseline, trả về danh sách các chỉ số bị tụt (regression)
+# metric_tol: sai lệch tuyệt đối cho phép của chỉ số chất lượng; speed_tol: tỉ lệ chậm đi cho phép của thông lượng
+def compare_reports(report, baseline, metric_tol=0.005, speed_tol=0.10):
+    regressions = []
+    for path, better in COMPARE_KEYS:
+        new, old = _get(report, ('metrics',) + path), _get(baseline, ('metrics',) + path)
+        if new is None or old is None:
+            continue
+        delta = new - old if better == 'higher' else old - new
+        if delta < -metric_tol:
+            regressions.append({'metric': '.'.join(path), 'baseline': old, 'current': new})
+
+    for bs, stats in (report.get('throughput') or {}).items():
+        old = _get(baseline, ('throughput', bs, 'images_per_sec'))
+        if old and stats['images_per_sec'] < old * (1 - speed_tol):
+            regressions.append({'metric': f'throughput.{bs}.images_per_sec', 'baseline': old,
+                                'current': stats['images_per_sec']})
+    return regressions
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_report(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
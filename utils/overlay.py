@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+
+# Vẽ lớp phủ (overlay) lên khung hình mà không sao chép / trộn cả khung hình
+# Mỗi bảng bán trong suốt chỉ trộn đúng vùng (ROI) của nó, tại chỗ:
+#   roi = roi * (1 - alpha) + alpha * màu_nền   (chữ tĩnh: alpha = 1)
+# Phần tĩnh (nền + chữ cố định) được vẽ một lần thành lớp nhân sẵn alpha (premultiplied), mỗi frame chỉ vẽ lại chữ động
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# Vẽ 4 góc bao quanh khuôn mặt (một lần gọi cv2.polylines cho cả 4 góc)
+def draw_corners(img, x, y, w, h, color=(255, 191, 0), thickness=2, length=25):
+    l = length
+    corners = np.array([
+        [(x + l, y), (x, y), (x, y + l)],                          # Góc trên trái
+        [(x + w - l, y), (x + w, y), (x + w, y + l)],              # Góc trên phải
+        [(x + l, y + h), (x, y + h), (x, y + h - l)],              # Góc dưới trái
+        [(x + w - l, y + h), (x + w, y + h), (x + w, y + h - l)],  # Góc dưới phải
+    ], dtype=np.int32)
+    cv2.polylines(img, corners, False, color, thickness)
+
+# Một bảng chữ nhật bán trong suốt với chữ tĩnh, vẽ sẵn thành lớp nhân alpha
+class Panel:
+    # x, y, w, h: vị trí trên khung hình; color: màu nền (BGR); alpha: độ đậm của nền
+    def __init__(self, x, y, w, h, color=(0, 0, 0), alpha=0.6):
+        self.x, self.y, self.w, self.h = x, y, w, h
+        self.color = color
+        self.alpha = alpha
+        self.texts = []
+        self._pre = None  # alpha * màu (uint8, h x w x 3)
+        self._inv = None  # (1 - alpha) * 255 (uint8, h x w x 3)
+
+    # Thêm chữ tĩnh (toạ độ theo khung hình, như cv2.putText)
+    def add_text(self, text, org, scale=0.6, color=(255, 255, 255), thickness=1):
+        self.texts.append((text, (org[0] - self.x, org[1] - self.y), scale, color, thickness))
+        self._pre = None
+        return self
+
+    def _build(self):
+        a = self.alpha
+        pre = np.empty((self.h, self.w, 3), dtype=np.uint8)
+        pre[:] = [round(a * c) for c in self.color]
+        inv = np.full((self.h, self.w, 3), round((1 - a) * 255), dtype=np.uint8)
+        # Điểm ảnh của chữ tĩnh che hẳn nền (alpha = 1); LINE_8 để mặt nạ chữ không có viền trộn
+        mask = np.zeros((self.h, self.w), dtype=np.uint8)
+        for text, org, scale, color, thickness in self.texts:
+            cv2.putText(pre, text, org, FONT, scale, color, thickness, cv2.LINE_8)
+            cv2.putText(mask, text, org, FONT, scale, 255, thickness, cv2.LINE_8)
+        inv[mask > 0] = 0
+        self._pre, self._inv = pre, inv
+
+    # Trộn bảng vào khung hình tại chỗ (chỉ trên ROI của bảng)
+    def blend(self, frame):
+        if self._pre is None:
+            self._build()
+        fh, fw = frame.shape[:2]
+        x0, y0 = max(self.x, 0), max(self.y, 0)
+        x1, y1 = min(self.x + self.w, fw), min(self.y + self.h, fh)
+        if x1 <= x0 or y1 <= y0:
+            return
+        roi = frame[y0:y1, x0:x1]
+        py, px = y0 - self.y, x0 - self.x
+        cv2.multiply(roi, self._inv[py:py + y1 - y0, px:px + x1 - x0], dst=roi, scale=1 / 255)
+        cv2.add(roi, self._pre[py:py + y1 - y0, px:px + x1 - x0], dst=roi)
+
+# Bảng thông tin của realtime_app: nền + tiêu đề + hướng dẫn thoát là tĩnh, cảm xúc / chớp mắt / chuyển động là động
+class DashboardOverlay:
+    def __init__(self, static_threshold, alpha=0.6):
+        self.static_threshold = static_threshold
+        self.alpha = alpha
+        self.panels = []
+        self._shape = None
+
+    # Dựng lại các bảng khi kích thước khung hình đổi (thanh dưới phụ thuộc chiều rộng / cao)
+    def _layout(self, h_frame, w_frame):
+        dashboard = Panel(10, 10, 291, 151, alpha=self.alpha) # = cv2.rectangle((10, 10), (300, 160)), hai góc đều tính
+        dashboard.add_text("--- DASHBOARD ---", (30, 35))
+        bar = Panel(0, h_frame - 40, w_frame, 40, alpha=self.alpha)
+        bar.add_text("PRESS 'Q' TO QUIT", (w_frame // 2 - 100, h_frame - 12), 0.7, (200, 200, 200), 2)
+        self.panels = [dashboard, bar]
+        self._shape = (h_frame, w_frame)
+
+    def draw(self, frame, emotion, blink_count, motion_score, state_text="", state_color=(0, 0, 0)):
+        h_frame, w_frame = frame.shape[:2]
+        if self._shape != (h_frame, w_frame):
+            self._layout(h_frame, w_frame)
+        for panel in self.panels:
+            panel.blend(frame)
+
+        # Cảm xúc
+        e_color = (255, 255, 255)
+        if "SMILE" in emotion: e_color = (0, 255, 0)
+        elif "SURPRISE" in emotion: e_color = (0, 255, 255)
+        elif "BLINK" in emotion: e_color = (100, 100, 255)
+        cv2.putText(frame, f"Emotion: {emotion}", (30, 65), FONT, 0.6, e_color, 2)
+
+        # Số lần chớp mắt
+        cv2.putText(frame, f"Blinks: {blink_count}", (30, 95), FONT, 0.6, (255, 255, 255), 1)
+
+        # Chỉ số chuyển động
+        m_color = (0, 255, 0) if motion_score > self.static_threshold else (0, 0, 255)
+        cv2.putText(frame, f"Motion: {motion_score:.2f}", (30, 125), FONT, 0.6, m_color, 1)
+
+        # Trạng thái hệ thống (Pass/Fail)
+        if state_text:
+            cv2.putText(frame, state_text, (30, 200), FONT, 0.8, state_color, 2)
@@ -0,0 +1,75 @@
+import time
+from collections import deque
+
+# Điều nhịp khung hình theo mốc thời gian cố định thay cho sleep cố định
+# Mỗi frame có hạn chót (deadline) = hạn chót trước + chu kỳ; chỉ ngủ phần thời gian còn lại của chu kỳ
+#   - Frame xử lý nhanh: ngủ nốt phần còn lại -> không vượt FPS mục tiêu
+#   - Frame xử lý chậm: không ngủ, tính là trễ hạn; trễ quá một chu kỳ thì đặt lại mốc (không chạy dồn để bù)
+class FramePacer:
+    # target_fps: FPS mục tiêu; budget: thời gian cho mỗi frame (giây), ưu tiên hơn target_fps
+    # Cả hai None / 0 -> không giới hạn, chỉ đo FPS
+    # slack: sai số cho phép khi ngủ / waitKey trước khi tính là trễ hạn (giây)
+    # window: số frame gần nhất dùng để tính FPS đạt được
+    def __init__(self, target_fps=30.0, budget=None, slack=0.002, window=30):
+        self.period = budget if budget else (1.0 / target_fps if target_fps else 0.0)
+        self.slack = slack
+        self.frames = 0
+        self.misses = 0 # Số frame kết thúc sau hạn chót
+        self._deadline = None
+        self._times = deque(maxlen=window + 1)
+
+    @property
+    def target_fps(self):
+        return 1.0 / self.period if self.period else 0.0
+
+    # Bỏ mốc hiện tại (vd. sau khi tạm dừng ở chế độ nghỉ) để frame sau không bị tính là trễ hạn
+    def reset(self):
+        self._deadline = None
+        self._times.clear()
+
+    # Thời gian còn lại tới hạn chót của frame hiện tại (giây, >= 0)
+    def remaining(self):
+        if self._deadline is None:
+            return 0.0
+        return max(0.0, self._deadline - time.perf_counter())
+
+    # Như remaining() nhưng theo mili giây, tối thiểu 1 (dùng cho cv2.waitKey)
+    def remaining_ms(self):
+        return max(1, int(round(self.remaining() * 1000)))
+
+    # Đánh dấu kết thúc một frame: đếm trễ hạn, chuyển sang hạn chót kế tiếp
+    def tick(self):
+        now = time.perf_counter()
+        if self.period:
+            if self._deadline is None:
+                self._deadline = now + self.period
+            else:
+                if now - self._deadline > self.slack:
+                    self.misses += 1
+                self._deadline += self.period
+                if self._deadline < now:
+                    self._deadline = now + self.period
+        self.frames += 1
+        self._times.append(now)
+
+    # Ngủ phần thời gian còn lại của chu kỳ rồi đánh dấu frame
+    def wait(self):
+        left = self.remaining()
+        if left > 0:
+            time.sleep(left)
+        self.tick()
+
+    # FPS đạt được trên các frame gần nhất
+    @property
+    def fps(self):
+        if len(self._times) < 2:
+            return 0.0
+        return (len(self._times) - 1) / max(self._times[-1] - self._times[0], 1e-6)
+
+    @property
+    def miss_rate(self):
+        return self.misses / max(self.frames, 1)
+
+    def summary(self):
+        target = f"{self.target_fps:.0f}" if self.period else "không giới hạn"
+        return f"{self.fps:.1f} FPS (mục tiêu {target}) | trễ hạn {self.misses}/{self.frames} frame ({self.miss_rate:.0%})"
@@ -0,0 +1,223 @@
+import time
+import heapq
+import threading
+from collections import deque
+
+# Bộ thực thi pipeline nhiều tầng: mỗi tầng chạy trên luồng riêng, nối với nhau bằng hàng đợi có giới hạn
+# Face Mesh / OpenCV nhả GIL khi tính toán nên các tầng chạy chồng lên nhau trên nhiều lõi
+#
+#   source (vd. đọc camera) -> [hàng đợi] -> tầng 1 -> [hàng đợi] -> tầng 2 -> ...
+#
+# Mỗi item là một dict (ngữ cảnh của một frame) đi qua các tầng; hàm của tầng trả về None để bỏ item
+
+# Chính sách khi hàng đợi vào của một tầng đã đầy
+DROP_BLOCK = "block"    # Chờ chỗ trống (không mất frame, tạo áp lực ngược lên tầng trước)
+DROP_OLDEST = "oldest"  # Bỏ item cũ nhất trong hàng đợi (luôn xử lý frame mới nhất, độ trễ thấp)
+DROP_NEWEST = "newest"  # Bỏ item vừa tới (giữ các item đã xếp hàng)
+POLICIES = (DROP_BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+# Hàng đợi có giới hạn với chính sách bỏ item; mỗi item mang số vé (ticket) để giữ thứ tự
+class _BoundedQueue:
+    def __init__(self, maxsize, policy):
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+
+    # Thêm item, trả về item bị bỏ (nếu có)
+    def put(self, ticket, item):
+        with self.cond:
+            dropped = None
+            if len(self.items) >= self.maxsize:
+                if self.policy == DROP_NEWEST:
+                    return (ticket, item)
+                if self.policy == DROP_OLDEST:
+                    dropped = self.items.popleft()
+                else:
+                    while len(self.items) >= self.maxsize and not self.closed:
+                        self.cond.wait(0.1)
+                    if self.closed:
+                        return (ticket, item)
+            self.items.append((ticket, item))
+            self.cond.notify_all()
+            return dropped
+
+    def get(self, timeout=0.1):
+        with self.cond:
+            if not self.items:
+                self.cond.wait(timeout)
+            if not self.items:
+                return None
+            entry = self.items.popleft()
+            self.cond.notify_all() # Đánh thức tầng trước đang chờ chỗ trống (DROP_BLOCK)
+            return entry
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.items.clear()
+            self.cond.notify_all()
+
+# Một tầng của pipeline
+class Stage:
+    # fn: hàm xử lý item -> item mới (hoặc None để bỏ)
+    # workers: số luồng của tầng; > 1 chỉ dùng cho tầng không giữ trạng thái giữa các frame
+    # queue_size, drop: kích thước và chính sách của hàng đợi vào tầng này
+    def __init__(self, name, fn, workers=1, queue_size=2, drop=DROP_OLDEST):
+        if drop not in POLICIES:
+            raise ValueError(f"Unknown drop policy '{drop}', expected one of {POLICIES}")
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue = _BoundedQueue(queue_size, drop)
+
+        # Sắp lại thứ tự đầu ra khi có nhiều luồng: phát theo thứ tự vé, bỏ qua vé đã bị loại
+        self._lock = threading.Lock()
+        self._next_in = 0    # Vé cấp cho item tiếp theo vào tầng
+        self._next_out = 0   # Vé tiếp theo được phép đi ra
+        self._done = []      # heap (vé, item) đã xử lý xong nhưng chưa tới lượt
+        self._skipped = set()
+        self._emit_lock = threading.Lock() # Giữ thứ tự khi nhiều luồng cùng chuyển item sang tầng sau
+
+        # Thống kê
+        self.processed = 0
+        self.dropped = 0
+        self.busy = 0.0      # Tổng thời gian chạy fn (giây, cộng mọi luồng)
+
+    def _ticket(self):
+        with self._lock:
+            t = self._next_in
+            self._next_in += 1
+            return t
+
+    # Ghi nhận một vé đã xong (item=None nếu bị bỏ/lọc), trả về các item được phép đi tiếp theo đúng thứ tự
+    def _complete(self, ticket, item):
+        with self._lock:
+            if item is None:
+                self._skipped.add(ticket)
+            else:
+                heapq.heappush(self._done, (ticket, id(item), item))
+            ready = []
+            while True:
+                if self._next_out in self._skipped:
+                    self._skipped.discard(self._next_out)
+                elif self._done and self._done[0][0] == self._next_out:
+                    ready.append(heapq.heappop(self._done)[2])
+                else:
+                    break
+                self._next_out += 1
+            return ready
+
+    # Nhận item từ tầng trước (hoặc source); trả về các item đã xử lý được giải phóng do có vé bị bỏ
+    def offer(self, item):
+        dropped = self.queue.put(self._ticket(), item)
+        if dropped is not None:
+            with self._lock:
+                self.dropped += 1
+            return self._complete(dropped[0], None)
+        return []
+
+# Pipeline: source chạy trên luồng riêng, mỗi tầng có workers luồng
+class Pipeline:
+    # source: hàm không tham số trả về item mới (hoặc None nếu không có gì để đẩy vào lượt này)
+    def __init__(self, stages, source=None, name="pipeline"):
+        self.stages = list(stages)
+        self.source = source
+        self.name = name
+        self.running = False
+        self._threads = []
+        self._started = 0.0
+        self.source_busy = 0.0
+        self.source_items = 0
+
+    def start(self):
+        self.running = True
+        self._started = time.perf_counter()
+        if self.source is not None:
+            self._threads.append(threading.Thread(target=self._run_source, name=f"{self.name}-source", daemon=True))
+        for i, stage in enumerate(self.stages):
+            for k in range(stage.workers):
+                self._threads.append(threading.Thread(target=self._run_stage, args=(i,),
+                                                      name=f"{self.name}-{stage.name}-{k}", daemon=True))
+        for t in self._threads:
+            t.start()
+        return self
+
+    # Đẩy item vào tầng đầu tiên (khi không dùng source)
+    def submit(self, item):
+        self._push(0, [item])
+
+    # Đưa các item vào tầng i; item được giải phóng ở tầng i (do vé khác bị bỏ) đi tiếp sang tầng i + 1
+    def _push(self, i, items):
+        if i >= len(self.stages):
+            return
+        stage = self.stages[i]
+        for item in items:
+            released = stage.offer(item)
+            if released:
+                with stage._emit_lock:
+                    self._push(i + 1, released)
+
+    def _run_source(self):
+        while self.running:
+            t0 = time.perf_counter()
+            try:
+                item = self.source()
+            except Exception as e:
+                # Như các tầng: ghi lỗi rồi chạy tiếp, không để luồng source chết (giao diện đứng hình)
+                print(f"[LỖI] Source '{self.name}': {e}")
+                item = None
+                time.sleep(0.01)
+            self.source_busy += time.perf_counter() - t0
+            if item is not None:
+                self.source_items += 1
+                self._push(0, [item])
+
+    def _run_stage(self, i):
+        stage = self.stages[i]
+        while self.running:
+            entry = stage.queue.get()
+            if entry is None:
+                continue
+            ticket, item = entry
+            t0 = time.perf_counter()
+            try:
+                out = stage.fn(item)
+            except Exception as e:
+                print(f"[LỖI] Tầng '{stage.name}': {e}")
+                out = None
+            elapsed = time.perf_counter() - t0
+            with stage._lock:
+                stage.busy += elapsed
+                stage.processed += 1
+            with stage._emit_lock:
+                self._push(i + 1, stage._complete(ticket, out))
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        for stage in self.stages:
+            stage.queue.close()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    # Mức sử dụng mỗi tầng: thời gian bận / (thời gian chạy * số luồng), cùng số item xử lý / bị bỏ
+    def utilization(self):
+        wall = max(time.perf_counter() - self._started, 1e-6)
+        report = {}
+        if self.source is not None:
+            report['source'] = {'util': self.source_busy / wall, 'processed': self.source_items, 'dropped': 0}
+        for stage in self.stages:
+            report[stage.name] = {'util': stage.busy / (wall * stage.workers), 'processed': stage.processed,
+                                  'dropped': stage.dropped,
+                                  'ms': 1000 * stage.busy / max(stage.processed, 1)}
+        return report
+
+    # Một dòng tóm tắt, vd. "detect 82% (0 drop) | analyze 20% | render 35% (12 drop)"
+    def summary(self):
+        parts = []
+        for name, s in self.utilization().items():
+            drop = f" ({s['dropped']} drop)" if s['dropped'] else ""
+            parts.append(f"{name} {s['util']:.0%}{drop}")
+        return " | ".join(parts)
@@ -1 +1,15 @@
 
+# Tỉ lệ nới rộng bbox mỗi phía khi cắt mặt cho TextureCNN (dùng chung cho runtime và tạo dữ liệu)
+FACE_CROP_PAD = 0.2
+
+# Cắt vùng mặt từ khung hình theo bbox (x, y, w, h) đã nới rộng, cắt theo biên ảnh
+# Trả về bản sao (để vẽ lên khung hình sau đó không ảnh hưởng ảnh đã cắt), hoặc None nếu vùng rỗng
+def crop_face(frame, bbox, pad=FACE_CROP_PAD):
+    h, w = frame.shape[:2]
+    x, y, bw, bh = bbox
+    px, py = int(bw * pad), int(bh * pad)
+    x0, y0 = max(0, x - px), max(0, y - py)
+    x1, y1 = min(w, x + bw + px), min(h, y + bh + py)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return frame[y0:y1, x0:x1].copy()
@@ -0,0 +1,235 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+# Chia train/test bằng manifest thay vì di chuyển file
+# Mỗi file được gán vào một tập một cách tất định theo hash (nội dung hoặc đường dẫn) -> chạy lại cho cùng kết quả
+#
+# Manifest (JSON):
+#   {"root", "classes", "test_ratio", "by", "salt",
+#    "files": [[relpath, label, split, bytes, mtime_ns, sha1], ...],   split: 0 = train, 1 = test
+#    "duplicates": [[relpath, ...], ...],                               các nhóm ảnh trùng nội dung
+#    "test_root"}                                                        (tuỳ chọn) nơi chứa file tập test sau khi --move
+
+IMG_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+SPLITS = ('train', 'test')
+
+# Quét một thư mục (không đệ quy): trả về (file ảnh [(relpath, bytes, mtime_ns)], thư mục con)
+def _scan_dir(root, path):
+    files, dirs = [], []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.path)
+            elif entry.name.lower().endswith(IMG_EXTS):
+                st = entry.stat() # Thường đã có sẵn từ scandir, không tốn thêm lời gọi hệ thống
+                files.append((os.path.relpath(entry.path, root), st.st_size, st.st_mtime_ns))
+    return files, dirs
+
+# Quét song song theo từng tầng thư mục (hữu ích trên ổ mạng, nơi mỗi lần liệt kê thư mục có độ trễ cao)
+# Mỗi thư mục con cấp 1 của root là một lớp
+def scan(root, workers=16):
+    classes = sorted(d.name for d in os.scandir(root) if d.is_dir())
+    found = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for label, cls in enumerate(classes):
+            level = [os.path.join(root, cls)]
+            while level:
+                nxt = []
+                for files, dirs in pool.map(lambda p: _scan_dir(root, p), level):
+                    found.extend((rel, label, size, mtime) for rel, size, mtime in files)
+                    nxt.extend(dirs)
+                level = nxt
+    found.sort()
+    return classes, found
+
+def _sha1_file(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+# Gán tập theo hash: giá trị 32 bit đầu của sha1(salt:key) chia cho 2^32 < test_ratio -> test
+def assign_split(key, test_ratio, salt=''):
+    h = hashlib.sha1(f"{salt}:{key}".encode('utf-8')).digest()
+    return 1 if int.from_bytes(h[:4], 'big') / 2**32 < test_ratio else 0
+
+# Tạo manifest
+# by='content': hash theo nội dung -> ảnh trùng nhau luôn rơi vào cùng một tập
+# by='path': hash theo đường dẫn (không cần đọc file, trừ khi hash_files=True để tìm ảnh trùng)
+# old: manifest cũ -> dùng lại sha1 của file có cùng kích thước + mtime (chia lại chỉ mất vài giây)
+#      nếu tập test đã được chuyển sang test_root thì giữ lại các mục test cũ còn nằm ở đó
+def build_manifest(root, test_ratio=0.2, by='content', salt='', hash_files=False, workers=16, old=None):
+    classes, found = scan(root, workers)
+    hash_files = bool(hash_files) or by == 'content'
+
+    known, kept, test_root = {}, [], None
+    if old is not None and os.path.abspath(old.get('root', '')) == os.path.abspath(root):
+        known = {f[0]: (f[3], f[4], f[5]) for f in old['files'] if f[5]}
+        test_root = old.get('test_root')
+        if test_root:
+            present = {f[0] for f in found}
+            kept = [list(f) for f in old['files'] if f[2] == 1 and f[0] not in present
+                    and os.path.exists(os.path.join(test_root, f[0]))]
+            # Lớp chỉ còn trong tập test (đã chuyển hết khỏi root) vẫn phải có trong danh sách lớp
+            merged = sorted(set(classes) | set(old['classes']))
+            new_idx = [merged.index(c) for c in classes]
+            found = [(rel, new_idx[label], size, mtime) for rel, label, size, mtime in found]
+            for f in kept:
+                f[1] = merged.index(old['classes'][f[1]])
+            classes = merged
+
+    sha = [None] * len(found)
+    if hash_files:
+        todo = []
+        for i, (rel, _, size, mtime) in enumerate(found):
+            prev = known.get(rel)
+            if prev is not None and prev[0] == size and prev[1] == mtime:
+                sha[i] = prev[2]
+            else:
+                todo.append(i)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i, digest in zip(todo, pool.map(lambda i: _sha1_file(os.path.join(root, found[i][0])), todo)):
+                sha[i] = digest
+
+    files = []
+    for (rel, label, size, mtime), digest in zip(found, sha):
+        key = digest if by == 'content' else rel.replace(os.sep, '/')
+        files.append([rel, label, assign_split(key, test_ratio, salt), size, mtime, digest])
+    files.extend(kept)
+
+    # Nhóm ảnh trùng nội dung (chỉ khi đã hash)
+    groups = {}
+    for f in files:
+        if f[5]:
+            groups.setdefault(f[5], []).append(f[0])
+    duplicates = [paths for paths in groups.values() if len(paths) > 1]
+
+    manifest = {'root': os.path.abspath(root), 'classes': classes, 'test_ratio': test_ratio, 'by': by, 'salt': salt,
+                'files': files, 'duplicates': duplicates}
+    if test_root:
+        manifest['test_root'] = test_root
+    return manifest
+
+# Các nhóm ảnh trùng nằm ở cả train lẫn test (rò rỉ dữ liệu giữa hai tập)
+def cross_split_duplicates(manifest):
+    split_of = {f[0]: f[2] for f in manifest['files']}
+    return [paths for paths in manifest['duplicates'] if len({split_of[p] for p in paths}) > 1]
+
+def read_manifest(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def write_manifest(manifest, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':')) # Gọn: không thụt lề
+
+# Danh sách (relpath, label) của một tập ('train' / 'test')
+def split_items(manifest, split):
+    code = SPLITS.index(split)
+    return [(f[0], f[1]) for f in manifest['files'] if f[2] == code]
+
+# Thư mục gốc chứa file của một tập: tập test nằm ở test_root nếu đã được chuyển bằng move_test_files
+def split_root(manifest, split):
+    if split == 'test' and manifest.get('test_root'):
+        return manifest['test_root']
+    return manifest['root']
+
+# Thư mục cache memmap cho một tập của manifest: <thư mục manifest>/cache/<tên manifest>-<tập>
+def manifest_cache_dir(manifest_path, split):
+    name = os.path.splitext(os.path.basename(manifest_path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(manifest_path)), 'cache', f'{name}-{split}')
+
+try:
+    from torch.utils.data import Dataset
+    from torchvision.datasets.folder import default_loader
+except ImportError:
+    Dataset = object
+
+# Dataset đọc các file của một tập trong manifest (thay cho ImageFolder trên thư mục đã chia)
+class ManifestDataset(Dataset):
+    def __init__(self, manifest, split, transform=None):
+        self.root = split_root(manifest, split)
+        self.classes = manifest['classes']
+        self.class_to_idx = {c: i for i, c in enumerate(self.classes)}
+        self.samples = split_items(manifest, split)
+        self.targets = [label for _, label in self.samples]
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, i):
+        rel, label = self.samples[i]
+        img = default_loader(os.path.join(self.root, rel))
+        if self.transform is not None:
+            img = self.transform(img)
+        return img, label
+
+# Tương thích cách cũ: chuyển vật lý các file thuộc tập test sang dest (giữ nguyên đường dẫn tương đối, không đổi tên)
+# Ghi test_root = dest vào manifest -> cần ghi lại manifest sau khi gọi hàm này
+def move_test_files(manifest, dest):
+    dest = os.path.abspath(dest)
+    if manifest.get('test_root') and os.path.abspath(manifest['test_root']) != dest:
+        raise ValueError(f"Test files were already moved to {manifest['test_root']}, not {dest}")
+    moved = 0
+    for rel, _ in split_items(manifest, 'test'):
+        src, dst = os.path.join(manifest['root'], rel), os.path.join(dest, rel)
+        if os.path.exists(src) and not os.path.exists(dst):
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.move(src, dst)
+            moved += 1
+        elif os.path.exists(src):
+            print(f"[CẢNH BÁO] Đã có file cùng tên ở tập test, giữ nguyên: {dst}")
+    manifest['test_root'] = dest
+    return moved
+
+def main():
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description="Deterministic manifest-based train/test split")
+    parser.add_argument('--root', default=os.path.join(base_dir, 'data', 'train'), help="image root (one sub-folder per class)")
+    parser.add_argument('--output', default=os.path.join(base_dir, 'data', 'split_manifest.json'))
+    parser.add_argument('--test-ratio', type=float, default=0.2)
+    parser.add_argument('--by', choices=('content', 'path'), default='content', help="hash file content or relative path")
+    parser.add_argument('--salt', default='', help="change to draw a different (still reproducible) split")
+    parser.add_argument('--find-duplicates', action='store_true', help="hash file contents even with --by path")
+    parser.add_argument('--workers', type=int, default=16, help="threads for directory scanning and hashing")
+    parser.add_argument('--move', metavar='DEST', default=None,
+                        help="legacy: physically move test files to DEST (e.g. data/test) after writing the manifest")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print(f"LỖI: Không tìm thấy thư mục '{args.root}'.")
+        sys.exit(1)
+
+    old = read_manifest(args.output) if os.path.exists(args.output) else None
+    manifest = build_manifest(args.root, args.test_ratio, args.by, args.salt,
+                              args.find_duplicates, args.workers, old)
+    write_manifest(manifest, args.output)
+
+    print("=" * 60)
+    for label, cls in enumerate(manifest['classes']):
+        n_train = sum(1 for f in manifest['files'] if f[1] == label and f[2] == 0)
+        n_test = sum(1 for f in manifest['files'] if f[1] == label and f[2] == 1)
+        print(f"Lớp '{cls}': {n_train} train | {n_test} test")
+    if manifest['duplicates']:
+        leaks = cross_split_duplicates(manifest)
+        print(f"Ảnh trùng nội dung: {len(manifest['duplicates'])} nhóm, {len(leaks)} nhóm nằm ở cả train và test")
+        for paths in leaks[:10]:
+            print(f"  - {', '.join(paths)}")
+    print(f"Đã ghi manifest: {args.output}")
+    print("=" * 60)
+
+    # Tập test đã từng được chuyển -> file mới rơi vào tập test cũng phải chuyển theo
+    dest = args.move or manifest.get('test_root')
+    if dest:
+        print(f"Đã chuyển {move_test_files(manifest, dest)} ảnh sang '{dest}'.")
+        write_manifest(manifest, args.output) # Ghi lại: đường dẫn tập test giờ nằm dưới test_root
+
+if __name__ == '__main__':
+    main()